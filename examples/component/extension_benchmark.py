@@ -0,0 +1,74 @@
+#
+# Compare the cost of ExtensionPoint lookups with and without the cache
+# of interface services (and its index of service names).
+#
+# The uncached path scans the registered ids of the interface,
+# dereferences the weak reference of each service and sorts them, as
+# ExtensionPoint.extensions() did on every call before the cache was
+# added.  Lookups are timed for interfaces with an increasing number of
+# services, among a fixed number of services for other interfaces.
+#
+#   python extension_benchmark.py [calls]
+#
+
+import sys
+import timeit
+
+from pyutilib.component.core import (Interface, Plugin, ExtensionPoint,
+                                     PluginGlobals, implements)
+from pyutilib.component.core.core import _scan_services
+
+
+class IBenchmark(Interface):
+    """The interface that is looked up"""
+
+
+class IOther(Interface):
+    """Services that are registered but not looked up"""
+
+
+class BenchmarkPlugin(Plugin):
+    implements(IBenchmark, service=True)
+
+
+class OtherPlugin(Plugin):
+    implements(IOther, service=True)
+
+
+def uncached(ep, all=False, key=None):
+    strkey = str(key)
+    return [plugin for plugin in _scan_services(ep.interface)
+            if (all or plugin.enabled()) and
+            (key is None or strkey == plugin.name)]
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    PluginGlobals.add_env("benchmark")
+    others = [OtherPlugin() for i in range(200)]
+    ep = ExtensionPoint(IBenchmark)
+    plugins = []
+    print("%9s %-22s %12s %12s %8s" % ("services", "lookup", "uncached us",
+                                       "cached us", "speedup"))
+    for count in (1, 10, 100, 1000):
+        while len(plugins) < count:
+            plugins.append(BenchmarkPlugin())
+        plugins[-1].name = "last"
+        for label, kwds in (("extensions()", {}),
+                            ("extensions(all=True)", {'all': True}),
+                            ("service(key=...)", {'key': "last"})):
+            assert uncached(ep, **kwds) == ep.extensions(**kwds)
+            number = calls // count if 'key' not in kwds else calls
+            before = min(timeit.repeat(lambda: uncached(ep, **kwds),
+                                       number=number or 1,
+                                       repeat=3)) / (number or 1)
+            after = min(timeit.repeat(lambda: ep.extensions(**kwds),
+                                      number=number or 1,
+                                      repeat=3)) / (number or 1)
+            print("%9d %-22s %12.2f %12.2f %7.1fx" %
+                  (count, label, before * 1e6, after * 1e6, before / after))
+    PluginGlobals.pop_env()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#
+# Compare the startup time of an application that loads plugins from a
+# directory of modules, with and without a plugin manifest.
+#
+# A directory of plugin modules is generated, each of which declares a
+# solver plugin with a factory alias.  Each startup is a new Python
+# process that loads the plugins and then constructs one solver through
+# the factory.  With a manifest, only the module that declares that
+# solver is imported; the first startup imports every module and writes
+# the manifest.
+#
+#   python startup_benchmark.py [modules] [functions per module]
+#
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+application = """
+import sys
+from pyutilib.component.core import *
+
+class ISolver(Interface):
+    pass
+
+SolverFactory = CreatePluginFactory(ISolver)
+
+sys.modules['benchmark_solvers'] = sys.modules['__main__']
+manifest = sys.argv[2] if len(sys.argv) > 2 else None
+PluginGlobals.load_services(path=sys.argv[1], manifest=manifest)
+assert SolverFactory('solver_0') is not None
+"""
+
+plugin = """
+from benchmark_solvers import ISolver
+from pyutilib.component.core import *
+
+class Solver_%(i)d(Plugin):
+    implements(ISolver, service=True)
+    alias('solver_%(i)d', doc='Solver %(i)d')
+
+%(functions)s
+"""
+
+
+def generate(directory, modules, functions):
+    for i in range(modules):
+        body = "\n".join("def f%d(x):\n    return [x + %d for y in x]\n" %
+                         (j, j) for j in range(functions))
+        with open(os.path.join(directory, "plugin_%d.py" % i), 'w') as f:
+            f.write(plugin % {'i': i, 'functions': body})
+
+
+def startup(script, args, repeat=5):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable, script] + args)
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    modules = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    functions = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    tmpdir = tempfile.mkdtemp()
+    try:
+        plugins = os.path.join(tmpdir, 'plugins')
+        os.mkdir(plugins)
+        generate(plugins, modules, functions)
+        script = os.path.join(tmpdir, 'application.py')
+        with open(script, 'w') as f:
+            f.write(application)
+        manifest = os.path.join(tmpdir, 'manifest.json')
+        # The first startups write the bytecode of the modules, and the
+        # manifest
+        first = startup(script, [plugins, manifest], repeat=1)
+        eager = startup(script, [plugins])
+        lazy = startup(script, [plugins, manifest])
+        print("%d plugin modules" % modules)
+        print("  without a manifest:         %8.3f s" % eager)
+        print("  writing the manifest:       %8.3f s" % first)
+        print("  with the manifest:          %8.3f s" % lazy)
+        print("  speedup:                    %8.1fx" % (eager / lazy))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#
+# Compare the cost of reading the options of a ConfigDict in an inner
+# loop: through attributes of the ConfigDict (with the underscore forms
+# of the option names), through keys, and through attributes of a
+# frozen view of the ConfigDict.
+#
+#   python config_attribute_benchmark.py [reads]
+#
+
+import sys
+import timeit
+
+from pyutilib.misc.config import ConfigDict, ConfigValue
+
+
+def options():
+    config = ConfigDict()
+    solver = config.declare('solver options', ConfigDict())
+    solver.declare('iteration limit', ConfigValue(100, int))
+    solver.declare('tolerance', ConfigValue(1e-6, float))
+    solver.declare('step size', ConfigValue(0.5, float))
+    return config
+
+
+def main():
+    reads = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    config = options()
+    view = config.frozen_view()
+    solver = config.solver_options
+    tests = [
+        ("ConfigDict attributes", lambda: (
+            config.solver_options.iteration_limit,
+            config.solver_options.tolerance,
+            config.solver_options.step_size)),
+        ("ConfigDict keys", lambda: (
+            config['solver options']['iteration limit'],
+            config['solver options']['tolerance'],
+            config['solver options']['step size'])),
+        ("nested ConfigDict attributes", lambda: (
+            solver.iteration_limit, solver.tolerance, solver.step_size)),
+        ("frozen view attributes", lambda: (
+            view.solver_options.iteration_limit,
+            view.solver_options.tolerance,
+            view.solver_options.step_size)),
+    ]
+    print("Time per option read")
+    for name, test in tests:
+        assert test() == (100, 1e-6, 0.5)
+        t = min(timeit.repeat(test, number=reads // 3, repeat=3))
+        print("  %-30s %8.1f ns" % (name + ':', t / (reads // 3 * 3) * 1e9))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#
+# Compare the cost of cloning a ConfigDict template and modifying a few
+# of its values, with full clones and with copy-on-write clones.
+#
+# A full clone rebuilds every ConfigValue (casting its value to its
+# domain again), while a copy-on-write clone shares the values with the
+# template until they are written.
+#
+#   python config_clone_benchmark.py [blocks] [values per block]
+#
+
+import sys
+import timeit
+
+from pyutilib.misc.config import ConfigDict, ConfigValue, In
+
+
+def template(blocks, values):
+    config = ConfigDict(description="Solver options")
+    for i in range(blocks):
+        block = config.declare('block %d' % i, ConfigDict(
+            description="Options of component %d" % i))
+        for j in range(values):
+            if j % 3 == 0:
+                value = ConfigValue(default=j, domain=int)
+            elif j % 3 == 1:
+                value = ConfigValue(default=j * 0.5, domain=float)
+            else:
+                value = ConfigValue(default='a', domain=In(['a', 'b']))
+            block.declare('option %d' % j, value)
+            value._description = "Option %d of component %d" % (j, i)
+            value._doc = """Documentation of option %d of component %d,
+            which is several lines long.""" % (j, i)
+    return config
+
+
+def clone_and_modify(config, copy_on_write):
+    ans = config(copy_on_write=copy_on_write)
+    ans['block 0']['option 0'] = 10
+    ans['block 1']['option 1'] = 2.5
+    ans['block 2']['option 2'] = 'b'
+    return ans
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    values = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    config = template(blocks, values)
+    assert clone_and_modify(config, False).value() == \
+        clone_and_modify(config, True).value()
+    number = max(1, 20000 // (blocks * values))
+    print("%d blocks of %d values" % (blocks, values))
+    times = {}
+    for copy_on_write in (False, True):
+        times[copy_on_write] = min(timeit.repeat(
+            lambda: clone_and_modify(config, copy_on_write),
+            number=number, repeat=3)) / number
+    print("  full clone + modify:           %10.1f us" % (times[False] * 1e6))
+    print("  copy-on-write clone + modify:  %10.1f us" % (times[True] * 1e6))
+    print("  speedup:                       %10.1fx" %
+          (times[False] / times[True]))
+
+
+if __name__ == '__main__':
+    main()
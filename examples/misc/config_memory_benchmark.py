@@ -0,0 +1,77 @@
+#
+# Measure the memory used by each ConfigValue in a large ConfigDict.
+#
+# The values are declared from a generator of options that share their
+# domains and documentation (as generated configurations do), and the
+# ConfigDict is then cloned.  The memory allocated while building each
+# ConfigDict (measured with tracemalloc, Python 3.4 or later) is
+# divided by the number of ConfigValues in it.
+#
+#   python config_memory_benchmark.py [blocks] [values per block]
+#
+
+import gc
+import sys
+import tracemalloc
+
+from pyutilib.misc.config import ConfigDict, ConfigValue, In
+
+methods = In(['newton', 'bisection', 'secant'])
+
+
+def template(blocks, values):
+    config = ConfigDict(description="Solver options")
+    for i in range(blocks):
+        block = config.declare('block %d' % i, ConfigDict(
+            description="Options of a component"))
+        for j in range(values):
+            if j % 3 == 0:
+                value = ConfigValue(
+                    default=j, domain=int,
+                    description="Iteration limit",
+                    doc="""The largest number of iterations of the
+                    method, after which it stops.""")
+            elif j % 3 == 1:
+                value = ConfigValue(
+                    default=1e-6, domain=float,
+                    description="Tolerance",
+                    doc="""The relative tolerance of the convergence
+                    test of the method.""")
+            else:
+                value = ConfigValue(
+                    default='newton', domain=methods,
+                    description="Method",
+                    doc="""The method that solves the equations
+                    of the component.""")
+            block.declare('option %d' % j, value)
+    return config
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        ans = build()
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return ans, used
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    values = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    n = blocks * values
+    config, declared = measure(lambda: template(blocks, values))
+    clone, cloned = measure(lambda: config())
+    print("%d ConfigValues in %d blocks" % (n, blocks))
+    print("  size of a ConfigValue:            %6d bytes" %
+          sys.getsizeof(config['block 0'].get('option 0')))
+    print("  memory per declared ConfigValue:  %6d bytes" % (declared // n))
+    print("  memory per cloned ConfigValue:    %6d bytes" % (cloned // n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#
+# Compare the cost of sending the options of a driver to a worker on
+# each iteration: as the full values of the ConfigDict, and as a patch
+# with the options that changed since the last iteration.
+#
+# The driver changes a few options on each iteration.  The cost is the
+# time to build the message, pickle it, unpickle it and set the values
+# of the worker's ConfigDict, and the size of the pickle.
+#
+#   python config_patch_benchmark.py [blocks] [values per block] [changes]
+#
+
+import sys
+import pickle
+import timeit
+
+from pyutilib.misc.config import ConfigDict, ConfigValue
+
+
+def template(blocks, values):
+    config = ConfigDict()
+    for i in range(blocks):
+        block = config.declare('block %d' % i, ConfigDict())
+        for j in range(values):
+            block.declare('option %d' % j, ConfigValue(j, int))
+    return config
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    values = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    changes = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    driver = template(blocks, values)
+    worker = driver()
+    state = {'stamp': driver.checkpoint(), 'iteration': 0}
+
+    def modify():
+        state['iteration'] += 1
+        for k in range(changes):
+            i = (state['iteration'] * 7 + k) % blocks
+            j = (state['iteration'] * 13 + k) % values
+            driver['block %d' % i]['option %d' % j] = state['iteration']
+
+    def send_values():
+        modify()
+        message = pickle.dumps(driver.value(False), 2)
+        worker.set_value(pickle.loads(message))
+        return len(message)
+
+    def send_patch():
+        modify()
+        patch = driver.changes(state['stamp'])
+        state['stamp'] = driver.checkpoint()
+        message = pickle.dumps(patch, 2)
+        worker.apply_patch(pickle.loads(message))
+        return len(message)
+
+    full_size = send_values()
+    patch_size = send_patch()
+    assert worker.value() == driver.value()
+    number = 20
+    full = min(timeit.repeat(send_values, number=number, repeat=3)) / number
+    patch = min(timeit.repeat(send_patch, number=number, repeat=3)) / number
+    assert worker.value() == driver.value()
+    print("%d options in %d blocks, %d changes per iteration" %
+          (blocks * values, blocks, changes))
+    print("  full values:  %10.1f us  %8d bytes" % (full * 1e6, full_size))
+    print("  patch:        %10.1f us  %8d bytes" % (patch * 1e6, patch_size))
+    print("  speedup:      %10.1fx" % (full / patch))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#
+# Compare the cost of setting the values of a nested ConfigDict from a
+# nested dictionary (e.g., an options file), with ConfigDict.set_value()
+# and with a ConfigSetter.
+#
+# set_value() takes a copy of the current values at every level of the
+# dictionary (to restore them if a value is rejected), while a
+# ConfigSetter casts all of the values before storing any of them.
+#
+#   python config_set_value_benchmark.py [blocks] [values per block]
+#
+
+import sys
+import timeit
+
+from pyutilib.misc.config import ConfigDict, ConfigValue, ConfigSetter, In
+
+
+def template(blocks, values):
+    config = ConfigDict(description="Solver options")
+    for i in range(blocks):
+        block = config.declare('block %d' % i, ConfigDict(
+            description="Options of component %d" % i))
+        for j in range(values):
+            if j % 3 == 0:
+                value = ConfigValue(default=j, domain=int)
+            elif j % 3 == 1:
+                value = ConfigValue(default=j * 0.5, domain=float)
+            else:
+                value = ConfigValue(default='a', domain=In(['a', 'b']))
+            block.declare('option %d' % j, value)
+    return config
+
+
+def options(blocks, values):
+    # The keys of an options file use underscores
+    ans = {}
+    for i in range(blocks):
+        block = ans['block_%d' % i] = {}
+        for j in range(values):
+            if j % 3 == 0:
+                block['option_%d' % j] = str(j + 1)
+            elif j % 3 == 1:
+                block['option_%d' % j] = j + 1
+            else:
+                block['option_%d' % j] = 'b'
+    return ans
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    values = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    config = template(blocks, values)
+    data = options(blocks, values)
+    setter = ConfigSetter(config)
+    a = config()
+    a.set_value(data)
+    b = config()
+    setter(data, config=b)
+    assert a.value() == b.value()
+    number = max(1, 20000 // (blocks * values))
+    print("%d blocks of %d values" % (blocks, values))
+    times = {}
+    times['set_value'] = min(timeit.repeat(
+        lambda: config.set_value(data), number=number, repeat=3)) / number
+    times['setter'] = min(timeit.repeat(
+        lambda: setter(data), number=number, repeat=3)) / number
+    times['compile'] = min(timeit.repeat(
+        lambda: ConfigSetter(config), number=number, repeat=3)) / number
+    print("  set_value():                   %10.1f us" %
+          (times['set_value'] * 1e6))
+    print("  ConfigSetter:                  %10.1f us" %
+          (times['setter'] * 1e6))
+    print("  creating the ConfigSetter:     %10.1f us" %
+          (times['compile'] * 1e6))
+    print("  speedup:                       %10.1fx" %
+          (times['set_value'] / times['setter']))
+
+
+if __name__ == '__main__':
+    main()
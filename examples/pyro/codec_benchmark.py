@@ -0,0 +1,93 @@
+#
+# Compare the cost of moving a mix of tasks through the Pyro4 serpent
+# serializer with and without the payload codecs in pyutilib.pyro.codec.
+#
+# For each codec, every task is encoded (as a Client would), serialized
+# and deserialized (as Pyro does between the client, dispatcher and
+# worker), and decoded (as a worker would).  The total time and the
+# number of bytes on the wire are reported.
+#
+#   python codec_benchmark.py [repeat]
+#
+
+import sys
+import time
+import random
+
+import Pyro4.util
+from pyutilib.pyro import Task
+from pyutilib.pyro.codec import (available_codecs, available_compressors,
+                                 encode_payload, decode_payload)
+
+try:
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+
+def task_mix():
+    random.seed(0)
+    tasks = []
+    # many small tasks
+    for i in range(1000):
+        tasks.append(Task(id=i, data={'scenario': i, 'seed': random.random()}))
+    # medium-size structured data
+    for i in range(100):
+        tasks.append(Task(id=1000 + i, data={
+            'names': ['x[%d]' % j for j in range(500)],
+            'values': [random.random() for j in range(500)]}))
+    # a few large numeric payloads
+    for i in range(10):
+        if numpy_available:
+            values = numpy.random.rand(250000)
+        else:
+            values = [random.random() for j in range(250000)]
+        tasks.append(Task(id=2000 + i, data={'values': values}))
+    return tasks
+
+
+def run(tasks, codec, compression, serializer):
+    nbytes = 0
+    start = time.time()
+    for task in tasks:
+        task = dict(task)
+        if codec is not None:
+            task['data'] = encode_payload(task['data'], codec, compression)
+        wire = serializer.serializeData(task)
+        nbytes += len(wire[0] if isinstance(wire, tuple) else wire)
+        received = serializer.deserializeData(
+            wire[0] if isinstance(wire, tuple) else wire,
+            wire[1] if isinstance(wire, tuple) else False)
+        decode_payload(received['data'])
+    return time.time() - start, nbytes
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    tasks = task_mix()
+    serializer = Pyro4.util.get_serializer('serpent')
+    configurations = [(None, None)]
+    for codec in available_codecs():
+        configurations.append((codec, None))
+        for compression in available_compressors():
+            configurations.append((codec, compression))
+    print("%-10s %-12s %10s %14s" % ("codec", "compression", "seconds",
+                                     "bytes"))
+    for codec, compression in configurations:
+        if codec is None and numpy_available:
+            # serpent cannot serialize NumPy arrays
+            data = [dict(t, data=dict((k, v.tolist() if hasattr(v, 'tolist')
+                                       else v)
+                                      for k, v in t['data'].items()))
+                    for t in tasks]
+        else:
+            data = tasks
+        best = min(run(data, codec, compression, serializer)
+                   for i in range(repeat))
+        print("%-10s %-12s %10.3f %14d" %
+              (codec or "serpent", compression or "-", best[0], best[1]))
+
+
+if __name__ == '__main__':
+    main()
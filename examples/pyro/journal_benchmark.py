@@ -0,0 +1,84 @@
+#
+# Measure the overhead of the dispatcher journal.
+#
+# A Dispatcher is driven in-process (without Pyro, so that the journal
+# is not hidden behind network latency) by several concurrent client
+# threads, as the threads of a Pyro server would drive it.  Each client
+# runs complete task cycles on its own queue: tasks are added in
+# batches, handed out, returned as results, and collected.  The cycles
+# are timed without a journal and with a journal at several sync
+# intervals; the 99th percentile of the cycle times shows whether
+# clients are stalled while the journal is synced to disk.
+#
+#   python journal_benchmark.py [ntasks] [batch] [payload bytes] [clients]
+#
+
+import os
+import sys
+import time
+import tempfile
+import threading
+
+from pyutilib.pyro import Dispatcher, Task
+
+
+def client(dispatcher, type, ntasks, batch, payload, latencies):
+    for first in range(0, ntasks, batch):
+        start = time.time()
+        dispatcher.add_tasks({type: [
+            Task(id=i, data=payload)
+            for i in range(first, min(first + batch, ntasks))]})
+        tasks = dispatcher.get_tasks(((type, False, 0),))[type]
+        for task in tasks:
+            task['result'] = len(task['data'])
+        dispatcher.add_results({type: tasks})
+        dispatcher.get_results(((type, False, 0),))
+        latencies.append(time.time() - start)
+
+
+def cycle(dispatcher, ntasks, batch, payload, nclients):
+    latencies = []
+    threads = [threading.Thread(target=client,
+                                args=(dispatcher, 'work%d' % i,
+                                      ntasks // nclients, batch, payload,
+                                      latencies))
+               for i in range(nclients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    latencies.sort()
+    return elapsed, latencies[int(0.99 * (len(latencies) - 1))]
+
+
+def main():
+    ntasks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    payload = 'x' * (int(sys.argv[3]) if len(sys.argv) > 3 else 100)
+    nclients = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    tmpdir = tempfile.mkdtemp()
+
+    print("%d clients, %d tasks in batches of %d" %
+          (nclients, ntasks, batch))
+    baseline, p99 = cycle(Dispatcher(), ntasks, batch, payload, nclients)
+    print("%-22s %8.3f seconds  %9.0f tasks/second  p99 cycle %.2f ms" %
+          ("no journal", baseline, ntasks / baseline, p99 * 1000.0))
+    for interval in (1.0, 0.05, 0.001):
+        filename = os.path.join(tmpdir, 'journal-%s' % interval)
+        dispatcher = Dispatcher(journal=filename,
+                                journal_sync_interval=interval)
+        elapsed, p99 = cycle(dispatcher, ntasks, batch, payload, nclients)
+        dispatcher._journal.close()
+        print("%-22s %8.3f seconds  %9.0f tasks/second  p99 cycle %.2f ms"
+              "  (%+.0f%%, %.1f MB journal)" %
+              ("journal, sync %gs" % interval, elapsed, ntasks / elapsed,
+               p99 * 1000.0, 100.0 * (elapsed - baseline) / baseline,
+               os.path.getsize(filename) / 1048576.0))
+        os.remove(filename)
+    os.rmdir(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -158,6 +158,7 @@ class OptionPlugin(Plugin):
             PluginGlobals.plugin_instances[
                 PluginGlobals._default_OptionData._id] = weakref.ref(
                     PluginGlobals._default_OptionData)
+            PluginGlobals.generation += 1
         #
         if len(self.data) == 0:
             #if False:
@@ -26,6 +26,7 @@ from pyutilib.component.core.core import (
     IPluginLoader, IPluginLoadPath, IIgnorePluginWhenLoading,
     IOptionDataProvider, PluginEnvironment
 )
+from pyutilib.component.core.manifest import PluginManifest
 
 #
 # This declaration is here because this is a convenient place where
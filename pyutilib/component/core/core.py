@@ -105,6 +105,8 @@ class PluginEnvironment(object):
         #
         self.loaders = None
         self.loader_paths = None
+        # The PluginManifest used by loaders in load_services()
+        self.manifest = None
         #
         self.name = name
         self.log = logger_factory(self.name)
@@ -137,6 +139,7 @@ class PluginEnvironment(object):
         for id_ in self.nonsingleton_plugins:
             del PluginGlobals.plugin_instances[id_]
         self.nonsingleton_plugins = set()
+        PluginGlobals.generation += 1
 
     def plugins(self):
         for id_ in itervalues(self.singleton_services):
@@ -146,8 +149,16 @@ class PluginEnvironment(object):
         for id_ in sorted(self.nonsingleton_plugins):
             yield PluginGlobals.plugin_instances[id_]
 
-    def load_services(self, path=None, auto_disable=False, name_re=True):
-        """Load services from IPluginLoader extension points"""
+    def load_services(self, path=None, auto_disable=False, name_re=True,
+                      manifest=None):
+        """Load services from IPluginLoader extension points
+
+        If manifest is specified (a filename or a PluginManifest), then
+        the plugins declared by each module that a loader imports are
+        recorded in the manifest.  In later calls, a module whose record
+        is current is not imported until one of its plugins is used by
+        an ExtensionPoint or a plugin factory.
+        """
 
         if self.loaders is None:
             self.loaders = ExtensionPoint(IPluginLoader)
@@ -190,8 +201,18 @@ class PluginEnvironment(object):
         else:
             name_p = re.compile(name_re)
         #
-        for loader in self.loaders:
-            loader.load(self, search_path, disable_p, name_p)
+        if manifest is not None:
+            from pyutilib.component.core.manifest import PluginManifest
+            if not isinstance(manifest, PluginManifest):
+                manifest = PluginManifest(manifest)
+        self.manifest = manifest
+        try:
+            for loader in self.loaders:
+                loader.load(self, search_path, disable_p, name_p)
+        finally:
+            self.manifest = None
+        if manifest is not None:
+            manifest.save()
         # self.clear_cache()
 
     def Xclear_cache(self):
@@ -265,31 +286,17 @@ class ExtensionPoint(object):
         extension point.  This tacitly filters out disabled extension
         points.
 
-        TODO - Can this support caching?
-        How would that relate to the weakref test?
+        The services of each interface are cached (as weak references,
+        in order of creation, and indexed by name) until
+        PluginGlobals.generation changes.  Whether a service is enabled
+        is checked on every call, since enabled() may depend on option
+        values.
         """
-        strkey = str(key)
-        ans = set()
-        remove = set()
-        if self.interface in PluginGlobals.interface_services:
-            for id_ in PluginGlobals.interface_services[self.interface]:
-                if id_ not in PluginGlobals.plugin_instances:
-                    remove.add(id_)
-                    continue
-                if id_ < 0:
-                    plugin = PluginGlobals.plugin_instances[id_]
-                else:
-                    plugin = PluginGlobals.plugin_instances[id_]()
-                if plugin is None:
-                    remove.add(id_)
-                elif ((all or plugin.enabled()) and
-                      (key is None or strkey == plugin.name)):
-                    ans.add(plugin)
-            # Remove weakrefs that were empty
-            # ZZ
-            for id_ in remove:
-                PluginGlobals.interface_services[self.interface].remove(id_)
-        return sorted(ans, key=lambda x: x._id)
+        plugins = _cached_services(self.interface,
+                                   None if key is None else str(key))
+        if all:
+            return plugins
+        return [plugin for plugin in plugins if plugin.enabled()]
 
     def __repr__(self, simple=False):
         """Return a textual representation of the extension point.
@@ -303,6 +310,145 @@ class ExtensionPoint(object):
         return '<ExtensionPoint %s%s>' % (self.interface.__name__, env_str)
 
 
+def _scan_services(interface):
+    """Return the services registered for an interface, sorted by id,
+    removing the ids of services that no longer exist."""
+    ans = set()
+    remove = set()
+    if interface in PluginGlobals.interface_services:
+        for id_ in PluginGlobals.interface_services[interface]:
+            if id_ not in PluginGlobals.plugin_instances:
+                remove.add(id_)
+                continue
+            if id_ < 0:
+                plugin = PluginGlobals.plugin_instances[id_]
+            else:
+                plugin = PluginGlobals.plugin_instances[id_]()
+            if plugin is None:
+                remove.add(id_)
+            else:
+                ans.add(plugin)
+        # Remove weakrefs that were empty
+        # ZZ
+        for id_ in remove:
+            PluginGlobals.interface_services[interface].remove(id_)
+    return sorted(ans, key=lambda x: x._id)
+
+
+def _index_services(plugins):
+    """Return a dictionary that maps names to the services with that
+    name, or None if a service does not keep its name in the name
+    property of Plugin (whose changes are tracked)."""
+    index = {}
+    for plugin in plugins:
+        if type(plugin).name is not _name_property:
+            return None
+        try:
+            index.setdefault(plugin.name, []).append(weakref.ref(plugin))
+        except TypeError:
+            # unhashable name
+            return None
+    return index
+
+
+def _cached_services(interface, name=None):
+    """Return a new list of the services registered for an interface
+    (with the given name, if it is not None), using the cached lists if
+    PluginGlobals.generation has not changed since they were built."""
+    if PluginGlobals.deferred_imports:
+        _import_deferred(interface.__name__)
+    cache = PluginGlobals.interface_cache.get(interface)
+    if cache is not None and cache[0] == PluginGlobals.generation:
+        if name is None:
+            refs = cache[1]
+        elif cache[2] is not None:
+            refs = cache[2].get(name, ())
+        else:
+            refs = [ref for ref in cache[1]
+                    if ref() is not None and ref().name == name]
+        plugins = []
+        for ref in refs:
+            plugin = ref()
+            if plugin is None:
+                # Collected, but its __del__ has not run yet
+                break
+            plugins.append(plugin)
+        else:
+            return plugins
+    generation = PluginGlobals.generation
+    plugins = _scan_services(interface)
+    PluginGlobals.interface_cache[interface] = \
+        (generation, [weakref.ref(plugin) for plugin in plugins],
+         _index_services(plugins))
+    if name is None:
+        return plugins
+    return [plugin for plugin in plugins if plugin.name == name]
+
+
+class _DeferredImport(object):
+    """A call that imports a module that declares plugins, which is
+    deferred until one of those plugins is used.  The call is made in
+    the environment that was current when it was deferred."""
+
+    def __init__(self, name, metadata, load, env):
+        self.name = name
+        self.plugins = metadata.get('plugins', [])
+        self.interfaces = metadata.get('interfaces', [])
+        self.aliases = metadata.get('aliases', {})
+        self.load = load
+        self.env = env
+        self.loaded = False
+
+    def __call__(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        for interface in self.interfaces or [None]:
+            imports = PluginGlobals.deferred_imports.get(interface)
+            if imports is not None and self in imports:
+                imports.remove(self)
+                if not imports:
+                    del PluginGlobals.deferred_imports[interface]
+        if self.env in PluginGlobals.env:
+            PluginGlobals.add_env(self.env)
+            try:
+                self.load()
+            finally:
+                PluginGlobals.pop_env()
+        else:
+            self.load()
+
+    def __repr__(self):
+        return '<DeferredImport %s>' % self.name
+
+
+def _import_deferred(interface_name, match=None):
+    """Make the deferred imports of the modules that declare plugins
+    for an interface (that satisfy match, if it is not None)."""
+    for item in list(PluginGlobals.deferred_imports.get(interface_name, ())):
+        if match is None or match(item):
+            item()
+
+
+def _import_deferred_plugin(name):
+    """Make the deferred imports of the modules that declare a plugin
+    class with the given name."""
+    for imports in list(itervalues(PluginGlobals.deferred_imports)):
+        for item in list(imports):
+            if name in item.plugins:
+                item()
+
+
+def _deferred_aliases(interface_name):
+    """Return a dictionary of the factory aliases (and their
+    documentation) declared for an interface by modules whose import has
+    been deferred."""
+    ans = {}
+    for item in PluginGlobals.deferred_imports.get(interface_name, ()):
+        ans.update(item.aliases.get(interface_name, {}))
+    return ans
+
+
 class PluginGlobals(object):
     """Global data for plugins. The main role of this class is to manage
     the stack of PluginEnvironment instances.
@@ -325,6 +471,21 @@ class PluginGlobals(object):
     #   id -> weakref(instance)
     plugin_instances = {}
 
+    # A counter that is incremented whenever the services registered
+    # for an interface may have changed.  Code that modifies
+    # interface_services or plugin_instances directly must increment it.
+    generation = 0
+
+    # The services of each interface, cached by ExtensionPoint
+    #   interface cls -> (generation, [weakref(instance)],
+    #                     name -> [weakref(instance)])
+    interface_cache = {}
+
+    # The imports of modules that declare plugins, which are deferred
+    # until one of the plugins is used (see defer_import)
+    #   interface name -> [_DeferredImport]
+    deferred_imports = {}
+
     # Environments
     env = {'pca': PluginEnvironment('pca', bootstrap=True)}
     env_map = {1: 'pca'}
@@ -407,6 +568,9 @@ class PluginGlobals(object):
             env_.cleanup()
         PluginGlobals.interface_services = {}
         PluginGlobals.plugin_instances = {}
+        PluginGlobals.interface_cache = {}
+        PluginGlobals.deferred_imports = {}
+        PluginGlobals.generation += 1
         PluginGlobals.env = {'pca': PluginEnvironment('pca', bootstrap=True)}
         PluginGlobals.env_map = {1: 'pca'}
         PluginGlobals.env_stack = ['pca']
@@ -446,6 +610,29 @@ class PluginGlobals(object):
         """Load services from IPluginLoader extension points"""
         PluginGlobals.get_env().load_services(**kwds)
 
+    @staticmethod
+    def defer_import(name, metadata, load):
+        """Defer a call to load(), which imports a module that declares
+        plugins, until one of those plugins is used.  The metadata is a
+        dictionary with the names of the plugin classes that the module
+        declares ('plugins'), the names of the interfaces that they and
+        the services created by the module implement ('interfaces'), and
+        the factory aliases that they declare ('aliases', a dictionary
+        that maps interface names to dictionaries of alias -> doc).
+
+        The import is made when an ExtensionPoint for one of these
+        interfaces is used, when a factory for one of these interfaces
+        is asked for one of these aliases, or when PluginFactory is
+        asked for one of these plugin classes.  A module that declares
+        no interfaces is only imported in the latter case.
+        """
+        item = _DeferredImport(name, metadata, load,
+                               PluginGlobals.get_env().name)
+        for interface in item.interfaces or [None]:
+            PluginGlobals.deferred_imports.setdefault(interface,
+                                                      []).append(item)
+        return item
+
     @staticmethod
     def pprint(**kwds):
         """A pretty-print function"""
@@ -842,6 +1029,19 @@ class Plugin(with_metaclass(PluginMeta, object)):
         if "name" in kwargs:
             self.name = kwargs["name"]
 
+    def _get_name(self):
+        return self._plugin_name
+
+    def _set_name(self, name):
+        self._plugin_name = name
+        # The name index of the ExtensionPoint cache is out of date
+        if PluginGlobals is not None:
+            PluginGlobals.generation += 1
+
+    name = property(_get_name, _set_name,
+                    doc="The name of this plugin, used as the key of "
+                    "ExtensionPoint lookups")
+
     def __new__(cls, *args, **kwargs):
         """Plugin constructor"""
         #
@@ -886,6 +1086,7 @@ class Plugin(with_metaclass(PluginMeta, object)):
         for interface in self.__interfaces__:
             PluginGlobals.interface_services.setdefault(interface,
                                                         set()).add(self._id)
+        PluginGlobals.generation += 1
 
     def deactivate(self):
         """Unregister this plugin with all interfaces that it implements."""
@@ -899,6 +1100,7 @@ class Plugin(with_metaclass(PluginMeta, object)):
         for interface in PluginGlobals.interface_services:
             # Remove an element if it exists
             PluginGlobals.interface_services[interface].discard(self._id)
+        PluginGlobals.generation += 1
 
     #
     # Support "with" statements. Forgetting to call deactivate
@@ -975,6 +1177,7 @@ class Plugin(with_metaclass(PluginMeta, object)):
 
 alias = Plugin.alias
 implements = Plugin.implements
+_name_property = Plugin.__dict__['name']
 
 
 class SingletonPlugin(Plugin):
@@ -999,23 +1202,41 @@ def CreatePluginFactory(_interface):
             if _name is None:
                 return self
             _name = str(_name)
+            self._import(_name)
             if _name not in _interface._factory_active:
                 return None
             return PluginFactory(_interface._factory_cls[_name], args, **kwds)
 
+        def _import(self, name):
+            # Import the deferred module that declares an alias
+            if name not in _interface._factory_cls and \
+               PluginGlobals.deferred_imports:
+                _import_deferred(_interface.__name__,
+                                 lambda item: name in item.aliases.get(
+                                     _interface.__name__, ()))
+
         def services(self):
-            return list(_interface._factory_active.keys())
+            ans = list(_interface._factory_active.keys())
+            for name in _deferred_aliases(_interface.__name__):
+                if name not in _interface._factory_cls:
+                    ans.append(name)
+            return ans
 
         def get_class(self, name):
+            self._import(name)
             return _interface._factory_cls[name]
 
         def doc(self, name):
-            tmp = _interface._factory_doc[name]
+            if name in _interface._factory_doc:
+                tmp = _interface._factory_doc[name]
+            else:
+                tmp = _deferred_aliases(_interface.__name__)[name]
             if tmp is None:
                 return ""
             return tmp
 
         def deactivate(self, name):
+            self._import(name)
             if name in _interface._factory_active:
                 _interface._factory_deactivated[
                     name] = _interface._factory_active[name]
@@ -1034,9 +1255,11 @@ def PluginFactory(classname, args=[], **kwds):
     """Construct a Plugin instance, and optionally assign it a name"""
 
     if isinstance(classname, str):
+        registry = PluginGlobals.get_env(kwds.get('env', None)).plugin_registry
+        if classname not in registry:
+            _import_deferred_plugin(classname)
         try:
-            cls = PluginGlobals.get_env(kwds.get('env', None)).plugin_registry[
-                classname]
+            cls = registry[classname]
         except KeyError:
             raise PluginError("Unknown class %r" % str(classname))
     else:
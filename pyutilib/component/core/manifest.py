@@ -0,0 +1,148 @@
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# A manifest of the plugins declared by the modules that plugin loaders
+# import.
+#
+# The manifest is a JSON file that maps a key for each module (e.g., its
+# filename) to a stamp that identifies the version of the module that
+# was imported (e.g., its modification time and size), and to the
+# plugin classes, interfaces and factory aliases that the import
+# declared.  A loader registers the call that imports each module with
+# the manifest: if the manifest holds a record of the module with the
+# same stamp, the call is deferred (see PluginGlobals.defer_import);
+# otherwise, the module is imported immediately and its record updated.
+#
+
+__all__ = ['PluginManifest']
+
+import os
+import json
+import logging
+from six import itervalues
+
+from pyutilib.component.core.core import PluginGlobals
+
+logger = logging.getLogger('pyutilib.component.core')
+
+# The version of the manifest format
+_version = 1
+
+
+def _snapshot():
+    """Return the plugin counter and the ids of the plugin classes that
+    are registered in all environments."""
+    return (PluginGlobals.plugin_counter,
+            set(id(cls)
+                for env_ in itervalues(PluginGlobals.env)
+                for cls in itervalues(env_.plugin_registry)))
+
+
+def _metadata(snapshot):
+    """Return the plugin classes, interfaces and aliases that have been
+    declared since a snapshot was taken."""
+    counter, classes = snapshot
+    plugins = set()
+    interfaces = set()
+    aliases = {}
+    for env_ in list(itervalues(PluginGlobals.env)):
+        for cls in list(itervalues(env_.plugin_registry)):
+            if id(cls) in classes:
+                continue
+            plugins.add(cls.__name__)
+            for interface in cls.__interfaces__:
+                interfaces.add(interface.__name__)
+                factory_cls = getattr(interface, '_factory_cls', None) or {}
+                for name, doc, subclass in getattr(cls, '_factory_aliases',
+                                                   ()):
+                    if factory_cls.get(name) is cls:
+                        aliases.setdefault(interface.__name__, {})[name] = doc
+    #
+    # Services that were created by the import (e.g., options)
+    #
+    for id_, plugin in list(PluginGlobals.plugin_instances.items()):
+        if abs(id_) <= counter:
+            continue
+        if id_ > 0:
+            plugin = plugin()
+        if plugin is None:
+            continue
+        interfaces.update(interface.__name__
+                          for interface in plugin.__interfaces__)
+    return {'plugins': sorted(plugins),
+            'interfaces': sorted(interfaces),
+            'aliases': aliases}
+
+
+class PluginManifest(object):
+    """
+    A record of the plugins that are declared by the modules imported
+    by plugin loaders, which is saved in a file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        # key -> {'stamp', 'plugins', 'interfaces', 'aliases'}
+        self.modules = {}
+        self.modified = False
+        if os.path.exists(filename):
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.filename, 'r') as INPUT:
+                data = json.load(INPUT)
+        except (IOError, OSError, ValueError):
+            logger.warning("Ignoring the plugin manifest %s, which "
+                           "cannot be read" % self.filename)
+            return
+        if not isinstance(data, dict) or data.get('version') != _version:
+            logger.warning("Ignoring the plugin manifest %s, which has an "
+                           "unknown format" % self.filename)
+            return
+        self.modules = data.get('modules', {})
+
+    def save(self):
+        """Save the manifest, if it has been modified."""
+        if not self.modified:
+            return
+        tmpname = self.filename + '.tmp'
+        try:
+            with open(tmpname, 'w') as OUTPUT:
+                json.dump({'version': _version, 'modules': self.modules},
+                          OUTPUT, sort_keys=True, indent=1)
+            getattr(os, 'replace', os.rename)(tmpname, self.filename)
+        except (IOError, OSError):
+            logger.warning("Cannot write the plugin manifest %s" %
+                           self.filename)
+            return
+        self.modified = False
+
+    def register(self, key, stamp, load):
+        """Register the call load(), which imports a module.
+
+        If the manifest holds a record of the module with this stamp,
+        which declares plugins, then the call is deferred until one of
+        them is used.  Otherwise, the module is imported now and its
+        record is updated.  Returns True if the call was deferred.
+        """
+        stamp = list(stamp)
+        record = self.modules.get(key)
+        if record is not None and record.get('stamp') == stamp and \
+           (record.get('plugins') or record.get('interfaces')):
+            PluginGlobals.defer_import(key, record, load)
+            return True
+        snapshot = _snapshot()
+        load()
+        record = _metadata(snapshot)
+        record['stamp'] = stamp
+        if self.modules.get(key) != record:
+            self.modules[key] = record
+            self.modified = True
+        return False
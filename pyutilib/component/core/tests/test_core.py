@@ -241,6 +241,58 @@ class TestExtensionPoint(unittest.TestCase):
         self.assertEqual(set(namespace_current1), set((s1, s2)))
         self.assertEqual(set(namespace_current2), set((s1, s2)))
 
+    def test_ep_cache(self):
+        """Test that cached ExtensionPoint services are kept up to date"""
+        ep = ExtensionPoint(IDebug1)
+        s1 = Plugin1()
+        s2 = Plugin2()
+        self.assertEqual(ep.extensions(), [s1, s2])
+        # the caller may modify the list that is returned
+        ep.extensions().pop()
+        self.assertEqual(ep.extensions(), [s1, s2])
+        s3 = Plugin4()
+        self.assertEqual(ep.extensions(), [s1, s2, s3])
+        s2.deactivate()
+        self.assertEqual(ep.extensions(), [s1, s3])
+        s2.activate()
+        self.assertEqual(ep.extensions(), [s1, s2, s3])
+        s1.disable()
+        self.assertEqual(ep.extensions(), [s2, s3])
+        self.assertEqual(ep.extensions(all=True), [s1, s2, s3])
+        s1.enable()
+        s3.name = "p3"
+        self.assertEqual(ep("p3"), [s3])
+        del s2
+        self.assertEqual(ep.extensions(), [s1, s3])
+
+    def test_ep_name_index(self):
+        """Test ExtensionPoint lookups by name"""
+        ep = ExtensionPoint(IDebug1)
+        s1 = Plugin1(name="p1")
+        s2 = Plugin2(name="p2")
+        self.assertEqual(ep.service("p1"), s1)
+        self.assertEqual(ep.service("p3"), None)
+        s2.name = "p3"
+        self.assertEqual(ep.service("p2"), None)
+        self.assertEqual(ep.service("p3"), s2)
+        s2.disable()
+        self.assertEqual(ep.service("p3"), None)
+        self.assertEqual(ep.service("p3", all=True), s2)
+        s3 = Plugin4(name="p1")
+        self.assertEqual(ep("p1"), [s1, s3])
+
+        # A plugin class may redefine the name attribute
+        class Plugin12(Plugin):
+            implements(IDebug1, service=True)
+            name = "p4"
+
+        s4 = Plugin12()
+        self.assertEqual(ep.service("p4"), None)
+        s4.name = "p4"
+        self.assertEqual(ep.service("p4"), s4)
+        s4.name = "p5"
+        self.assertEqual(ep.service("p5"), s4)
+
 
 class TestPlugin(unittest.TestCase):
 
@@ -15,6 +15,7 @@ __all__ = ['EggLoader']
 import os
 import sys
 import logging
+import functools
 from pyutilib.component.config import ManagedPlugin
 from pyutilib.component.core import implements, ExtensionPoint, IPluginLoader
 
@@ -94,45 +95,63 @@ class EggLoader(ManagedPlugin):
                     env.log.debug('Ignoring plugin %r from %r', dist,
                                   dist.location)
 
-        def _log_error(item, e):
-            gen_debug = __debug__ and env.log.isEnabledFor(logging.DEBUG)
-            if isinstance(e, pkg_resources.DistributionNotFound):
-                if gen_debug:
-                    env.log.debug('Skipping "%s": ("%s" not found)', item, e)
-            elif isinstance(e, pkg_resources.VersionConflict):
-                if gen_debug:
-                    env.log.debug('Skipping "%s": (version conflict "%s")',
-                                  item, e)
-            elif isinstance(e, pkg_resources.UnknownExtra):
-                env.log.error('Skipping "%s": (unknown extra "%s")', item, e)
-            elif isinstance(e, ImportError):
-                env.log.error('Skipping "%s": (can\'t import "%s")', item, e)
-            else:
-                env.log.error('Skipping "%s": (error "%s")', item, e)
-
         for dist, e in errors.items():
-            _log_error(dist, e)
+            _log_error(env, dist, e)
 
+        manifest = getattr(env, 'manifest', None)
         for entry in working_set.iter_entry_points(self.entry_point_name):
-            if generate_debug_messages:
-                env.log.debug('Loading %r from %r', entry.name,
+            load = functools.partial(self._load_entry, env, entry, disable_re)
+            if manifest is None:
+                load()
+                continue
+            #
+            # Defer the import if the manifest records the plugins
+            # declared by this version of the distribution
+            #
+            if manifest.register(
+                    '%s: %s' % (self.entry_point_name, entry),
+                    [entry.dist.location, str(entry.dist.version)], load) \
+               and generate_debug_messages:
+                env.log.debug('Deferring %r from %r', entry.name,
                               entry.dist.location)
-            try:
-                entry.load(require=True)
-            except (ImportError,
-                    pkg_resources.DistributionNotFound,
-                    pkg_resources.VersionConflict,
-                    pkg_resources.UnknownExtra):
-                e = sys.exc_info()[1]
-                _log_error(entry, e)
-            else:
-                if not disable_re.match(os.path.dirname(
-                        entry.module_name)) is None:
-                    #_enable_plugin(env, entry.module_name)
-                    pass
 
         env.log.info('END -    Loading plugins with an EggLoader service')
 
+    def _load_entry(self, env, entry, disable_re):
+        if __debug__ and env.log.isEnabledFor(logging.DEBUG):
+            env.log.debug('Loading %r from %r', entry.name,
+                          entry.dist.location)
+        try:
+            entry.load(require=True)
+        except (ImportError,
+                pkg_resources.DistributionNotFound,
+                pkg_resources.VersionConflict,
+                pkg_resources.UnknownExtra):
+            e = sys.exc_info()[1]
+            _log_error(env, entry, e)
+        else:
+            if not disable_re.match(os.path.dirname(
+                    entry.module_name)) is None:
+                #_enable_plugin(env, entry.module_name)
+                pass
+
+
+def _log_error(env, item, e):
+    gen_debug = __debug__ and env.log.isEnabledFor(logging.DEBUG)
+    if isinstance(e, pkg_resources.DistributionNotFound):
+        if gen_debug:
+            env.log.debug('Skipping "%s": ("%s" not found)', item, e)
+    elif isinstance(e, pkg_resources.VersionConflict):
+        if gen_debug:
+            env.log.debug('Skipping "%s": (version conflict "%s")',
+                          item, e)
+    elif isinstance(e, pkg_resources.UnknownExtra):
+        env.log.error('Skipping "%s": (unknown extra "%s")', item, e)
+    elif isinstance(e, ImportError):
+        env.log.error('Skipping "%s": (can\'t import "%s")', item, e)
+    else:
+        env.log.error('Skipping "%s": (error "%s")', item, e)
+
 # Copyright (C) 2005-2008 Edgewall Software
 # Copyright (C) 2005-2006 Christopher Lenz <cmlenz@gmx.de>
 # All rights reserved.
@@ -14,6 +14,7 @@ __all__ = ['ImportLoader']
 
 from glob import glob
 import imp
+import functools
 import re
 import os
 import sys
@@ -37,6 +38,7 @@ class ImportLoader(ManagedSingletonPlugin):
         generate_debug_messages = __debug__ and env.log.isEnabledFor(
             logging.DEBUG)
         env.log.info('Loading plugins with ImportLoader')
+        manifest = getattr(env, 'manifest', None)
         for path in search_path:
             plugin_files = glob(os.path.join(path, '*.py'))
             #
@@ -45,71 +47,95 @@ class ImportLoader(ManagedSingletonPlugin):
             #
             for plugin_file in sorted(plugin_files):
                 #print("ImportLoader:",plugin_file)
-                #
-                # Load the module
-                #
-                module = None
                 plugin_name = os.path.basename(plugin_file[:-3])
-                if plugin_name not in sys.modules and name_re.match(
+                if plugin_name in sys.modules or not name_re.match(
                         plugin_name):
-                    try:
-                        module = imp.load_source(plugin_name, plugin_file)
-                        if generate_debug_messages:
-                            env.log.debug('Loading file plugin %s from %s' % \
+                    continue
+                load = functools.partial(self._load_module, env,
+                                         plugin_name, plugin_file, disable_re)
+                if manifest is None:
+                    load()
+                    continue
+                #
+                # Defer the import if the manifest records the plugins
+                # declared by this version of the file
+                #
+                stat = os.stat(plugin_file)
+                if manifest.register(plugin_file,
+                                     [stat.st_mtime, stat.st_size], load) \
+                   and generate_debug_messages:
+                    env.log.debug('Deferring file plugin %s from %s' % \
                                   (plugin_name, plugin_file))
-                    except Exception:
-                        e = sys.exc_info()[1]
-                        env.log.error(
-                            'Failed to load plugin from %s',
-                            plugin_file,
-                            exc_info=True)
-                        env.log.error('Load error: %r' % str(e))
+
+    def _load_module(self, env, plugin_name, plugin_file, disable_re):
+        generate_debug_messages = __debug__ and env.log.isEnabledFor(
+            logging.DEBUG)
+        if plugin_name in sys.modules:
+            # The module was imported since its import was deferred
+            return
+        #
+        # Load the module
+        #
+        module = None
+        try:
+            module = imp.load_source(plugin_name, plugin_file)
+            if generate_debug_messages:
+                env.log.debug('Loading file plugin %s from %s' % \
+                      (plugin_name, plugin_file))
+        except Exception:
+            e = sys.exc_info()[1]
+            env.log.error(
+                'Failed to load plugin from %s',
+                plugin_file,
+                exc_info=True)
+            env.log.error('Load error: %r' % str(e))
+        #
+        # Disable singleton plugins that match
+        #
+        if module is None:
+            return
+        if not disable_re.match(plugin_name) is None:
+            if generate_debug_messages:
+                env.log.debug('Disabling services in module %s' %
+                              plugin_name)
+            for item in dir(module):
                 #
-                # Disable singleton plugins that match
+                # This seems like a hack, but
+                # without this we can disable pyutilib
+                # functionality!
                 #
-                if not module is None:
-                    if not disable_re.match(plugin_name) is None:
-                        if generate_debug_messages:
-                            env.log.debug('Disabling services in module %s' %
-                                          plugin_name)
-                        for item in dir(module):
-                            #
-                            # This seems like a hack, but
-                            # without this we can disable pyutilib
-                            # functionality!
-                            #
-                            flag = False
-                            for service in ImportLoader.ep_services:
-                                if service.ignore(item):
-                                    flag = True
-                                    break
-                            if flag:
-                                continue
+                flag = False
+                for service in ImportLoader.ep_services:
+                    if service.ignore(item):
+                        flag = True
+                        break
+                if flag:
+                    continue
 
-                            cls = getattr(module, item)
-                            try:
-                                is_instance = isinstance(cls, Plugin)
-                            except TypeError:  #pragma:nocover
-                                is_instance = False
-                            try:
-                                is_plugin = issubclass(cls, Plugin)
-                            except TypeError:
-                                is_plugin = False
-                            try:
-                                is_singleton = not (cls.__instance__ is None)
-                            except AttributeError:  #pragma:nocover
-                                is_singleton = False
-                            if is_singleton and is_plugin:
-                                if generate_debug_messages:
-                                    env.log.debug('Disabling service %s' % item)
-                                cls.__instance__._enable = False
-                            if is_instance:
-                                if generate_debug_messages:
-                                    env.log.debug('Disabling service %s' % item)
-                                cls._enable = False
-                    elif generate_debug_messages:
-                        env.log.debug('All services in module %s are enabled' %
-                                      plugin_name)
+                cls = getattr(module, item)
+                try:
+                    is_instance = isinstance(cls, Plugin)
+                except TypeError:  #pragma:nocover
+                    is_instance = False
+                try:
+                    is_plugin = issubclass(cls, Plugin)
+                except TypeError:
+                    is_plugin = False
+                try:
+                    is_singleton = not (cls.__instance__ is None)
+                except AttributeError:  #pragma:nocover
+                    is_singleton = False
+                if is_singleton and is_plugin:
+                    if generate_debug_messages:
+                        env.log.debug('Disabling service %s' % item)
+                    cls.__instance__._enable = False
+                if is_instance:
+                    if generate_debug_messages:
+                        env.log.debug('Disabling service %s' % item)
+                    cls._enable = False
+        elif generate_debug_messages:
+            env.log.debug('All services in module %s are enabled' %
+                          plugin_name)
 
 # Copyright (C) 2005-2008 Edgewall Software
 # Copyright (C) 2005-2006 Christopher Lenz <cmlenz@gmx.de>
@@ -3,6 +3,10 @@
 #
 
 import os
+import sys
+import json
+import shutil
+import tempfile
 from os.path import abspath, dirname
 currdir = dirname(abspath(__file__)) + os.sep
 
@@ -69,5 +73,87 @@ class TestLoader(unittest.TestCase):
             name_re=True)
 
 
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.module = 'manifest_plugin_%d' % os.getpid()
+        with open(os.path.join(self.tmpdir, self.module + '.py'), 'w') as f:
+            f.write("from pyutilib.component.core import *\n"
+                    "\n"
+                    "class ManifestLoadPath(SingletonPlugin):\n"
+                    "    implements(IPluginLoadPath)\n"
+                    "\n"
+                    "    def get_load_path(self):\n"
+                    "        return []\n")
+        self.manifest = os.path.join(self.tmpdir, 'manifest.json')
+        # Other tests may leave the option that enables the
+        # ImportLoader service undefined
+        self.loader = pyutilib.component.core.ExtensionPoint(
+            pyutilib.component.core.IPluginLoader).service(
+                'ImportLoader', all=True)
+        self.enable = self.loader._enable
+        self.loader._enable = True
+
+    def tearDown(self):
+        self.loader._enable = self.enable
+        sys.modules.pop(self.module, None)
+        shutil.rmtree(self.tmpdir)
+
+    def load(self):
+        env = pyutilib.component.core.PluginGlobals.add_env(
+            "testing.manifest")
+        try:
+            env.load_services(
+                path=self.tmpdir, manifest=self.manifest)
+        finally:
+            pyutilib.component.core.PluginGlobals.pop_env()
+        return env
+
+    def test_manifest(self):
+        env = self.load()
+        try:
+            self.assertTrue(self.module in sys.modules)
+            self.assertTrue('ManifestLoadPath' in env.plugin_registry)
+        finally:
+            pyutilib.component.core.PluginGlobals.remove_env(
+                "testing.manifest", cleanup=True)
+        with open(self.manifest) as f:
+            data = json.load(f)
+        record = data['modules'][os.path.join(self.tmpdir,
+                                              self.module + '.py')]
+        self.assertEqual(record['plugins'], ['ManifestLoadPath'])
+        self.assertEqual(record['interfaces'], ['IPluginLoadPath'])
+        #
+        # The import is deferred until the interface is used
+        #
+        del sys.modules[self.module]
+        env = self.load()
+        try:
+            self.assertFalse(self.module in sys.modules)
+            self.assertFalse('ManifestLoadPath' in env.plugin_registry)
+            ep = pyutilib.component.core.ExtensionPoint(
+                pyutilib.component.core.IPluginLoadPath)
+            self.assertTrue('ManifestLoadPath' in
+                            [service.name for service in ep])
+            self.assertTrue(self.module in sys.modules)
+            self.assertTrue('ManifestLoadPath' in env.plugin_registry)
+        finally:
+            pyutilib.component.core.PluginGlobals.remove_env(
+                "testing.manifest", cleanup=True)
+        #
+        # A modified file is imported again
+        #
+        del sys.modules[self.module]
+        with open(os.path.join(self.tmpdir, self.module + '.py'), 'a') as f:
+            f.write("\n")
+        env = self.load()
+        try:
+            self.assertTrue(self.module in sys.modules)
+        finally:
+            pyutilib.component.core.PluginGlobals.remove_env(
+                "testing.manifest", cleanup=True)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# A script that measures the time needed to import Python modules, and
+# checks it against a budget.
+#
+# Each module is imported in a new Python interpreter with the
+# '-X importtime' option (Python 3.7 or later), which reports the time
+# spent importing each module that it imports.  A 'warm' import uses
+# the bytecode that is cached in __pycache__ directories; a 'cold'
+# import compiles every module from source (using an empty
+# PYTHONPYCACHEPREFIX directory, which requires Python 3.8 or later).
+# The imports are repeated, and the smallest time is reported for each
+# module.
+#
+# Budgets are the cumulative import times, in milliseconds, allowed for
+# the modules that are imported.  The script returns a nonzero exit
+# status if a budget is exceeded, so it can be used in continuous
+# integration tests.
+#
+#   pyutilib_importtime pyutilib.component.core pyutilib.misc
+#   pyutilib_importtime --tree --threshold=1 pyutilib.workflow
+#   pyutilib_importtime --budget=pyutilib.misc=100 pyutilib.misc
+#
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+_line_re = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( +)(\S+)\s*$')
+
+default_modules = ['pyutilib.component.core', 'pyutilib.misc',
+                   'pyutilib.workflow']
+
+
+class ImportNode(object):
+    """The import of a module, and the imports that it made."""
+
+    def __init__(self, name, self_us, cumulative_us, children=None):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.children = children or []
+
+    def walk(self, depth=0):
+        """Generate (depth, node) pairs for this node and its
+        descendants, in import order."""
+        yield depth, self
+        for child in self.children:
+            for item in child.walk(depth + 1):
+                yield item
+
+    def __repr__(self):
+        return '<ImportNode %s self=%d cumulative=%d>' % (
+            self.name, self.self_us, self.cumulative_us)
+
+
+def parse_importtime(text):
+    """Parse the output of 'python -X importtime', returning the list of
+    ImportNode objects for the top-level imports."""
+    # The output lists each import after the imports that it made, and
+    # indents each nested import by two spaces
+    pending = {}
+    for line in text.splitlines():
+        match = _line_re.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = (len(indent) - 1) // 2
+        node = ImportNode(name, int(self_us), int(cumulative_us),
+                          pending.pop(depth + 1, []))
+        pending.setdefault(depth, []).append(node)
+    return pending.get(0, [])
+
+
+def import_tree(module, cold=False, python=None):
+    """Import a module in a new interpreter, returning the ImportNode for
+    it and the wall-clock time (in seconds) of the interpreter."""
+    env = dict(os.environ)
+    cachedir = None
+    if cold:
+        cachedir = tempfile.mkdtemp()
+        env['PYTHONPYCACHEPREFIX'] = cachedir
+    try:
+        start = time.time()
+        process = subprocess.Popen(
+            [python or sys.executable, '-X', 'importtime', '-c',
+             'import ' + module],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env)
+        output, errors = process.communicate()
+        elapsed = time.time() - start
+    finally:
+        if cachedir is not None:
+            shutil.rmtree(cachedir, ignore_errors=True)
+    errors = errors.decode('utf-8', 'replace')
+    if process.returncode:
+        raise RuntimeError("Cannot import %s:\n%s" % (module, errors))
+    for node in parse_importtime(errors):
+        if node.name == module:
+            return node, elapsed
+    # The module was imported when the interpreter started
+    return ImportNode(module, 0, 0), elapsed
+
+
+def measure(module, cold=False, repeat=5, python=None):
+    """Import a module repeatedly, returning the ImportNode of the
+    fastest import, a dictionary that maps the name of each module that
+    it imported to the smallest (self, cumulative) times in
+    microseconds, and the smallest wall-clock time of the interpreter."""
+    best = None
+    times = {}
+    wall = None
+    for i in range(repeat):
+        node, elapsed = import_tree(module, cold=cold, python=python)
+        if best is None or node.cumulative_us < best.cumulative_us:
+            best = node
+        wall = elapsed if wall is None else min(wall, elapsed)
+        # A module is listed twice when the import of its package
+        # imports it, so the times of each listing are combined
+        run = {}
+        for depth, item in node.walk():
+            if item.name in run:
+                old = run[item.name]
+                run[item.name] = (old[0] + item.self_us,
+                                  max(old[1], item.cumulative_us))
+            else:
+                run[item.name] = (item.self_us, item.cumulative_us)
+        for name, value in run.items():
+            if name in times:
+                times[name] = (min(times[name][0], value[0]),
+                               min(times[name][1], value[1]))
+            else:
+                times[name] = value
+    return best, times, wall
+
+
+def check_budgets(times, budgets):
+    """Return a list of (module, time in ms, budget in ms) tuples for the
+    modules whose cumulative import time exceeds their budget.  The time
+    is None for modules with a budget that were never imported (e.g.,
+    because the module name is misspelled)."""
+    ans = []
+    for name in sorted(budgets):
+        if name not in times:
+            ans.append((name, None, budgets[name]))
+            continue
+        value = times[name][1] / 1000.0
+        if value > budgets[name]:
+            ans.append((name, value, budgets[name]))
+    return ans
+
+
+def _merge_times(all_times, times):
+    # Keep the largest times of each module over the measured modules
+    for name, value in times.items():
+        if name in all_times:
+            all_times[name] = (max(all_times[name][0], value[0]),
+                               max(all_times[name][1], value[1]))
+        else:
+            all_times[name] = value
+
+
+def _budget_failures(kind, times, budgets):
+    failures = []
+    for name, value, limit in check_budgets(times, budgets):
+        if value is None:
+            failures.append("%s import of %s: not measured (budget "
+                            "%.2f ms)" % (kind, name, limit))
+        else:
+            failures.append("%s import of %s: %.2f ms > %.2f ms" %
+                            (kind, name, value, limit))
+    return failures
+
+
+def _parse_budget(option, opt, value, parser, dest):
+    try:
+        name, limit = value.rsplit('=', 1)
+        limit = float(limit)
+    except ValueError:
+        raise optparse.OptionValueError(
+            "Option %s: expected MODULE=MILLISECONDS, not %r" % (opt, value))
+    getattr(parser.values, dest)[name] = limit
+
+
+def _print_tree(node, threshold, depth_limit):
+    print("%10s %12s  %s" % ("self ms", "cumulative", "module"))
+    for depth, item in node.walk():
+        if depth_limit is not None and depth > depth_limit:
+            continue
+        if item.cumulative_us / 1000.0 < threshold:
+            continue
+        print("%10.2f %12.2f  %s%s" %
+              (item.self_us / 1000.0, item.cumulative_us / 1000.0,
+               '  ' * depth, item.name))
+
+
+def importtime(args):
+    parser = optparse.OptionParser(
+        usage='pyutilib_importtime [OPTIONS] [module ...]',
+        description='Measure the time needed to import Python modules '
+        '(by default, %s).' % ', '.join(default_modules))
+    parser.add_option(
+        '-r',
+        '--repeat',
+        action='store',
+        dest='repeat',
+        type='int',
+        default=5,
+        help='The number of times that each module is imported '
+        '(default 5).  The smallest times are reported.')
+    parser.add_option(
+        '--cold',
+        action='store_true',
+        dest='cold',
+        default=False,
+        help='Measure cold imports, which compile modules from source, '
+        'as well as warm imports.')
+    parser.add_option(
+        '--tree',
+        action='store_true',
+        dest='tree',
+        default=False,
+        help='Print the tree of imports made by each module.')
+    parser.add_option(
+        '--depth',
+        action='store',
+        dest='depth',
+        type='int',
+        default=None,
+        help='The largest depth of the import tree that is printed.')
+    parser.add_option(
+        '--threshold',
+        action='store',
+        dest='threshold',
+        type='float',
+        default=0.0,
+        help='Omit the imports whose cumulative time is less than this '
+        'many milliseconds.')
+    parser.add_option(
+        '--prefix',
+        action='store',
+        dest='prefix',
+        default=None,
+        help='Report the imports of the modules with this prefix '
+        '(default, the top-level package of each module).')
+    parser.add_option(
+        '--budget',
+        action='callback',
+        callback=_parse_budget,
+        callback_args=('budget',),
+        type='string',
+        metavar='MODULE=MS',
+        help='The cumulative time, in milliseconds, allowed for a warm '
+        'import of a module.  This option can be repeated.')
+    parser.add_option(
+        '--cold-budget',
+        action='callback',
+        callback=_parse_budget,
+        callback_args=('cold_budget',),
+        type='string',
+        metavar='MODULE=MS',
+        help='The cumulative time, in milliseconds, allowed for a cold '
+        'import of a module.  This option can be repeated.')
+    parser.add_option(
+        '--budget-file',
+        action='store',
+        dest='budget_file',
+        default=None,
+        help='A JSON file with the budgets for warm imports (under the '
+        '"warm" key) and cold imports (under the "cold" key), each a '
+        'dictionary that maps module names to milliseconds.')
+    parser.add_option(
+        '--python',
+        action='store',
+        dest='python',
+        default=sys.executable,
+        help='The Python interpreter that is measured.')
+    parser.set_defaults(budget={}, cold_budget={})
+    options, modules = parser.parse_args(args)
+    if not modules:
+        modules = default_modules
+    budget = {}
+    cold_budget = {}
+    if options.budget_file is not None:
+        with open(options.budget_file, 'r') as INPUT:
+            data = json.load(INPUT)
+        budget.update(data.get('warm', {}))
+        cold_budget.update(data.get('cold', {}))
+    budget.update(options.budget)
+    cold_budget.update(options.cold_budget)
+    cold = options.cold or bool(cold_budget)
+    if sys.version_info < (3, 7):
+        parser.error("Python 3.7 or later is needed to measure imports")
+    if cold and sys.version_info < (3, 8):
+        parser.error("Python 3.8 or later is needed to measure cold imports")
+    #
+    all_times = {}
+    all_cold_times = {}
+    for module in modules:
+        prefix = options.prefix or module.split('.')[0]
+        node, times, wall = measure(module, repeat=options.repeat,
+                                    python=options.python)
+        if cold:
+            cold_node, cold_times, cold_wall = measure(
+                module, cold=True, repeat=options.repeat,
+                python=options.python)
+        print("Module %s" % module)
+        print("  warm import: %10.2f ms   (interpreter %.2f ms)" %
+              (node.cumulative_us / 1000.0, wall * 1000.0))
+        if cold:
+            print("  cold import: %10.2f ms   (interpreter %.2f ms)" %
+                  (cold_node.cumulative_us / 1000.0, cold_wall * 1000.0))
+        print("")
+        if cold:
+            print("  %10s %10s %10s %10s  %s" %
+                  ("warm self", "warm cum", "cold self", "cold cum", "module"))
+        else:
+            print("  %10s %10s  %s" % ("self ms", "cum ms", "module"))
+        for name in sorted(times, key=lambda x: -times[x][1]):
+            if not (name == prefix or name.startswith(prefix + '.')):
+                continue
+            if times[name][1] / 1000.0 < options.threshold:
+                continue
+            if cold:
+                cold_self, cold_cum = cold_times.get(name, (0, 0))
+                print("  %10.2f %10.2f %10.2f %10.2f  %s" %
+                      (times[name][0] / 1000.0, times[name][1] / 1000.0,
+                       cold_self / 1000.0, cold_cum / 1000.0, name))
+            else:
+                print("  %10.2f %10.2f  %s" %
+                      (times[name][0] / 1000.0, times[name][1] / 1000.0,
+                       name))
+        if options.tree:
+            print("")
+            _print_tree(node, options.threshold, options.depth)
+        print("")
+        _merge_times(all_times, times)
+        if cold:
+            _merge_times(all_cold_times, cold_times)
+    #
+    failures = _budget_failures('warm', all_times, budget)
+    failures.extend(_budget_failures('cold', all_cold_times, cold_budget))
+    if failures:
+        print("Import time budgets exceeded:")
+        for failure in failures:
+            print("  " + failure)
+        return 1
+    if budget or cold_budget:
+        print("Import time budgets met")
+    return 0
+
+
+# The [console_scripts] entry point requires a function that takes no
+# arguments
+def main():
+    sys.exit(importtime(sys.argv[1:]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import sys
+import six
+import pyutilib.misc
+from pyutilib.dev.importtime import (parse_importtime, check_budgets,
+                                     importtime)
+
+import pyutilib.th as unittest
+
+output = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   _io
+import time:        20 |         20 |     pkg.b
+import time:        30 |         50 |   pkg.a
+import time:        40 |         90 | pkg
+import time:        10 |         10 | other
+"""
+
+
+class Test_Importtime(unittest.TestCase):
+
+    def _run(self, args):
+        stream_out = six.StringIO()
+        pyutilib.misc.setup_redirect(stream_out)
+        try:
+            rc = importtime(args)
+        finally:
+            pyutilib.misc.reset_redirect()
+        return rc, stream_out.getvalue()
+
+    def test_parse(self):
+        roots = parse_importtime(output)
+        self.assertEqual([node.name for node in roots], ['pkg', 'other'])
+        self.assertEqual([(depth, node.name, node.self_us,
+                           node.cumulative_us)
+                          for depth, node in roots[0].walk()],
+                         [(0, 'pkg', 40, 90), (1, '_io', 100, 100),
+                          (1, 'pkg.a', 30, 50), (2, 'pkg.b', 20, 20)])
+
+    def test_budgets(self):
+        times = {'pkg': (40, 90000), 'pkg.a': (30, 50000)}
+        self.assertEqual(check_budgets(times, {'pkg': 100, 'pkg.a': 40,
+                                               'pkg.c': 1}),
+                         [('pkg.a', 50.0, 40), ('pkg.c', None, 1)])
+
+    @unittest.skipIf(sys.version_info < (3, 7),
+                     "-X importtime requires Python 3.7")
+    def test_importtime(self):
+        rc, out = self._run(['-r', '1', '--tree',
+                             '--budget=pyutilib.common=100000',
+                             'pyutilib.common'])
+        self.assertEqual(rc, 0)
+        self.assertIn('Module pyutilib.common', out)
+        self.assertIn('Import time budgets met', out)
+        rc, out = self._run(['-r', '1', '--budget=pyutilib.common=0',
+                             'pyutilib.common'])
+        self.assertEqual(rc, 1)
+        self.assertIn('warm import of pyutilib.common', out)
+        # A budget for a module that is never imported is a failure
+        rc, out = self._run(['-r', '1', '--budget=pyutilib.commn=100000',
+                             'pyutilib.common'])
+        self.assertEqual(rc, 1)
+        self.assertIn('warm import of pyutilib.commn: not measured', out)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -394,6 +394,7 @@ import sys
 from textwrap import wrap
 import logging
 import pickle
+import weakref
 
 import six
 from six.moves import xrange
@@ -527,10 +528,71 @@ def _picklable(field,obj):
 
 _picklable.known = {}
 
+# The types of values that copy-on-write clones of a ConfigDict share
+# with the original (instead of cloning the ConfigValue that holds
+# them).  Values of other types may be modified in place, so they are
+# always cloned.
+_shareable_types = set(six.integer_types + six.string_types + (
+    type(None), bool, float, complex, six.binary_type, six.text_type,
+    frozenset))
+
+# The stamp of the modifications of Config objects.  It is incremented
+# by ConfigBase.checkpoint(), so the modifications between two
+# checkpoints share one (int) stamp.
+_modification_stamp = 1
+
+class _ConfigSchema(object):
+    """The domain, description, documentation and visibility of a Config
+    object.
+
+    Schemas are immutable and interned, so that all of the Config
+    objects with the same metadata (e.g., the entries of generated
+    ConfigDicts, and their clones) share one schema.
+    """
+
+    __slots__ = ('domain', 'description', 'doc', 'visibility', '__weakref__')
+
+    # (id(domain), description, doc, visibility) -> schema.  The schema
+    # holds a reference to the domain, so the id is not reused while the
+    # schema is in the table.
+    _interned = weakref.WeakValueDictionary()
+
+    def __init__(self, domain, description, doc, visibility):
+        self.domain = domain
+        self.description = description
+        self.doc = doc
+        self.visibility = visibility
+
+    @classmethod
+    def get(cls, domain, description, doc, visibility):
+        key = (id(domain), description, doc, visibility)
+        try:
+            ans = cls._interned.get(key)
+        except TypeError:
+            # Unhashable metadata is not interned
+            return cls(domain, description, doc, visibility)
+        if ans is None:
+            ans = cls(domain, description, doc, visibility)
+            cls._interned[key] = ans
+        return ans
+
+
+def _unshare(config, shared):
+    # Clone a ConfigValue that a copy-on-write clone shares (see
+    # ConfigDict._shared), with the value and schema that it had when
+    # the clone was made: the original may have changed since.
+    schema = shared[3]
+    ans = config(default=shared[0], domain=schema.domain)
+    ans._schema = schema
+    return ans
+
+
 class ConfigBase(object):
     __slots__ = ('_parent', '_name', '_userSet', '_userAccessed', '_data',
-                 '_default', '_domain', '_description', '_doc', '_visibility',
-                 '_argparse')
+                 '_default', '_schema', '_argparse', '_modified')
+
+    # The attributes that are stored in the (shared) _ConfigSchema
+    _schema_attributes = ('_domain', '_description', '_doc', '_visibility')
 
     # This just needs to be any singleton-like object; we use it so that
     # we can tell if an argument is provided (and we can't use None as
@@ -548,15 +610,60 @@ class ConfigBase(object):
         self._name = None
         self._userSet = False
         self._userAccessed = False
+        # The stamp of the last modification of this object (or of the
+        # objects in it)
+        self._modified = 0
 
         self._data = None
         self._default = default
-        self._domain = domain
-        self._description = _strip_indentation(description)
-        self._doc = _strip_indentation(doc)
-        self._visibility = visibility
+        self._schema = _ConfigSchema.get(domain,
+                                         _strip_indentation(description),
+                                         _strip_indentation(doc), visibility)
         self._argparse = None
 
+    # The metadata is read from the schema, and writing it replaces the
+    # schema of this object
+
+    @property
+    def _domain(self):
+        return self._schema.domain
+
+    @_domain.setter
+    def _domain(self, domain):
+        s = self._schema
+        self._schema = _ConfigSchema.get(domain, s.description, s.doc,
+                                         s.visibility)
+
+    @property
+    def _description(self):
+        return self._schema.description
+
+    @_description.setter
+    def _description(self, description):
+        s = self._schema
+        self._schema = _ConfigSchema.get(s.domain, description, s.doc,
+                                         s.visibility)
+
+    @property
+    def _doc(self):
+        return self._schema.doc
+
+    @_doc.setter
+    def _doc(self, doc):
+        s = self._schema
+        self._schema = _ConfigSchema.get(s.domain, s.description, doc,
+                                         s.visibility)
+
+    @property
+    def _visibility(self):
+        return self._schema.visibility
+
+    @_visibility.setter
+    def _visibility(self, visibility):
+        s = self._schema
+        self._schema = _ConfigSchema.get(s.domain, s.description, s.doc,
+                                         visibility)
+
     def __getstate__(self):
         # Nominally, __getstate__() should return:
         #
@@ -578,21 +685,39 @@ class ConfigBase(object):
         else:
             state = super(ConfigBase, self).__getstate__()
         state.update((key, getattr(self, key)) for key in ConfigBase.__slots__)
-        state['_domain'] = _picklable(state['_domain'], self)
+        # The schema is pickled as its fields (so that it is interned
+        # again when it is unpickled)
+        schema = state.pop('_schema')
+        state['_domain'] = _picklable(schema.domain, self)
+        state['_description'] = schema.description
+        state['_doc'] = schema.doc
+        state['_visibility'] = schema.visibility
         state['_parent'] = None
+        # Stamps are only meaningful in this process
+        del state['_modified']
         return state
 
     def __setstate__(self, state):
+        schema = {}
         for key, val in six.iteritems(state):
+            if key in ConfigBase._schema_attributes:
+                schema[key] = val
+                continue
             # Note: per the Python data model docs, we explicitly
             # set the attribute using object.__setattr__() instead
             # of setting self.__dict__[key] = val.
             object.__setattr__(self, key, val)
+        self._schema = _ConfigSchema.get(schema.get('_domain'),
+                                         schema.get('_description'),
+                                         schema.get('_doc'),
+                                         schema.get('_visibility', 0))
+        # The objects in this one were unpickled before it
+        self._modified = _modification_stamp
 
     def __call__(self, value=NoArgument, default=NoArgument, domain=NoArgument,
                  description=NoArgument, doc=NoArgument, visibility=NoArgument,
                  implicit=NoArgument, implicit_domain=NoArgument,
-                 preserve_implicit=False):
+                 preserve_implicit=False, copy_on_write=False):
         # We will pass through overriding arguments to the constructor.
         # This way if the constructor does special processing of any of
         # the arguments (like implicit_domain), we don't have to repeat
@@ -643,13 +768,11 @@ class ConfigBase(object):
         if isinstance(self, ConfigDict):
             for k in self._decl_order:
                 if preserve_implicit or k in self._declared:
-                    v = self._data[k]
-                    ans._data[k] = _tmp = v(preserve_implicit=preserve_implicit)
+                    self._clone_entry(ans, k, preserve_implicit, copy_on_write)
                     ans._decl_order.append(k)
                     if k in self._declared:
                         ans._declared.add(k)
-                    _tmp._parent = ans
-                    _tmp._name = v._name
+            ans._mark_modified()
         else:
             ans.reset()
         # ... and set the value, if appropriate
@@ -681,18 +804,19 @@ class ConfigBase(object):
     def _cast(self, value):
         if value is None:
             return value
-        if self._domain is not None:
+        domain = self._schema.domain
+        if domain is not None:
             try:
                 if value is not ConfigBase.NoArgument:
-                    return self._domain(value)
+                    return domain(value)
                 else:
-                    return self._domain()
+                    return domain()
             except:
                 err = sys.exc_info()[1]
-                if hasattr(self._domain, '__name__'):
-                    _dom = self._domain.__name__
+                if hasattr(domain, '__name__'):
+                    _dom = domain.__name__
                 else:
-                    _dom = type(self._domain)
+                    _dom = type(domain)
                 raise ValueError("invalid value for configuration '%s':\n"
                                  "\tFailed casting %s\n\tto %s\n\tError: %s" %
                                  (self.name(True), value, _dom, err))
@@ -998,6 +1122,30 @@ class ConfigBase(object):
                     os.write(indent + block_end)
         return os.getvalue()
 
+    def checkpoint(self):
+        """Return a stamp that is older than all of the later
+        modifications of Config objects (see changed_values() and
+        ConfigDict.changes())."""
+        global _modification_stamp
+        ans = _modification_stamp
+        _modification_stamp += 1
+        return ans
+
+    def _mark_modified(self, stamp=None):
+        # Record a modification of this object in it and in its parents
+        if stamp is None:
+            stamp = _modification_stamp
+        obj = self
+        while obj is not None:
+            object.__setattr__(obj, '_modified', stamp)
+            obj = obj._parent
+
+    def changed_values(self, since):
+        """Generate the ConfigValues and ConfigLists in this object
+        that have been modified since the checkpoint() since."""
+        if self._modified > since:
+            yield self
+
     def user_values(self):
         if self._userSet:
             yield self
@@ -1049,6 +1197,8 @@ class ConfigValue(ConfigBase):
 
     """
 
+    __slots__ = ()
+
     def __init__(self, *args, **kwds):
         ConfigBase.__init__(self, *args, **kwds)
         self.reset()
@@ -1061,6 +1211,7 @@ class ConfigValue(ConfigBase):
     def set_value(self, value):
         self._data = self._cast(value)
         self._userSet = True
+        self._mark_modified()
 
     def _data_collector(self, level, prefix, visibility=None, docMode=False):
         if visibility is not None and visibility < self._visibility:
@@ -1069,6 +1220,8 @@ class ConfigValue(ConfigBase):
 
 
 class ImmutableConfigValue(ConfigValue):
+    __slots__ = ()
+
     def set_value(self, value):
         if self._cast(value) != self._data:
             raise RuntimeError(str(self) + ' is currently immutable')
@@ -1164,6 +1317,8 @@ class ConfigList(ConfigBase):
 
     """
 
+    __slots__ = ()
+
     def __init__(self, *args, **kwds):
         ConfigBase.__init__(self, *args, **kwds)
         if self._domain is None:
@@ -1242,6 +1397,7 @@ class ConfigList(ConfigBase):
             self._data = _old
             raise
         self._userSet = True
+        self._mark_modified()
 
     def reset(self):
         ConfigBase.reset(self)
@@ -1264,6 +1420,7 @@ class ConfigList(ConfigBase):
         self._data[-1]._name = '[%s]' % (len(self._data) - 1,)
         self._data[-1]._userSet = True
         self._userSet = True
+        self._mark_modified()
 
     def add(self, value=ConfigBase.NoArgument):
         logger.warning(
@@ -1335,8 +1492,9 @@ class ConfigDict(ConfigBase):
     content_filters = (None, 'all', 'userdata')
 
     __slots__ = ('_decl_order', '_declared', '_implicit_declaration',
-                 '_implicit_domain')
-    _all_slots = __slots__ + ConfigBase.__slots__
+                 '_implicit_domain', '_shared', '_aliases')
+    _all_slots = __slots__ + ConfigBase.__slots__ + \
+                 ConfigBase._schema_attributes
 
     def __init__(self,
                  description=None,
@@ -1346,6 +1504,14 @@ class ConfigDict(ConfigBase):
                  visibility=0):
         self._decl_order = []
         self._declared = set()
+        # Entries that are shared with the ConfigDict that this was
+        # cloned from (see __call__(copy_on_write=True)), with the
+        # schema of the entry at the time of the clone
+        #   name -> [value, accessed, stamp of the clone, schema]
+        self._shared = {}
+        # The attribute names of the entries (built when attributes are
+        # first read, see _build_aliases):  attribute -> name
+        self._aliases = None
         self._implicit_declaration = implicit
         if implicit_domain is None or isinstance(implicit_domain, ConfigBase):
             self._implicit_domain = implicit_domain
@@ -1355,28 +1521,88 @@ class ConfigDict(ConfigBase):
         self._data = {}
 
     def __getstate__(self):
+        self._materialize()
         state = super(ConfigDict, self).__getstate__()
         state.update((key, getattr(self, key)) for key in ConfigDict.__slots__)
         state['_implicit_domain'] = _picklable(state['_implicit_domain'], self)
+        state['_aliases'] = None
         return state
 
     def __setstate__(self, state):
+        # ConfigDicts pickled before _shared and _aliases were added do
+        # not set them
+        self._shared = {}
+        self._aliases = None
         state = super(ConfigDict, self).__setstate__(state)
         for x in six.itervalues(self._data):
             x._parent = self
 
+    def _clone_entry(self, ans, key, preserve_implicit, copy_on_write):
+        # Store a clone of an entry in the ConfigDict ans (a clone of
+        # this ConfigDict).  In copy-on-write clones, ConfigValues that
+        # hold values of shareable types are shared (with the value at
+        # the time of the clone) until they are written.
+        v = self._data[key]
+        shared = self._shared.get(key)
+        if copy_on_write:
+            if shared is None and isinstance(v, ConfigValue) and \
+               type(v._data) in _shareable_types:
+                # This is what v.value() would do in a full clone
+                v._userAccessed = True
+                shared = [v._data, False, 0, v._schema]
+            if shared is not None:
+                ans._data[key] = v
+                ans._shared[key] = [shared[0], False, _modification_stamp,
+                                    shared[3]]
+                return
+        if shared is None:
+            _tmp = v(preserve_implicit=preserve_implicit,
+                     copy_on_write=copy_on_write)
+        else:
+            _tmp = _unshare(v, shared)
+        ans._data[key] = _tmp
+        _tmp._parent = ans
+        _tmp._name = v._name
+
+    def _materialize(self, key=None):
+        # Replace the shared entry for a key (or all shared entries)
+        # with a clone that belongs to this ConfigDict
+        if not self._shared:
+            return
+        for k in (list(self._shared) if key is None else (key,)):
+            shared = self._shared.pop(k, None)
+            if shared is None:
+                continue
+            v = self._data[k]
+            self._data[k] = _tmp = _unshare(v, shared)
+            _tmp._parent = self
+            _tmp._name = v._name
+            _tmp._userAccessed = shared[1]
+            _tmp._modified = shared[2]
+
     def __getitem__(self, key):
-        self._userAccessed = True
+        # (object.__setattr__ bypasses ConfigDict.__setattr__)
+        object.__setattr__(self, '_userAccessed', True)
         key = str(key)
-        if isinstance(self._data[key], ConfigValue):
-            return self._data[key].value()
+        if self._shared:
+            shared = self._shared.get(key)
+            if shared is not None:
+                shared[1] = True
+                return shared[0]
+        config = self._data[key]
+        if config.__class__ is ConfigValue:
+            object.__setattr__(config, '_userAccessed', True)
+            return config._data
+        elif isinstance(config, ConfigValue):
+            return config.value()
         else:
-            return self._data[key]
+            return config
 
     def get(self, key, default=ConfigBase.NoArgument):
         self._userAccessed = True
         key = str(key)
         if key in self._data:
+            self._materialize(key)
             return self._data[key]
         if default is ConfigBase.NoArgument:
             return None
@@ -1389,6 +1615,7 @@ class ConfigDict(ConfigBase):
         self._userAccessed = True
         key = str(key)
         if key in self._data:
+            self._materialize(key)
             return self._data[key]
         if default is ConfigBase.NoArgument:
             return self.add(key, None)
@@ -1400,6 +1627,7 @@ class ConfigDict(ConfigBase):
         if key not in self._data:
             self.add(key, val)
         else:
+            self._materialize(key)
             self._data[key].set_value(val)
         #self._userAccessed = True
 
@@ -1410,6 +1638,9 @@ class ConfigDict(ConfigBase):
         # Clean up the other data structures
         self._decl_order.remove(key)
         self._declared.discard(key)
+        self._shared.pop(key, None)
+        self._aliases = None
+        self._mark_modified()
 
     def __contains__(self, key):
         key = str(key)
@@ -1427,21 +1658,60 @@ class ConfigDict(ConfigBase):
         # know that key is not a __slot__ or a method, etc...
         #if name in ConfigDict._all_slots:
         #    return super(ConfigDict,self).__getattribute__(name)
-        if name not in self._data:
-            _name = name.replace('_', ' ')
-            if _name not in self._data:
-                raise AttributeError("Unknown attribute '%s'" % name)
-            name = _name
-        return ConfigDict.__getitem__(self, name)
+        aliases = self._aliases
+        if aliases is None:
+            aliases = self._build_aliases()
+        key = aliases.get(name)
+        if key is None:
+            if name not in self._data:
+                _name = name.replace('_', ' ')
+                if _name not in self._data:
+                    raise AttributeError("Unknown attribute '%s'" % name)
+                name = _name
+            return ConfigDict.__getitem__(self, name)
+        # This is __getitem__(key), without the function call
+        object.__setattr__(self, '_userAccessed', True)
+        if self._shared:
+            shared = self._shared.get(key)
+            if shared is not None:
+                shared[1] = True
+                return shared[0]
+        config = self._data[key]
+        if config.__class__ is ConfigValue:
+            object.__setattr__(config, '_userAccessed', True)
+            return config._data
+        elif isinstance(config, ConfigValue):
+            return config.value()
+        else:
+            return config
 
     def __setattr__(self, name, value):
         if name in ConfigDict._all_slots:
             super(ConfigDict, self).__setattr__(name, value)
         else:
-            if name not in self._data:
+            aliases = self._aliases
+            if aliases is None:
+                aliases = self._build_aliases()
+            key = aliases.get(name)
+            if key is not None:
+                name = key
+            elif name not in self._data:
                 name = name.replace('_', ' ')
             ConfigDict.__setitem__(self, name, value)
 
+    def _build_aliases(self):
+        # Map the names of the entries, and their forms with underscores
+        # in place of spaces, to the names of the entries (as
+        # __getattr__ does, the names take precedence over the
+        # underscore forms).  Attribute names that mix spaces and
+        # underscores are not cached.
+        aliases = dict((name, name) for name in self._data)
+        for name in self._data:
+            if ' ' in name and '_' not in name:
+                aliases.setdefault(name.replace(' ', '_'), name)
+        self._aliases = aliases
+        return aliases
+
     def iterkeys(self):
         return self._decl_order.__iter__()
 
@@ -1466,6 +1736,21 @@ class ConfigDict(ConfigBase):
 
     def _add(self, name, config):
         name = str(name)
+        self._check_add(name, config)
+        self._data[name] = config
+        self._decl_order.append(name)
+        config._parent = self
+        config._name = name
+        aliases = self._aliases
+        if aliases is not None:
+            aliases[name] = name
+            if ' ' in name and '_' not in name:
+                aliases.setdefault(name.replace(' ', '_'), name)
+        self._mark_modified()
+        return config
+
+    def _check_add(self, name, config):
+        # Raise a ValueError if config cannot be added as the entry name
         if config._parent is not None:
             raise ValueError(
                 "config '%s' is already assigned to Config Block '%s'; "
@@ -1479,11 +1764,6 @@ class ConfigDict(ConfigBase):
             raise ValueError(
                 "Illegal character in config '%s' for config Block '%s': "
                 "'.[]' are not allowed." % (name, self.name(True)))
-        self._data[name] = config
-        self._decl_order.append(name)
-        config._parent = self
-        config._name = name
-        return config
 
     def declare(self, name, config):
         ans = self._add(name, config)
@@ -1502,6 +1782,7 @@ class ConfigDict(ConfigBase):
             if key in self:
                 raise ValueError("ConfigDict.declare_from passed a block "
                                  "with a duplicate field, %s" % (key,))
+            other._materialize(key)
             self.declare(key, other._data[key]())
 
     def add(self, name, config):
@@ -1523,9 +1804,108 @@ class ConfigDict(ConfigBase):
     def value(self, accessValue=True):
         if accessValue:
             self._userAccessed = True
+        if self._shared:
+            ans = {}
+            for name, config in six.iteritems(self._data):
+                shared = self._shared.get(name)
+                if shared is None:
+                    ans[name] = config.value(accessValue)
+                else:
+                    if accessValue:
+                        shared[1] = True
+                    ans[name] = shared[0]
+            return ans
         return dict((name, config.value(accessValue))
                     for name, config in six.iteritems(self._data))
 
+    def changed_values(self, since):
+        if self._modified <= since:
+            return
+        for key in self._decl_order:
+            if self._shared:
+                shared = self._shared.get(key)
+                if shared is not None:
+                    if shared[2] > since:
+                        self._materialize(key)
+                        yield self._data[key]
+                    continue
+            for v in self._data[key].changed_values(since):
+                yield v
+
+    def changes(self, since):
+        """Return a patch (see apply_patch()) with the values of the
+        entries that have been modified since the checkpoint() since.
+
+        Only the ConfigDicts that have been modified are searched, so
+        the cost depends on the number of changes rather than the size
+        of this ConfigDict.
+        """
+        ans = {}
+        if self._modified <= since:
+            return ans
+        for key in self._decl_order:
+            shared = self._shared.get(key) if self._shared else None
+            if shared is not None:
+                if shared[2] > since:
+                    ans[key] = shared[0]
+                continue
+            config = self._data[key]
+            if config._modified <= since:
+                continue
+            if isinstance(config, ConfigDict):
+                ans[key] = config.changes(since)
+            else:
+                ans[key] = config.value(False)
+        return ans
+
+    def diff(self, other):
+        """Return a patch (see apply_patch()) that sets the values of
+        the ConfigDict other to the values of this ConfigDict.
+
+        The patch holds the values of the entries whose values differ
+        from the values of the entries of other with the same names (or
+        that are not in other).  Entries of other that are not in this
+        ConfigDict are not removed by the patch.
+        """
+        if not isinstance(other, ConfigDict):
+            raise ValueError("ConfigDict.diff() only accepts other "
+                             "ConfigDicts")
+        ans = {}
+        for key in self._decl_order:
+            config = self._data[key]
+            if key in other._data and isinstance(config, ConfigDict) and \
+               isinstance(other._data[key], ConfigDict):
+                patch = config.diff(other._data[key])
+                if patch:
+                    ans[key] = patch
+                continue
+            val = self._value(key)
+            if key not in other._data or other._value(key) != val:
+                ans[key] = val
+        return ans
+
+    def _value(self, key):
+        # The value of an entry, which is not marked as accessed
+        shared = self._shared.get(key) if self._shared else None
+        if shared is not None:
+            return shared[0]
+        return self._data[key].value(False)
+
+    def apply_patch(self, patch):
+        """Set the values in a patch (a nested dict, e.g., returned
+        by diff() or changes()).
+
+        The values are set by a ConfigSetter, so either all of them are
+        set or, if any of them is invalid, none of them is.
+        """
+        ConfigSetter(self)(patch)
+        return self
+
+    def frozen_view(self):
+        """Return a FrozenConfigView of the current values of this
+        ConfigDict (whose values are marked as accessed)."""
+        return FrozenConfigView(self)
+
     def set_value(self, value, skip_implicit=False):
         if value is None:
             return self
@@ -1586,10 +1966,16 @@ class ConfigDict(ConfigBase):
         # allows reset functions to have a deterministic ordering.
         def _keep(self, key):
             keep = key in self._declared
-            if keep:
-                self._data[key].reset()
-            else:
+            if not keep:
                 del self._data[key]
+                self._shared.pop(key, None)
+                self._aliases = None
+                self._mark_modified()
+            elif key in self._shared:
+                # The default of a shared entry is its shared value
+                self._shared[key][1] = False
+            else:
+                self._data[key].reset()
             return keep
         # this is an in-place slice of a list...
         self._decl_order[:] = [x for x in self._decl_order if _keep(self, x)]
@@ -1599,6 +1985,8 @@ class ConfigDict(ConfigBase):
     def _data_collector(self, level, prefix, visibility=None, docMode=False):
         if visibility is not None and visibility < self._visibility:
             return
+        # The collected objects may be modified
+        self._materialize()
         if prefix:
             yield (level, prefix, None, self)
             if level is not None:
@@ -1608,6 +1996,243 @@ class ConfigDict(ConfigBase):
                                                      visibility, docMode):
                 yield v
 
+
+class FrozenConfigView(object):
+    """A read-only snapshot of the values of a ConfigDict.
+
+    The values of the entries (and FrozenConfigViews of the ConfigDicts
+    in it) are stored as plain instance attributes, under the names of
+    the entries and their forms with underscores in place of spaces.
+    Reading them does not go through ConfigDict.__getattr__, so a view
+    is suited to code that reads options in inner loops.  The view does
+    not change when the ConfigDict does: a new view is needed after the
+    values are set.
+
+    Parameters
+    ----------
+    config: ConfigDict
+        The ConfigDict whose values are copied.
+
+    """
+
+    def __init__(self, config):
+        data = self.__dict__
+        keys = []
+        for key in config.iterkeys():
+            val = config[key]
+            if isinstance(val, ConfigDict):
+                val = FrozenConfigView(val)
+            elif isinstance(val, ConfigBase):
+                val = val.value()
+            data[key] = val
+            keys.append(key)
+        # The names of the entries take precedence over the underscore
+        # forms
+        for key in keys:
+            if ' ' in key and '_' not in key:
+                data.setdefault(key.replace(' ', '_'), data[key])
+        data['_FrozenConfigView__keys'] = tuple(keys)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenConfigView objects are read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("FrozenConfigView objects are read-only")
+
+    def __getitem__(self, key):
+        key = str(key)
+        if key not in self.__keys:
+            raise KeyError(key)
+        return self.__dict__[key]
+
+    def __contains__(self, key):
+        return str(key) in self.__keys
+
+    def __iter__(self):
+        return iter(self.__keys)
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def __repr__(self):
+        return "FrozenConfigView(%s)" % (
+            ', '.join("%r: %r" % (key, self.__dict__[key])
+                      for key in self.__keys),)
+
+
+class ConfigSetter(object):
+    """Set the values of a ConfigDict from (nested) dictionaries.
+
+    :py:meth:`ConfigDict.set_value` maps the keys of the dictionary to
+    the entries of the ConfigDict, and takes a copy of the current
+    values (so that they can be restored if a value is rejected) at
+    every level of a nested dictionary.  A ConfigSetter maps the
+    underscore forms of the entry names of the ConfigDict (and of the
+    ConfigDicts declared in it, when they are first set) once, and sets
+    values in two passes: the first maps every key and casts every
+    value to the domain of its entry, collecting all of the errors, and
+    the second stores the values if there were no errors.  All of the
+    invalid keys and values are reported in one ValueError.
+
+    Because every value is cast before any value is stored, domains
+    must not depend on the values of other entries.  A ConfigSetter
+    can be applied to any ConfigDict that declares the same entries as
+    the one that it was created for (e.g., its clones).
+
+    Parameters
+    ----------
+    config: ConfigDict
+        The ConfigDict whose values are set.
+
+    """
+
+    __slots__ = ('_config', '_keys', '_order', '_children')
+
+    def __init__(self, config):
+        if not isinstance(config, ConfigDict):
+            raise ValueError("ConfigSetter only accepts ConfigDicts")
+        self._config = config
+        # The names of the declared entries, in declaration order
+        self._order = {}
+        # The underscore forms of the entry names -> entry name
+        self._keys = {}
+        # Entry name -> ConfigSetter for the ConfigDict entries
+        self._children = {}
+        for name in config._decl_order:
+            if name not in config._declared:
+                continue
+            self._order[name] = len(self._order)
+            alias = name.replace(' ', '_')
+            if alias != name and '_' not in name:
+                self._keys[alias] = name
+
+    def __call__(self, value, config=None, skip_implicit=False):
+        """Set the values of a ConfigDict (by default, the one that
+        this ConfigSetter was created for), as config.set_value(value,
+        skip_implicit) would."""
+        if config is None:
+            config = self._config
+        errors = []
+        # (ConfigValue, cast value), for entries that are ConfigValues
+        values = []
+        # (entry, value), for entries whose set_value() is called
+        deferred = []
+        # (ConfigDict, name, entry), for implicitly-declared entries
+        implicit = []
+        # The ConfigDicts that are set
+        blocks = []
+        self._collect(config, value, skip_implicit, errors, values, deferred,
+                      implicit, blocks)
+        if not errors:
+            undo = []
+            for entry, val in deferred:
+                undo.append((entry, entry._data, entry._userSet))
+                try:
+                    entry.set_value(val)
+                except:
+                    errors.append(str(sys.exc_info()[1]))
+            if errors:
+                for entry, data, userSet in reversed(undo):
+                    entry._data = data
+                    entry._userSet = userSet
+        if errors:
+            raise ValueError("%d error(s) setting the value of Config Block "
+                             "'%s':\n%s" % (len(errors), config.name(True),
+                                            '\n'.join(errors)))
+        stamp = _modification_stamp
+        for entry, val in values:
+            entry._data = val
+            entry._userSet = True
+            entry._modified = stamp
+        for block in blocks:
+            block._userSet = True
+            block._modified = stamp
+        config._mark_modified(stamp)
+        for block, name, entry in implicit:
+            block._add(name, entry)
+
+    def _collect(self, config, value, skip_implicit, errors, values,
+                 deferred, implicit, blocks):
+        # Map the keys and cast the values of the dictionary value for
+        # the ConfigDict config, appending the changes to the lists
+        if value is None:
+            return
+        if (type(value) is not dict) and \
+           (not isinstance(value, ConfigDict)):
+            errors.append("Expected dict value for %s.set_value, found %s" %
+                          (config.name(True), type(value).__name__))
+            return
+        if not value:
+            return
+        data = config._data
+        _decl_map = {}
+        _implicit = []
+        for key in value:
+            _key = str(key)
+            if _key not in data:
+                name = self._keys.get(_key)
+                if name is None or name not in data:
+                    name = _key.replace('_', ' ')
+                    if name not in data:
+                        if skip_implicit:
+                            pass
+                        elif config._implicit_declaration:
+                            _implicit.append(key)
+                        else:
+                            errors.append(
+                                "key '%s' not defined for Config Block '%s' "
+                                "and implicit (undefined) keys are not "
+                                "allowed" % (key, config.name(True)))
+                        continue
+                _key = name
+            _decl_map[_key] = key
+        # Set the values in declaration order (as set_value() does)
+        last = len(self._order)
+        for name in sorted(_decl_map,
+                           key=lambda x: (self._order.get(x, last), x)):
+            val = value[_decl_map[name]]
+            config._materialize(name)
+            entry = data[name]
+            if isinstance(entry, ConfigDict):
+                setter = self._children.get(name)
+                if setter is None:
+                    setter = ConfigSetter(entry)
+                    if name in self._order:
+                        self._children[name] = setter
+                setter._collect(entry, val, False, errors, values, deferred,
+                                implicit, blocks)
+            elif type(entry) is ConfigValue:
+                try:
+                    values.append((entry, entry._cast(val)))
+                except:
+                    errors.append(str(sys.exc_info()[1]))
+            else:
+                deferred.append((entry, val))
+        # implicit data is declared at the end (in sorted order)
+        added = set()
+        for key in sorted(_implicit):
+            name = str(key)
+            val = value[key]
+            try:
+                if name in added:
+                    raise ValueError(
+                        "duplicate config '%s' defined for Config Block '%s'"
+                        % (name, config.name(True)))
+                if config._implicit_domain is None:
+                    if isinstance(val, ConfigBase):
+                        entry = val
+                    else:
+                        entry = ConfigValue(val)
+                else:
+                    entry = config._implicit_domain(val)
+                config._check_add(name, entry)
+            except:
+                errors.append(str(sys.exc_info()[1]))
+                continue
+            added.add(name)
+            implicit.append((config, name, entry))
+        blocks.append(config)
+
 # Backwards compatibility: ConfigDick was originally named ConfigBlock.
 ConfigBlock = ConfigDict
 
@@ -18,6 +18,7 @@ import pyutilib.th as unittest
 
 import pyutilib.misc.comparison
 from pyutilib.misc.config import ConfigValue, ConfigBlock, ConfigList, MarkImmutable
+from pyutilib.misc.config import ConfigSetter
 
 from six import PY3, StringIO
 
@@ -1553,6 +1554,125 @@ Node information:
         self.config = pickle.loads(pickle_str)
         self.test_display_list()
 
+    def test_schema(self):
+        # Config objects with the same metadata share their schema
+        a = ConfigValue(1, int, "description", """
+            A long
+            documentation string.""", visibility=1)
+        b = ConfigValue(2, int, "description", """
+            A long
+            documentation string.""", visibility=1)
+        self.assertIs(a._schema, b._schema)
+        self.assertIs(a()._schema, a._schema)
+        self.assertFalse(hasattr(a, '__dict__'))
+
+        b._description = "new description"
+        self.assertIsNot(a._schema, b._schema)
+        self.assertEqual(a._description, "description")
+        self.assertEqual(b._description, "new description")
+        self.assertEqual(b._doc, "A long\ndocumentation string.")
+        b.set_domain(float)
+        self.assertIs(b._domain, float)
+        self.assertEqual(b.value(), 2.0)
+        self.assertIs(a._domain, int)
+
+        c = pickle.loads(pickle.dumps(b))
+        self.assertIs(c._schema, b._schema)
+        self.assertEqual(c.value(), 2.0)
+        self.assertEqual(c._visibility, 1)
+
+    def test_attribute_aliases(self):
+        config = ConfigBlock(implicit=True)
+        config.declare('a b', ConfigValue(1))
+        config.declare('a c', ConfigValue(2))
+        self.assertEqual(config.a_b, 1)
+        # names take precedence over their underscore forms
+        config.add('a_b', 3)
+        self.assertEqual(config.a_b, 3)
+        self.assertEqual(config.a_c, 2)
+        config.a_c = 4
+        self.assertEqual(config['a c'], 4)
+        del config['a_b']
+        self.assertEqual(config.a_b, 1)
+        config.add('a_c', 5)
+        config.reset()
+        self.assertEqual(config.a_c, 2)
+        self.assertRaisesRegexp(AttributeError, "Unknown attribute 'a_d'",
+                                getattr, config, 'a_d')
+        # accessed values are tracked
+        config.declare('e f', ConfigValue(7))
+        config.e_f = 8
+        self.assertEqual([x.name() for x in config.unused_user_values()],
+                         ['e f'])
+        self.assertEqual(config.e_f, 8)
+        self.assertEqual(list(config.unused_user_values()), [])
+
+    def test_frozen_view(self):
+        config = ConfigBlock()
+        config.declare('a b', ConfigValue(1, int))
+        config.declare('c', ConfigBlock())
+        config.c.declare('d', ConfigList([1, 2], int))
+        config.a_b = 2
+        view = config.frozen_view()
+        self.assertEqual(view.a_b, 2)
+        self.assertEqual(view['a b'], 2)
+        self.assertEqual(view.c.d, [1, 2])
+        self.assertEqual(list(view), ['a b', 'c'])
+        self.assertEqual(len(view), 2)
+        self.assertIn('c', view)
+        self.assertNotIn('a_b', view)
+        self.assertRaises(KeyError, view.__getitem__, 'a_b')
+        self.assertRaises(AttributeError, setattr, view, 'a_b', 3)
+        self.assertEqual(list(config.unused_user_values()), [])
+        # the view does not change with the ConfigDict
+        config.a_b = 3
+        self.assertEqual(view.a_b, 2)
+        self.assertEqual(config.frozen_view().a_b, 3)
+
+    def test_changes(self):
+        config = ConfigBlock(implicit=True)
+        config.declare("a", ConfigValue(domain=int, default=1))
+        config.declare("b", ConfigBlock())
+        config.b.declare("c", ConfigValue(domain=float, default=2))
+        config.b.declare("d", ConfigList([1], domain=int))
+        worker = config()
+
+        stamp = config.checkpoint()
+        self.assertEqual(config.changes(stamp), {})
+        self.assertEqual(list(config.changed_values(stamp)), [])
+        config.b.c = 3
+        config.e = 4
+        self.assertEqual(config.changes(stamp), {'b': {'c': 3.0}, 'e': 4})
+        self.assertEqual([x.name(True) for x in config.changed_values(stamp)],
+                         ['b.c', 'e'])
+        self.assertEqual(config.b.changes(stamp), {'c': 3.0})
+
+        # patches transfer the changes
+        worker.apply_patch(config.changes(stamp))
+        self.assertEqual(worker.value(), config.value())
+        self.assertEqual(config.diff(worker), {})
+        config.b.d.append(2)
+        self.assertEqual(config.diff(worker), {'b': {'d': [1, 2]}})
+        self.assertEqual(worker.diff(config), {'b': {'d': [1]}})
+        worker.apply_patch(config.diff(worker))
+        self.assertEqual(worker.value(), config.value())
+        self.assertRaisesRegexp(ValueError, "1 error", worker.apply_patch,
+                                {'a': 'x', 'b': {'c': 5}})
+        self.assertEqual(worker.b.c, 3.0)
+
+        # entries of copy-on-write clones are changed when they are set
+        copy = config(copy_on_write=True)
+        stamp = copy.checkpoint()
+        copy.get('a')
+        self.assertEqual(copy.changes(stamp), {})
+        copy.a = 5
+        self.assertEqual(copy.changes(stamp), {'a': 5})
+        self.assertEqual(config.changes(stamp), {})
+
+        # unpickled objects are newer than their entries
+        copy = pickle.loads(pickle.dumps(config))
+        self.assertEqual(copy.changes(stamp), copy.value())
+
     def test_set_value(self):
         config = ConfigBlock()
         config.declare('a b', ConfigValue())
@@ -1619,5 +1739,113 @@ c: 1.0
         self.assertEqual(mod_copy._description, "new description")
         self.assertEqual(mod_copy._visibility, 0)
 
+    def test_copy_on_write(self):
+        config = ConfigBlock()
+        config.declare("a", ConfigValue(domain=int, default=1))
+        config.declare("b", ConfigValue(domain=list, default=[1]))
+        config.declare("c", ConfigBlock())
+        config.c.declare("d", ConfigValue(domain=float, default=2))
+        config.c.declare("e", ConfigValue(domain=str, default='x'))
+
+        copy = config(copy_on_write=True)
+        self.assertEqual(copy.value(), config.value())
+        # values of immutable types are shared until they are written
+        self.assertIs(copy._data['a'], config.get('a'))
+        self.assertIs(copy.c._data['d'], config.c.get('d'))
+        self.assertIsNot(copy.get('b'), config.get('b'))
+        self.assertIsNot(copy.b, config.b)
+
+        copy.c.d = 3
+        self.assertEqual(copy.c.d, 3.0)
+        self.assertEqual(config.c.d, 2.0)
+        self.assertIsNot(copy.c.get('d'), config.c.get('d'))
+        self.assertIs(copy.c.get('d')._parent, copy.c)
+        self.assertEqual(copy.c.get('d').name(True), 'c.d')
+        self.assertIs(copy.c._data['e'], config.c.get('e'))
+        self.assertEqual(list(x.name(True) for x in copy.user_values()),
+                         ['c.d'])
+
+        # changes to the original do not change the copy
+        config.a = 5
+        self.assertEqual(copy.a, 1)
+        copy2 = copy(copy_on_write=True)
+        self.assertEqual(copy2.a, 1)
+        self.assertEqual(copy2.c.d, 3.0)
+        self.assertEqual(copy(copy_on_write=False).value(), copy.value())
+
+        # reset() restores the values at the time of the copy
+        copy.a = 2
+        copy.reset()
+        self.assertEqual(copy.value(), {'a': 1, 'b': [1],
+                                        'c': {'d': 2.0, 'e': 'x'}})
+        self.assertEqual(_display(copy),
+                         "a: 1\nb: [1]\nc:\n  d: 2.0\n  e: x\n")
+
+        # pickles are independent of the original
+        copy3 = pickle.loads(pickle.dumps(config(copy_on_write=True)))
+        self.assertEqual(copy3.value(), config.value())
+        copy3.a = 7
+        self.assertEqual(config.a, 5)
+
+        # nor do changes to the domain or documentation of the original
+        copy4 = config(copy_on_write=True)
+        copy5 = copy4(copy_on_write=True)
+        config.get('a').set_domain(str)
+        config.get('a')._description = "changed"
+        config.c.get('e')._doc = "changed"
+        self.assertEqual(config.a, '5')
+        for c in (copy4, copy5):
+            self.assertEqual(c.a, 5)
+            self.assertIs(c.get('a')._domain, int)
+            self.assertIsNone(c.get('a')._description)
+            self.assertIsNone(c.c.get('e')._doc)
+            c.a = '6'
+            self.assertEqual(c.a, 6)
+        self.assertEqual(copy(copy_on_write=False).get('a')._domain, int)
+        self.assertEqual(_display(copy5),
+                         "a: 6\nb: [1]\nc:\n  d: 2.0\n  e: x\n")
+
+    def test_setter(self):
+        config = ConfigBlock()
+        config.declare("a b", ConfigValue(domain=int, default=1))
+        config.declare("c", ConfigList(domain=int))
+        config.declare("d", ConfigBlock(implicit=True))
+        config.d.declare("e", ConfigValue(domain=float, default=2))
+        setter = ConfigSetter(config)
+
+        setter({'a_b': 2, 'c': [3], 'd': {'e': 4, 'f': 5}})
+        self.assertEqual(config.value(), {'a b': 2, 'c': [3],
+                                          'd': {'e': 4.0, 'f': 5}})
+        ref = ConfigBlock()
+        ref.declare_from(config(preserve_implicit=False))
+        ref.set_value({'a_b': 2, 'c': [3], 'd': {'e': 4, 'f': 5}})
+        self.assertEqual([x.name(True) for x in config.user_values()],
+                         [x.name(True) for x in ref.user_values()])
+
+        # all of the errors are reported, and nothing is set
+        ref = config.value()
+        try:
+            setter({'a b': 'x', 'c': [4], 'd': {'e': 'y'}, 'g': 1})
+        except ValueError:
+            msg = str(sys.exc_info()[1])
+        else:
+            self.fail('expected test to raise ValueError')
+        self.assertTrue(msg.startswith("3 error(s) setting the value of "))
+        self.assertIn("configuration 'a b'", msg)
+        self.assertIn("configuration 'd.e'", msg)
+        self.assertIn("key 'g' not defined", msg)
+        self.assertEqual(config.value(), ref)
+        self.assertRaisesRegexp(ValueError, "Failed casting x", setter,
+                                {'a b': 5, 'c': ['x']})
+        self.assertEqual(config.value(), ref)
+
+        # the setter applies to clones
+        copy = config(copy_on_write=True)
+        setter({'a b': 6, 'd': {'e': 7}}, config=copy, skip_implicit=True)
+        self.assertEqual(copy.a_b, 6)
+        self.assertEqual(copy.d.e, 7.0)
+        self.assertEqual(config.a_b, 2)
+        self.assertEqual(config.d.e, 4.0)
+
 if __name__ == "__main__":
     unittest.main()
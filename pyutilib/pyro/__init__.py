@@ -15,8 +15,10 @@ These modules were adapted from Pyro's distributed2 example.
 from pyutilib.pyro.util import get_nameserver, get_dispatchers, shutdown_pyro_components, using_pyro3, using_pyro4, Pyro
 from pyutilib.pyro.task import Task, TaskProcessingError
 from pyutilib.pyro.client import Client
-from pyutilib.pyro.worker import TaskWorker, MultiTaskWorker, TaskWorkerServer
+from pyutilib.pyro.worker import TaskWorker, PrefetchTaskWorker, MultiTaskWorker, TaskWorkerServer
 from pyutilib.pyro.dispatcher import Dispatcher, DispatcherServer
+from pyutilib.pyro.shard import HashRing, ShardedClient
+from pyutilib.pyro.local import LocalDispatcher, LocalCluster
 from pyutilib.pyro.nameserver import start_ns, start_nsc
 
 #
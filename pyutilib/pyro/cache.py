@@ -0,0 +1,205 @@
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# A cache of task results, keyed by the queue type and task data.
+#
+# A dispatcher with a result cache looks up each task it receives.  On
+# a hit, the cached result is placed on the result queue without the
+# task being dispatched; on a miss, the key is stored with the task
+# (under the '_cache_key' key) so that the result returned by the
+# worker can be cached.
+#
+# Keys are the SHA-1 digest of a canonical encoding of the queue type
+# and the task data: JSON (with sorted dict keys, and tags that keep
+# tuples apart from lists and non-string dict keys apart from strings)
+# when the data only holds JSON types, tuples and dicts, and a pickle
+# otherwise.  Entries are evicted in
+# least-recently-used order once the cache holds more than max_entries
+# results, or more than max_bytes bytes of (pickled) results.  The cache
+# can be saved to, and loaded from, a file.
+#
+
+__all__ = ['ResultCache']
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import six
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from pyutilib.pyro.task import TaskProcessingError
+
+_key_key = '_cache_key'
+
+
+_scalar_types = set((six.text_type, six.binary_type) + six.integer_types +
+                    (float, bool, type(None)))
+
+
+def _tagged(data):
+    # Return a JSON-encodable form of data that keeps the types that
+    # JSON does not (tuples, and dicts with keys that are not strings):
+    # each container is a list that starts with a tag.  Other types
+    # raise a TypeError.
+    t = type(data)
+    if t in _scalar_types:
+        return data
+    if t is list:
+        return ['l'] + [_tagged(x) for x in data]
+    if t is tuple:
+        return ['t'] + [_tagged(x) for x in data]
+    if t is dict:
+        items = [(_encode(_tagged(k)), _tagged(v))
+                 for k, v in six.iteritems(data)]
+        items.sort(key=lambda x: x[0])
+        return ['d'] + [[k, v] for k, v in items]
+    raise TypeError("%s cannot be encoded" % (t.__name__,))
+
+
+def _encode(data):
+    return json.dumps(data, separators=(',', ':'))
+
+
+def _canonical(type, data):
+    try:
+        return _encode([type, _tagged(data)]).encode('utf-8')
+    except (TypeError, ValueError):
+        return pickle.dumps((type, data), 2)
+
+
+class ResultCache(object):
+    """
+    A least-recently-used cache of task results, bounded by the number
+    of entries and by their total size.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, filename=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.filename = filename
+        self._lock = threading.Lock()
+        # key -> (result type, result, processedBy, size)
+        self._entries = OrderedDict()
+        self.reset_stats()
+        self.nbytes = 0
+        if (filename is not None) and os.path.exists(filename):
+            self.load(filename)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(type, data):
+        return hashlib.sha1(_canonical(type, data)).hexdigest()
+
+    def lookup(self, type, task):
+        """
+        Return the cache entry (result type, result, processedBy) for a
+        task, or None.  On a miss, the key is stored with the task.
+        """
+        key = self.key(type, task['data'])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                task[_key_key] = key
+                return None
+            self.hits += 1
+            self._entries.pop(key)
+            self._entries[key] = entry
+        return entry[:3]
+
+    def store(self, type, result):
+        """
+        Cache a result returned by a worker, if it is the result of a
+        task that missed the cache.
+        """
+        key = result.pop(_key_key, None)
+        if (key is None) or \
+           isinstance(result['result'], TaskProcessingError):
+            return
+        value = result['result']
+        try:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return
+        if (self.max_bytes is not None) and (size > self.max_bytes):
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[3]
+            self._entries[key] = (type, value, result.get('processedBy'),
+                                  size)
+            self.nbytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._entries and \
+              (((self.max_entries is not None) and
+                (len(self._entries) > self.max_entries)) or
+               ((self.max_bytes is not None) and
+                (self.nbytes > self.max_bytes))):
+            key, entry = self._entries.popitem(last=False)
+            self.nbytes -= entry[3]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / float(lookups) if lookups
+                                else None,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries),
+                    'bytes': self.nbytes,
+                    'max_entries': self.max_entries,
+                    'max_bytes': self.max_bytes}
+
+    def save(self, filename=None):
+        if filename is None:
+            filename = self.filename
+        with self._lock:
+            entries = list(self._entries.items())
+        tmpname = filename + '.tmp'
+        with open(tmpname, 'wb') as OUTPUT:
+            pickle.dump(entries, OUTPUT, pickle.HIGHEST_PROTOCOL)
+        getattr(os, 'replace', os.rename)(tmpname, filename)
+
+    def load(self, filename=None):
+        if filename is None:
+            filename = self.filename
+        with open(filename, 'rb') as INPUT:
+            entries = pickle.load(INPUT)
+        with self._lock:
+            for key, entry in entries:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self.nbytes -= old[3]
+                self._entries[key] = entry
+                self.nbytes += entry[3]
+            self._evict()
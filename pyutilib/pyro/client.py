@@ -18,6 +18,9 @@ from six import iteritems
 import pyutilib.pyro.util
 from pyutilib.pyro.util import get_nameserver, using_pyro3, using_pyro4
 from pyutilib.pyro.util import Pyro as _pyro
+from pyutilib.pyro.util import _proxy_uri, _release_proxy
+from pyutilib.pyro.codec import (negotiate_codec, negotiate_compressor,
+                                 encode_payload, decode_payload)
 
 if sys.version_info >= (3, 0):
     xrange = range
@@ -35,13 +38,45 @@ class Client(object):
                  port=None,
                  num_dispatcher_tries=30,
                  caller_name="Client",
-                 dispatcher=None):
+                 dispatcher=None,
+                 task_buffer_size=None,
+                 task_buffer_timeout=None,
+                 codec=None,
+                 compression=None,
+                 compress_threshold=None):
 
-        if _pyro is None:
+        # A dispatcher given directly (e.g., a LocalDispatcher) does not
+        # need Pyro
+        if (_pyro is None) and (dispatcher is None):
             raise ImportError("Pyro or Pyro4 is not available")
         self.type = type
         self.id = 0
 
+        # Tasks added with add_task() are buffered on the client and
+        # sent to the dispatcher with a single add_tasks() call once
+        # task_buffer_size tasks have accumulated, or when a task is
+        # added more than task_buffer_timeout seconds after the oldest
+        # buffered task.  The buffer is also flushed before any other
+        # request is made of the dispatcher.  By default, no buffering
+        # is performed.
+        self._task_buffer_size = task_buffer_size
+        self._task_buffer_timeout = task_buffer_timeout
+        self._task_buffer = {}
+        self._task_buffer_count = 0
+        self._task_buffer_time = None
+
+        # The codec used to encode task data (see pyutilib.pyro.codec),
+        # given as a name or a list of names in order of preference.
+        # The first one supported by all of the workers registered with
+        # the dispatcher is chosen when the first task is added.  By
+        # default, task data is left to the Pyro serializer.
+        self._codec_preference = codec
+        self._compression_preference = compression
+        self._compress_threshold = compress_threshold
+        self._codec = None
+        self._compression = None
+        self._codec_negotiated = (codec is None)
+
         # Deprecated in Pyro3
         # Removed in Pyro4
         if using_pyro3:
@@ -62,7 +97,8 @@ class Client(object):
             cumulative_sleep_time = 0.0
             for i in xrange(0, num_dispatcher_tries):
 
-                dispatchers = pyutilib.pyro.util.get_dispatchers(ns=self.ns)
+                dispatchers = pyutilib.pyro.util.get_dispatchers(
+                    group=group, ns=self.ns)
 
                 for (name, uri) in dispatchers:
                     self.URI = uri
@@ -105,20 +141,54 @@ class Client(object):
             assert port is None
             assert host is None
             self.dispatcher = dispatcher
-            if using_pyro4:
-                self.URI = self.dispatcher._pyroUri
-            else:
-                self.URI = self.dispatcher.URI
-            print('Client assigned dispatcher with URI=%s' % (self.URI))
+            self.URI = _proxy_uri(self.dispatcher)
+            if self.URI is not None:
+                print('Client assigned dispatcher with URI=%s' % (self.URI))
 
     def close(self):
         if self.dispatcher is not None:
-            if using_pyro4:
-                self.dispatcher._pyroRelease()
-            else:
-                self.dispatcher._release()
+            self.flush_tasks()
+            _release_proxy(self.dispatcher)
+
+    def _negotiate_codec(self):
+        supported = self.dispatcher.worker_codecs()
+        if supported is None:
+            codecs = compressors = None
+        else:
+            codecs, compressors = supported
+        self._codec = negotiate_codec(self._codec_preference, codecs)
+        self._compression = negotiate_compressor(
+            self._compression_preference, compressors)
+        self._codec_negotiated = True
+
+    def _encode_task(self, task):
+        if not self._codec_negotiated:
+            self._negotiate_codec()
+        if self._codec is not None:
+            task['data'] = encode_payload(task['data'], self._codec,
+                                          self._compression,
+                                          self._compress_threshold)
+
+    def _decode_result(self, result):
+        if result is not None:
+            result['data'] = decode_payload(result['data'])[0]
+            result['result'] = decode_payload(result['result'])[0]
+        return result
+
+    def flush_tasks(self):
+        """
+        Send any tasks buffered by add_task() to the dispatcher
+        """
+        if not self._task_buffer_count:
+            return
+        tasks = self._task_buffer
+        self._task_buffer = {}
+        self._task_buffer_count = 0
+        self._task_buffer_time = None
+        self.dispatcher.add_tasks(tasks)
 
     def clear_queue(self, override_type=None, verbose=False):
+        self.flush_tasks()
         task_type = override_type if (override_type is not None) else self.type
         if verbose:
             print("Clearing all tasks and results for "
@@ -126,11 +196,14 @@ class Client(object):
         self.dispatcher.clear_queue(type=task_type)
 
     def add_tasks(self, tasks, verbose=False):
+        # preserve the submission order of any buffered tasks
+        self.flush_tasks()
         for task_type in tasks:
             for task in tasks[task_type]:
                 if task['id'] is None:
                     self.id += 1
                 task['client'] = self.CLIENTNAME
+                self._encode_task(task)
                 if verbose:
                     print("Adding task " + str(task['id']) + " to dispatcher "
                           "queue with type=" + str(task_type) + " - in bulk")
@@ -141,31 +214,119 @@ class Client(object):
         if task['id'] is None:
             self.id += 1
         task['client'] = self.CLIENTNAME
+        self._encode_task(task)
+        if not self._task_buffer_size and not self._task_buffer_timeout:
+            if verbose:
+                print("Adding task " + str(task['id']) + " to dispatcher "
+                      "queue with type=" + str(task_type) + " - individually")
+            self.dispatcher.add_task(task, type=task_type)
+            return
         if verbose:
-            print("Adding task " + str(task['id']) + " to dispatcher "
-                  "queue with type=" + str(task_type) + " - individually")
-        self.dispatcher.add_task(task, type=task_type)
+            print("Buffering task " + str(task['id']) + " for dispatcher "
+                  "queue with type=" + str(task_type))
+        now = time.time()
+        if self._task_buffer_time is None:
+            self._task_buffer_time = now
+        self._task_buffer.setdefault(task_type, []).append(task)
+        self._task_buffer_count += 1
+        if (self._task_buffer_size and
+                self._task_buffer_count >= self._task_buffer_size) or \
+           (self._task_buffer_timeout is not None and
+                now - self._task_buffer_time >= self._task_buffer_timeout):
+            self.flush_tasks()
 
     def get_result(self, override_type=None, block=True, timeout=5):
+        self.flush_tasks()
         task_type = override_type if (override_type is not None) else self.type
-        return self.dispatcher.get_result(
-            type=task_type, block=block, timeout=timeout)
+        return self._decode_result(self.dispatcher.get_result(
+            type=task_type, block=block, timeout=timeout))
 
     def get_results(self, override_type=None, block=True, timeout=5):
+        self.flush_tasks()
+        task_type = override_type if (override_type is not None) else self.type
+        return [self._decode_result(result) for result in
+                self.dispatcher.get_results(
+                    [(task_type, block, timeout)]).get(task_type, [])]
+
+    def iter_results(self,
+                     num_results=None,
+                     override_type=None,
+                     timeout=None,
+                     max_batch_delay=0.5):
+        """
+        Generate results as they become available, retrieving them from
+        the dispatcher in batches with get_results().
+
+        The batch size adapts to the rate at which results arrive: when
+        a request returns a single result, the client waits a little
+        longer (doubling, up to max_batch_delay seconds) before the next
+        request so that results can accumulate on the dispatcher; larger
+        batches shrink the delay again.  Set max_batch_delay=0 to always
+        request results immediately.
+
+        Iteration stops once num_results results have been generated
+        (all results from the final batch are generated, so more than
+        num_results may be returned), or when no result arrives within
+        timeout seconds.  If neither is specified, the timeout defaults
+        to 5 seconds.
+        """
+        self.flush_tasks()
         task_type = override_type if (override_type is not None) else self.type
-        return self.dispatcher.get_results(
-            [(task_type, block, timeout)])[task_type]
+        if num_results is None and timeout is None:
+            timeout = 5
+        count = 0
+        delay = 0.0
+        while num_results is None or count < num_results:
+            if delay:
+                time.sleep(delay)
+            batch = self.dispatcher.get_results(
+                [(task_type, True, timeout)]).get(task_type, ())
+            if not batch:
+                if timeout is not None:
+                    return
+                continue
+            if len(batch) == 1:
+                delay = min(max_batch_delay, max(2 * delay, 0.001))
+            else:
+                delay /= 2
+            count += len(batch)
+            for result in batch:
+                yield self._decode_result(result)
 
     def get_results_all_queues(self):
-        return self.dispatcher.get_results_all_queues()
+        self.flush_tasks()
+        return [self._decode_result(result) for result in
+                self.dispatcher.get_results_all_queues()]
 
     def num_tasks(self, override_type=None):
+        self.flush_tasks()
         task_type = override_type if (override_type is not None) else self.type
         return self.dispatcher.num_tasks(type=task_type)
 
     def num_results(self, override_type=None):
+        self.flush_tasks()
         task_type = override_type if (override_type is not None) else self.type
         return self.dispatcher.num_results(type=override_type)
 
     def queues_with_results(self):
+        self.flush_tasks()
         return self.dispatcher.queues_with_results()
+
+    def wait_any(self, queue_types=None, timeout=5):
+        """
+        Wait until any of the given result queues (by default, the
+        queue of this client) has results, and return the list of
+        those that do.  An empty list is returned on timeout.
+        """
+        self.flush_tasks()
+        if queue_types is None:
+            queue_types = [self.type]
+        return self.dispatcher.wait_any(list(queue_types), timeout=timeout)
+
+    def get_metrics(self):
+        self.flush_tasks()
+        return self.dispatcher.get_metrics()
+
+    def get_cache_stats(self):
+        self.flush_tasks()
+        return self.dispatcher.get_cache_stats()
@@ -0,0 +1,220 @@
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# Codecs for task payloads.
+#
+# A Client can encode the 'data' of its tasks into a compact byte string
+# before they are sent to the dispatcher; workers decode the data,
+# and encode their results with the same codec.  The dispatcher never
+# looks inside the payload, so the Pyro serializer only has to move a
+# small dictionary holding an opaque byte string.
+#
+# An encoded payload is a dictionary:
+#
+#    {'__payload__': <codec name>,
+#     'compression': <compressor name or None>,
+#     'data': <bytes>}
+#
+# Codecs:
+#    pickle   - pickle protocol 2 (readable by every Python version)
+#    pickle5  - pickle protocol 5, with large buffers (e.g., NumPy
+#               arrays) stored out-of-band rather than copied into the
+#               pickle stream (Python 3.8+)
+#    msgpack  - msgpack (if installed); only handles basic types
+#
+# Compressors (applied when the encoded payload exceeds a threshold):
+#    zlib     - zlib, at a fast compression level
+#    lz4      - LZ4 frames (if the lz4 package is installed)
+#
+
+__all__ = ['register_codec', 'register_compressor', 'available_codecs',
+           'available_compressors', 'negotiate_codec',
+           'negotiate_compressor', 'encode_payload',
+           'decode_payload', 'is_encoded_payload']
+
+import sys
+import base64
+import pickle
+import struct
+import zlib
+
+try:
+    import msgpack
+    msgpack_available = True
+except ImportError:
+    msgpack_available = False
+
+try:
+    import lz4.frame
+    lz4_available = True
+except ImportError:
+    lz4_available = False
+
+_codecs = {}
+_compressors = {}
+
+#: The default size (in bytes) above which payloads are compressed
+COMPRESS_THRESHOLD = 16384
+
+
+def register_codec(name, dumps, loads):
+    """
+    Register a codec: dumps(obj) returns a byte string and loads(data)
+    returns the decoded object.
+    """
+    _codecs[name] = (dumps, loads)
+
+
+def register_compressor(name, compress, decompress):
+    _compressors[name] = (compress, decompress)
+
+
+def available_codecs():
+    return sorted(_codecs)
+
+
+def available_compressors():
+    return sorted(_compressors)
+
+
+def _negotiate(preferred, available, supported):
+    if preferred is None:
+        return None
+    if not isinstance(preferred, (list, tuple)):
+        preferred = (preferred,)
+    for name in preferred:
+        if name is None:
+            return None
+        if name in available and (supported is None or name in supported):
+            return name
+    return None
+
+
+def negotiate_codec(preferred, supported=None):
+    """
+    Return the first codec in the preferred list (or the single codec
+    name) that is available locally and, if a list of supported codecs
+    is given, supported by the remote side.  Return None if there is no
+    such codec.
+    """
+    return _negotiate(preferred, _codecs, supported)
+
+
+def negotiate_compressor(preferred, supported=None):
+    """
+    The counterpart of negotiate_codec() for compressors.
+    """
+    return _negotiate(preferred, _compressors, supported)
+
+
+def is_encoded_payload(value):
+    return (type(value) is dict) and ('__payload__' in value)
+
+
+def _as_bytes(data):
+    # The serpent serializer used by Pyro4 transmits byte strings as a
+    # base64-encoded dictionary
+    if type(data) is dict and data.get('encoding') == 'base64':
+        return base64.b64decode(data['data'])
+    return data
+
+
+def encode_payload(obj, codec, compression=None, threshold=None):
+    """
+    Encode an object with the named codec, compressing the result if it
+    is larger than threshold bytes.
+    """
+    data = _codecs[codec][0](obj)
+    if compression is not None:
+        if threshold is None:
+            threshold = COMPRESS_THRESHOLD
+        if len(data) > threshold:
+            compressed = _compressors[compression][0](data)
+            if len(compressed) < len(data):
+                data = compressed
+            else:
+                compression = None
+        else:
+            compression = None
+    return {'__payload__': codec, 'compression': compression, 'data': data}
+
+
+def decode_payload(value):
+    """
+    Decode a value created by encode_payload(), returning the tuple
+    (obj, (codec, compression)).  Values that are not encoded payloads
+    are returned unchanged, as (value, None).
+    """
+    if not is_encoded_payload(value):
+        return value, None
+    codec = value['__payload__']
+    compression = value.get('compression')
+    if codec not in _codecs:
+        raise ValueError("Unknown task payload codec '%s'" % (codec,))
+    data = _as_bytes(value['data'])
+    if compression is not None:
+        if compression not in _compressors:
+            raise ValueError("Unknown task payload compression '%s'" %
+                             (compression,))
+        data = _compressors[compression][1](data)
+    return _codecs[codec][1](data), (codec, compression)
+
+
+#
+# pickle
+#
+register_codec('pickle', lambda obj: pickle.dumps(obj, protocol=2),
+               pickle.loads)
+
+#
+# pickle5: the pickle stream and the out-of-band buffers are framed as
+#    <number of buffers + 1> <length of each part> <pickle> <buffers>
+# with the counts and lengths packed as little-endian unsigned integers
+#
+if sys.version_info >= (3, 8):
+
+    def _pickle5_dumps(obj):
+        buffers = []
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        parts = [data] + [buf.raw() for buf in buffers]
+        header = struct.pack('<I%dQ' % len(parts), len(parts),
+                             *[part.nbytes if isinstance(part, memoryview)
+                               else len(part) for part in parts])
+        return b''.join([header] + parts)
+
+    def _pickle5_loads(data):
+        # Copy the payload once so that the out-of-band buffers (and
+        # any arrays built on them) are writeable
+        view = memoryview(bytearray(data))
+        nparts = struct.unpack_from('<I', view)[0]
+        offset = 4 + 8 * nparts
+        parts = []
+        for size in struct.unpack_from('<%dQ' % nparts, view, 4):
+            parts.append(view[offset:offset + size])
+            offset += size
+        return pickle.loads(parts[0], buffers=parts[1:])
+
+    register_codec('pickle5', _pickle5_dumps, _pickle5_loads)
+
+#
+# msgpack
+#
+if msgpack_available:
+    register_codec('msgpack',
+                   lambda obj: msgpack.packb(obj, use_bin_type=True),
+                   lambda data: msgpack.unpackb(data, raw=False))
+
+#
+# Compression
+#
+register_compressor('zlib', lambda data: zlib.compress(data, 1),
+                    zlib.decompress)
+
+if lz4_available:
+    register_compressor('lz4', lz4.frame.compress, lz4.frame.decompress)
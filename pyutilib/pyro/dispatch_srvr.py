@@ -71,6 +71,114 @@ def main():
         help="Allow multiple dispatchers to run under the default nameserver group",
         default=False,
         action="store_true")
+    parser.add_option(
+        "--priority-queues",
+        dest="priority_queues",
+        help=("Hand out the tasks in each queue in order of decreasing "
+              "task priority, rather than in the order they were added."),
+        default=False,
+        action="store_true")
+    parser.add_option(
+        "--dead-letter-queue",
+        dest="dead_letter_type",
+        metavar="TYPE",
+        help=("The result queue type to which tasks are moved when their "
+              "deadline passes before they are handed to a worker. The "
+              "default is 'dead_letter'."),
+        default="dead_letter")
+    parser.add_option(
+        "--metrics",
+        dest="metrics",
+        help=("Collect queue, latency and worker throughput metrics, which "
+              "clients can retrieve with get_metrics()."),
+        default=False,
+        action="store_true")
+    parser.add_option(
+        "--metrics-file",
+        dest="metrics_file",
+        metavar="FILE",
+        help=("Collect metrics and periodically append them to this file "
+              "as JSON lines."),
+        default=None)
+    parser.add_option(
+        "--metrics-interval",
+        dest="metrics_interval",
+        metavar="SECONDS",
+        help="The interval between writes to the metrics file.",
+        type="float",
+        default=10)
+    parser.add_option(
+        "--journal",
+        dest="journal",
+        metavar="FILE",
+        help=("Record all changes to the task and result queues in this "
+              "journal file. If the file exists when the dispatcher starts, "
+              "it is replayed: tasks that were not completed are queued "
+              "again and results that were not collected are restored."),
+        default=None)
+    parser.add_option(
+        "--journal-sync-interval",
+        dest="journal_sync_interval",
+        metavar="SECONDS",
+        help=("The interval between flushes of the journal to disk. A "
+              "crash can lose the changes made during the last interval."),
+        type="float",
+        default=0.05)
+    parser.add_option(
+        "--lease-timeout",
+        dest="lease_timeout",
+        metavar="SECONDS",
+        help=("Lease each task handed to a worker for this many seconds. "
+              "Workers renew the leases of the tasks they are working on; "
+              "a task whose lease expires (e.g., because its worker died) "
+              "is queued again."),
+        type="float",
+        default=None)
+    parser.add_option(
+        "--max-attempts",
+        dest="max_attempts",
+        metavar="N",
+        help=("Move a task to the dead-letter queue once its lease has "
+              "expired this many times."),
+        type="int",
+        default=None)
+    parser.add_option(
+        "--retry-backoff",
+        dest="retry_backoff",
+        metavar="SECONDS",
+        help=("Wait this many seconds before queuing a task again after "
+              "its lease expires, doubling the wait with each attempt."),
+        type="float",
+        default=0)
+    parser.add_option(
+        "--result-cache",
+        dest="result_cache",
+        help=("Cache task results by queue type and task data, and answer "
+              "repeated tasks from the cache without dispatching them."),
+        default=False,
+        action="store_true")
+    parser.add_option(
+        "--result-cache-entries",
+        dest="result_cache_entries",
+        metavar="N",
+        help="The maximum number of results held in the result cache.",
+        type="int",
+        default=None)
+    parser.add_option(
+        "--result-cache-bytes",
+        dest="result_cache_bytes",
+        metavar="BYTES",
+        help="The maximum total size of the results in the result cache.",
+        type="int",
+        default=None)
+    parser.add_option(
+        "--result-cache-file",
+        dest="result_cache_file",
+        metavar="FILE",
+        help=("Cache task results, loading the cache from this file when "
+              "the dispatcher starts and saving it when the dispatcher "
+              "shuts down."),
+        default=None)
 
     options, args = parser.parse_args()
     # Handle the old syntax which was purly argument driven
@@ -103,7 +211,21 @@ def main():
         verbose=verbose,
         max_allowed_connections=options.max_allowed_connections,
         worker_limit=options.worker_limit,
-        clear_group=not options.allow_multiple_dispatchers)
+        clear_group=not options.allow_multiple_dispatchers,
+        priority_queues=options.priority_queues,
+        dead_letter_type=options.dead_letter_type,
+        metrics=options.metrics,
+        metrics_file=options.metrics_file,
+        metrics_interval=options.metrics_interval,
+        journal=options.journal,
+        journal_sync_interval=options.journal_sync_interval,
+        lease_timeout=options.lease_timeout,
+        max_attempts=options.max_attempts,
+        retry_backoff=options.retry_backoff,
+        result_cache=options.result_cache,
+        result_cache_entries=options.result_cache_entries,
+        result_cache_bytes=options.result_cache_bytes,
+        result_cache_file=options.result_cache_file)
 
 
 if __name__ == '__main__':
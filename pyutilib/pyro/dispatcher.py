@@ -11,12 +11,20 @@ __all__ = ['Dispatcher', 'DispatcherServer']
 
 import os
 import sys
+import time
 import uuid
+import heapq
+import itertools
+import threading
 from collections import defaultdict
 
 from pyutilib.pyro.util import get_nameserver, using_pyro3, using_pyro4
 from pyutilib.pyro.util import Pyro as _pyro
 from pyutilib.pyro.util import set_maxconnections, get_dispatchers
+from pyutilib.pyro.metrics import DispatcherMetrics, _MetricsWriter
+from pyutilib.pyro.journal import Journal, replay_journal
+from pyutilib.pyro.lease import LeaseTable, _LeaseReaper
+from pyutilib.pyro.cache import ResultCache
 
 if sys.version_info >= (3, 0):
     import queue as Queue
@@ -48,22 +56,226 @@ def _clear_queue_threadsafe(q):
         q.task_done()
 
 
+class _PriorityQueue(Queue.Queue):
+    """
+    A task queue that returns the task with the highest 'priority'
+    first.  Ties are broken by the earliest 'deadline', and then by the
+    order in which the tasks were added.
+    """
+
+    def _init(self, maxsize):
+        self.queue = []
+        self._counter = itertools.count()
+
+    def _qsize(self, len=len):
+        return len(self.queue)
+
+    def _put(self, task):
+        priority = task.get('priority')
+        deadline = task.get('deadline')
+        heapq.heappush(self.queue,
+                       (-priority if priority else 0,
+                        float('inf') if deadline is None else deadline,
+                        next(self._counter), task))
+
+    def _get(self):
+        return heapq.heappop(self.queue)[-1]
+
+
 class Dispatcher(base):
 
+    # Subclasses that are not served by Pyro (see
+    # pyutilib.pyro.local) do not require it
+    _requires_pyro = True
+
     def __init__(self, **kwds):
-        if _pyro is None:
+        if (_pyro is None) and self._requires_pyro:
             raise ImportError("Pyro or Pyro4 is not available")
         if using_pyro3:
             _pyro.core.ObjBase.__init__(self)
-        self._task_queue = defaultdict(Queue.Queue)
+        # When priority_queues is True, tasks are handed out in order of
+        # decreasing 'priority' rather than first-in first-out
+        if kwds.pop("priority_queues", False):
+            self._task_queue_type = _PriorityQueue
+        else:
+            self._task_queue_type = Queue.Queue
+        # Tasks whose 'deadline' has passed before they are handed to a
+        # worker are placed on this result queue instead
+        self._dead_letter_type = kwds.pop("dead_letter_type", "dead_letter")
+        self._task_queue = defaultdict(self._task_queue_type)
         self._result_queue = defaultdict(Queue.Queue)
+        # Notified whenever tasks or results are added to a queue (see
+        # wait_any)
+        self._queue_condition = threading.Condition()
         self._verbose = kwds.pop("verbose", False)
         self._registered_workers = set()
         self._acquired_workers = set()
+        # The task payload codecs and compressors supported by each
+        # worker (see pyutilib.pyro.codec)
+        self._worker_codecs = {}
         self._worker_limit = kwds.pop("worker_limit", None)
+        # Metrics are collected if requested, or if they are to be
+        # written to a file (as JSON lines, every metrics_interval
+        # seconds)
+        metrics_file = kwds.pop("metrics_file", None)
+        metrics_interval = kwds.pop("metrics_interval", 10)
+        self._metrics = None
+        self._metrics_writer = None
+        if kwds.pop("metrics", False) or (metrics_file is not None):
+            self._metrics = DispatcherMetrics()
+        if metrics_file is not None:
+            self._metrics_writer = _MetricsWriter(self, metrics_file,
+                                                  metrics_interval)
+            self._metrics_writer.start()
+        # Changes to the queues are recorded in a journal file, if one
+        # is given.  An existing journal is replayed first, restoring
+        # the tasks that were not completed and the results that were
+        # not collected.
+        journal = kwds.pop("journal", None)
+        journal_sync_interval = kwds.pop("journal_sync_interval", 0.05)
+        self._journal = None
+        if journal is not None:
+            next_id = 0
+            if os.path.exists(journal):
+                tasks, results, next_id, handed_out = \
+                    replay_journal(journal)
+                for type, task in tasks:
+                    self._task_queue[type].put(task)
+                for type, result in results:
+                    self._result_queue[type].put(result)
+                Journal.compact(journal, tasks, results)
+                print("Recovered %d tasks (%d of which had been handed to "
+                      "workers) and %d results from journal %s" %
+                      (len(tasks), handed_out, len(results), journal))
+            self._journal = Journal(journal,
+                                    sync_interval=journal_sync_interval,
+                                    next_id=next_id)
+        # When lease_timeout is given, each task handed to a worker is
+        # leased for that many seconds, and the worker renews the lease
+        # with renew_leases() while it works on the task.  Tasks whose
+        # lease expires are queued again (after retry_backoff seconds,
+        # doubled with each attempt), until max_attempts have been made,
+        # at which point they are placed on the dead-letter queue.
+        lease_timeout = kwds.pop("lease_timeout", None)
+        max_attempts = kwds.pop("max_attempts", None)
+        retry_backoff = kwds.pop("retry_backoff", 0)
+        self._leases = None
+        self._lease_reaper = None
+        if lease_timeout is not None:
+            self._leases = LeaseTable(lease_timeout,
+                                      max_attempts=max_attempts,
+                                      backoff=retry_backoff)
+            self._lease_reaper = _LeaseReaper(
+                self, min(1.0, lease_timeout / 4.0))
+            self._lease_reaper.start()
+        # Results are cached (by queue type and task data) if requested,
+        # or if the cache is to be kept in a file (loaded when the
+        # dispatcher starts and saved when it shuts down).  Tasks that
+        # hit the cache are answered without being dispatched.
+        result_cache_file = kwds.pop("result_cache_file", None)
+        result_cache_entries = kwds.pop("result_cache_entries", None)
+        result_cache_bytes = kwds.pop("result_cache_bytes", None)
+        self._result_cache = None
+        if kwds.pop("result_cache", False) or \
+           (result_cache_file is not None):
+            self._result_cache = ResultCache(
+                max_entries=result_cache_entries,
+                max_bytes=result_cache_bytes,
+                filename=result_cache_file)
         if self._verbose:
             print("Verbose output enabled...")
 
+    def _notify(self):
+        with self._queue_condition:
+            self._queue_condition.notify_all()
+
+    def _stamp_deadline(self, task):
+        # Convert a time-to-live into a deadline on the clock of the
+        # dispatcher, so that client and dispatcher clocks need not agree
+        ttl = task.get('ttl')
+        if ttl is not None:
+            deadline = time.time() + ttl
+            if task.get('deadline') is None or deadline < task['deadline']:
+                task['deadline'] = deadline
+            task['ttl'] = None
+
+    def _answer_from_cache(self, type, task):
+        # Place the cached result of a task on its result queue,
+        # returning False if the task must be dispatched
+        if (not task['generateResponse']) or (not task.get('cache', True)):
+            return False
+        entry = self._result_cache.lookup(type, task)
+        if entry is None:
+            return False
+        result_type, task['result'], task['processedBy'] = entry
+        if self._verbose:
+            print("Task with id=" + str(task['id']) + " in queue type=" +
+                  str(type) + " was answered from the result cache")
+        if self._journal is not None:
+            self._journal.results_added(result_type, [task])
+        self._result_queue[result_type].put(task)
+        self._notify()
+        return True
+
+    def _expire_task(self, task, type):
+        if self._verbose:
+            print("Task with id=" + str(task['id']) + " in queue type=" +
+                  str(type) + " has expired; moving it to the result "
+                  "queue type=" + str(self._dead_letter_type))
+        task['type'] = type
+        task.pop('_cache_key', None)
+        if self._metrics is not None:
+            self._metrics.task_expired(type, task)
+        if self._journal is not None:
+            self._journal.results_added(self._dead_letter_type, [task])
+        self._result_queue[self._dead_letter_type].put(task)
+        self._notify()
+
+    def _requeue_expired(self):
+        # Called periodically by the lease reaper thread
+        retry, failed = self._leases.expire()
+        for type, task in retry:
+            if self._verbose:
+                print("Lease on task with id=" + str(task['id']) +
+                      " in queue type=" + str(type) + " has expired; "
+                      "queuing it again (attempt " +
+                      str(task['attempts'] + 1) + ")")
+            if self._journal is not None:
+                self._journal.tasks_added(type, [task])
+            self._task_queue[type].put(task)
+        if retry:
+            self._notify()
+        for type, task in failed:
+            if self._verbose:
+                print("Task with id=" + str(task['id']) + " in queue "
+                      "type=" + str(type) + " has failed after " +
+                      str(task['attempts']) + " attempts")
+            self._expire_task(task, type)
+
+    def _get_task(self, type, block, timeout):
+        # Get the next task that has not expired, moving any expired
+        # tasks to the dead-letter queue along the way
+        task_queue = self._task_queue[type]
+        if block and (timeout is not None):
+            endtime = time.time() + timeout
+        while True:
+            if (self._metrics is not None) and block and task_queue.empty():
+                self._metrics.request_blocked()
+                try:
+                    task = task_queue.get(block=block, timeout=timeout)
+                finally:
+                    self._metrics.request_unblocked()
+            else:
+                task = task_queue.get(block=block, timeout=timeout)
+            deadline = task.get('deadline')
+            if (deadline is None) or (deadline > time.time()):
+                if self._metrics is not None:
+                    self._metrics.task_taken(type, task)
+                return task
+            self._expire_task(task, type)
+            if block and (timeout is not None):
+                timeout = max(0, endtime - time.time())
+
     #
     # One-way methods (Pyro4 only)
     #
@@ -83,21 +295,63 @@ class Dispatcher(base):
         if self._verbose:
             print("Unregistering worker with name: %s" % (name))
         self._registered_workers.remove(name)
+        self._worker_codecs.pop(name, None)
+
+    @oneway
+    def renew_leases(self, lease_ids):
+        if self._leases is not None:
+            self._leases.renew(lease_ids)
+
+    # acknowledge tasks that do not generate a response
+    @oneway
+    def release_leases(self, lease_ids):
+        if self._leases is not None:
+            self._leases.release(lease_ids)
 
     @oneway
     def shutdown(self):
         print("Dispatcher received request to shut down - initiating...")
+        self._close()
         if using_pyro3:
             self.getDaemon().shutdown()
         else:
             self._pyroDaemon.shutdown()
 
+    def _close(self):
+        # Stop the background threads, and save the state that outlives
+        # the dispatcher
+        if self._metrics_writer is not None:
+            self._metrics_writer.stop()
+            self._metrics_writer = None
+        if self._lease_reaper is not None:
+            self._lease_reaper.stop()
+            self._lease_reaper = None
+        if (self._result_cache is not None) and \
+           (self._result_cache.filename is not None):
+            self._result_cache.save()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
     @oneway
     def add_task(self, task, type=None):
         if self._verbose:
             print("Received request to add task=<Task id=" + str(task['id']) +
                   ">; queue type=" + str(type))
+        self._stamp_deadline(task)
+        if self._leases is not None:
+            # a task returned by a worker is no longer leased
+            self._leases.acknowledge((task,))
+        if (self._result_cache is not None) and \
+           self._answer_from_cache(type, task):
+            return
+        if self._metrics is not None:
+            self._metrics.tasks_added(type, (task,),
+                                      self._task_queue[type].qsize() + 1)
+        if self._journal is not None:
+            self._journal.tasks_added(type, [task])
         self._task_queue[type].put(task)
+        self._notify()
 
     # process a set of tasks in one shot - the input
     # is a dictionary from queue type (including None)
@@ -110,15 +364,42 @@ class Dispatcher(base):
                 for task_type in tasks)))
         for task_type in tasks:
             task_queue = self._task_queue[task_type]
-            for task in tasks[task_type]:
+            type_tasks = tasks[task_type]
+            if self._leases is not None:
+                self._leases.acknowledge(type_tasks)
+            if self._result_cache is not None:
+                type_tasks = [task for task in type_tasks
+                              if not self._answer_from_cache(task_type, task)]
+                if not type_tasks:
+                    continue
+            if self._metrics is not None:
+                self._metrics.tasks_added(
+                    task_type, type_tasks,
+                    task_queue.qsize() + len(type_tasks))
+            for task in type_tasks:
+                self._stamp_deadline(task)
+            if self._journal is not None:
+                self._journal.tasks_added(task_type, type_tasks)
+            for task in type_tasks:
                 task_queue.put(task)
+        self._notify()
 
     @oneway
     def add_result(self, result, type=None):
         if self._verbose:
             print("Received request to add result with "
                   "result=" + str(result) + "; queue type=" + str(type))
+        if self._leases is not None:
+            self._leases.acknowledge((result,))
+        if self._result_cache is not None:
+            self._result_cache.store(type, result)
+        if self._metrics is not None:
+            self._metrics.results_added(type, (result,),
+                                        self._result_queue[type].qsize() + 1)
+        if self._journal is not None:
+            self._journal.results_added(type, [result])
         self._result_queue[type].put(result)
+        self._notify()
 
     # process a set of results in one shot - the input
     # is a dictionary from queue type (including None)
@@ -132,8 +413,21 @@ class Dispatcher(base):
                         for result_type in results)))
         for result_type in results:
             result_queue = self._result_queue[result_type]
+            if self._leases is not None:
+                self._leases.acknowledge(results[result_type])
+            if self._result_cache is not None:
+                for result in results[result_type]:
+                    self._result_cache.store(result_type, result)
+            if self._metrics is not None:
+                self._metrics.results_added(
+                    result_type, results[result_type],
+                    result_queue.qsize() + len(results[result_type]))
+            if self._journal is not None:
+                self._journal.results_added(result_type,
+                                            results[result_type])
             for result in results[result_type]:
                 result_queue.put(result)
+        self._notify()
 
     #
     # Methods that do not return anything but are
@@ -145,6 +439,10 @@ class Dispatcher(base):
             print("Received request to clear task and result "
                   "queues for queue type=" + str(type))
 
+        if self._journal is not None:
+            self._journal.cleared('both', type)
+        if self._leases is not None:
+            self._leases.forget(type)
         try:
             _clear_queue_threadsafe(self._task_queue[type])
         except KeyError:
@@ -159,13 +457,21 @@ class Dispatcher(base):
             self.clear_queue(type=type)
 
     def clear_all_queues(self):
-        self._task_queue = defaultdict(Queue.Queue)
+        if self._journal is not None:
+            self._journal.cleared('both')
+        if self._leases is not None:
+            self._leases.forget(all_types=True)
+        self._task_queue = defaultdict(self._task_queue_type)
         self._result_queue = defaultdict(Queue.Queue)
 
     def clear_task_queue(self, type=None):
         if self._verbose:
             print("Received request to clear task "
                   "queue for queue type=" + str(type))
+        if self._journal is not None:
+            self._journal.cleared('tasks', type)
+        if self._leases is not None:
+            self._leases.forget(type)
         try:
             _clear_queue_threadsafe(self._task_queue[type])
         except KeyError:
@@ -176,12 +482,18 @@ class Dispatcher(base):
             self.clear_task_queue(type=type)
 
     def clear_all_task_queues(self):
-        self._task_queue = defaultdict(Queue.Queue)
+        if self._journal is not None:
+            self._journal.cleared('tasks')
+        if self._leases is not None:
+            self._leases.forget(all_types=True)
+        self._task_queue = defaultdict(self._task_queue_type)
 
     def clear_result_queue(self, type=None):
         if self._verbose:
             print("Received request to clear result "
                   "queue for queue type=" + str(type))
+        if self._journal is not None:
+            self._journal.cleared('results', type)
         try:
             _clear_queue_threadsafe(self._result_queue[type])
         except KeyError:
@@ -192,6 +504,8 @@ class Dispatcher(base):
             self.clear_result_queue(type=type)
 
     def clear_all_result_queues(self):
+        if self._journal is not None:
+            self._journal.cleared('results')
         self._result_queue = defaultdict(Queue.Queue)
 
     #
@@ -216,38 +530,67 @@ class Dispatcher(base):
             return True
         return False
 
+    def register_worker_codecs(self, name, codecs, compressors):
+        self._worker_codecs[name] = (set(codecs), set(compressors))
+
+    def worker_codecs(self):
+        """
+        Return the lists of payload codecs and compressors supported by
+        every registered worker, or None if no worker has reported them.
+        """
+        supported = [self._worker_codecs[name]
+                     for name in list(self._worker_codecs)
+                     if name in self._registered_workers]
+        if not supported:
+            return None
+        codecs = set.intersection(*[c for c, _ in supported])
+        compressors = set.intersection(*[c for _, c in supported])
+        return sorted(codecs), sorted(compressors)
+
     def get_task(self, type=None, block=True, timeout=5):
         if self._verbose:
             print("Received request to get a task from "
                   "queue type=" + str(type) + "; block=" + str(block) +
                   "; timeout=" + str(timeout) + " seconds")
         try:
-            task = self._task_queue[type].get(block=block, timeout=timeout)
-            return task
+            task = self._get_task(type, block, timeout)
         except Queue.Empty:
             return None
-
+        if self._leases is not None:
+            self._leases.grant(type, (task,))
+        if self._journal is not None:
+            self._journal.tasks_taken(type, [task])
+        return task
+
+    # Each request is a tuple (type, block, timeout) or (type, block,
+    # timeout, max_tasks); by default, all available tasks in the queue
+    # are returned.
     def get_tasks(self, type_block_timeout_list):
         if self._verbose:
             print("Received request to get tasks in bulk. "
                   "Queue request types=" + str(type_block_timeout_list))
 
         ret = {}
-        for type, block, timeout in type_block_timeout_list:
+        for request in type_block_timeout_list:
+            type, block, timeout = request[:3]
+            max_tasks = request[3] if len(request) > 3 else None
             task_list = []
             try:
-                task_list.append(self._task_queue[type].get(block=block,
-                                                            timeout=timeout))
+                task_list.append(self._get_task(type, block, timeout))
             except Queue.Empty:
                 pass
             else:
-                while self._task_queue[type].qsize():
+                while self._task_queue[type].qsize() and \
+                      ((max_tasks is None) or (len(task_list) < max_tasks)):
                     try:
-                        task_list.append(self._task_queue[type].get(
-                            block=block, timeout=timeout))
+                        task_list.append(self._get_task(type, False, None))
                     except Queue.Empty:
                         pass
             if len(task_list) > 0:
+                if self._leases is not None:
+                    self._leases.grant(type, task_list)
+                if self._journal is not None:
+                    self._journal.tasks_taken(type, task_list)
                 ret.setdefault(type, []).extend(task_list)
 
         return ret
@@ -258,9 +601,14 @@ class Dispatcher(base):
                   "queue type=" + str(type) + "; block=" + str(block) +
                   "; timeout=" + str(timeout))
         try:
-            return self._result_queue[type].get(block=block, timeout=timeout)
+            result = self._result_queue[type].get(block=block, timeout=timeout)
         except Queue.Empty:
             return None
+        if self._metrics is not None:
+            self._metrics.results_taken(type, 1)
+        if self._journal is not None:
+            self._journal.results_taken(type, [result])
+        return result
 
     def get_results(self, type_block_timeout_list):
         if self._verbose:
@@ -283,6 +631,10 @@ class Dispatcher(base):
                     except Queue.Empty:
                         pass
             if len(result_list) > 0:
+                if self._metrics is not None:
+                    self._metrics.results_taken(type_name, len(result_list))
+                if self._journal is not None:
+                    self._journal.results_taken(type_name, result_list)
                 ret.setdefault(type_name, []).extend(result_list)
 
         return ret
@@ -314,6 +666,35 @@ class Dispatcher(base):
 
         return results
 
+    def wait_any(self, queue_types, timeout=5, results=True):
+        """
+        Wait until any of the named result queues (or task queues, if
+        results is False) is not empty, and return the list of those
+        that are not empty.  An empty list is returned if the timeout
+        (in seconds) expires first; a timeout of None waits
+        indefinitely.
+        """
+        if self._verbose:
+            print("Received request to wait for " +
+                  ("results" if results else "tasks") + " in queue "
+                  "types=" + str(queue_types) + "; timeout=" + str(timeout))
+        if timeout is not None:
+            endtime = time.time() + timeout
+        with self._queue_condition:
+            while True:
+                queues = self._result_queue if results else self._task_queue
+                ready = [type for type in queue_types
+                         if (type in queues) and (queues[type].qsize() > 0)]
+                if ready:
+                    return ready
+                if timeout is None:
+                    self._queue_condition.wait()
+                else:
+                    remaining = endtime - time.time()
+                    if remaining <= 0:
+                        return []
+                    self._queue_condition.wait(remaining)
+
     def get_results_all_queues(self):
 
         if self._verbose:
@@ -326,13 +707,59 @@ class Dispatcher(base):
         # the queue may change while iterating.
         #
         for queue_name, result_queue in list(self._result_queue.items()):
+            count = 0
             while result_queue.qsize() > 0:
                 try:
                     results.append(result_queue.get(block=False, timeout=0))
+                    count += 1
                 except Queue.Empty:
                     pass
+            if count and (self._metrics is not None):
+                self._metrics.results_taken(queue_name, count)
+            if count and (self._journal is not None):
+                self._journal.results_taken(queue_name, results[-count:])
         return results
 
+    def get_lease_timeout(self):
+        """
+        Return the number of seconds that a task is leased to a worker,
+        or None if tasks are not leased.
+        """
+        if self._leases is None:
+            return None
+        return self._leases.timeout
+
+    def get_cache_stats(self):
+        """
+        Return the hit and miss counts and the size of the result cache
+        (see pyutilib.pyro.cache), or None if results are not cached.
+        """
+        if self._result_cache is None:
+            return None
+        return self._result_cache.stats()
+
+    def clear_result_cache(self):
+        if self._result_cache is not None:
+            self._result_cache.clear()
+            self._result_cache.reset_stats()
+
+    def get_metrics(self):
+        """
+        Return a snapshot of the dispatcher metrics (see
+        pyutilib.pyro.metrics), or None if they are not being collected.
+        """
+        if self._metrics is None:
+            return None
+        return self._metrics.snapshot(
+            dict((type, q.qsize())
+                 for type, q in list(self._task_queue.items())),
+            dict((type, q.qsize())
+                 for type, q in list(self._result_queue.items())))
+
+    def reset_metrics(self):
+        if self._metrics is not None:
+            self._metrics.reset()
+
 
 Dispatcher = expose(Dispatcher)
 
@@ -345,7 +772,21 @@ def DispatcherServer(group=":PyUtilibServer",
                      verbose=False,
                      max_allowed_connections=None,
                      worker_limit=None,
-                     clear_group=True):
+                     clear_group=True,
+                     priority_queues=False,
+                     dead_letter_type="dead_letter",
+                     metrics=False,
+                     metrics_file=None,
+                     metrics_interval=10,
+                     journal=None,
+                     journal_sync_interval=0.05,
+                     lease_timeout=None,
+                     max_attempts=None,
+                     retry_backoff=0,
+                     result_cache=False,
+                     result_cache_entries=None,
+                     result_cache_bytes=None,
+                     result_cache_file=None):
 
     set_maxconnections(max_allowed_connections=max_allowed_connections)
 
@@ -388,7 +829,22 @@ def DispatcherServer(group=":PyUtilibServer",
             except _pyro.errors.NamingError:
                 pass
 
-    disp = Dispatcher(verbose=verbose, worker_limit=worker_limit)
+    disp = Dispatcher(verbose=verbose,
+                      worker_limit=worker_limit,
+                      priority_queues=priority_queues,
+                      dead_letter_type=dead_letter_type,
+                      metrics=metrics,
+                      metrics_file=metrics_file,
+                      metrics_interval=metrics_interval,
+                      journal=journal,
+                      journal_sync_interval=journal_sync_interval,
+                      lease_timeout=lease_timeout,
+                      max_attempts=max_attempts,
+                      retry_backoff=retry_backoff,
+                      result_cache=result_cache,
+                      result_cache_entries=result_cache_entries,
+                      result_cache_bytes=result_cache_bytes,
+                      result_cache_file=result_cache_file)
     proxy_name = group + ".dispatcher." + str(uuid.uuid4())
     if using_pyro3:
         uri = daemon.connect(disp, proxy_name)
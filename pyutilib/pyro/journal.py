@@ -0,0 +1,216 @@
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# An append-only journal of the changes made to the queues of a
+# Dispatcher, so that they can be recovered after a crash.
+#
+# Every task and result that passes through a journaled dispatcher is
+# given a journal id (under the '_journal_id' key).  A worker returns the
+# task dictionary as its result, so a result that carries the id of a
+# task acknowledges that task.  On replay, every task that was not
+# acknowledged (whether or not it had been handed to a worker) is
+# queued again, and every result that was not collected by a client is
+# restored.
+#
+# Each record is a pickled tuple preceded by its length and CRC-32, and
+# covers all of the tasks or results of a single request:
+#
+#    ('T', type, [task, ...])      tasks added
+#    ('G', type, [id, ...])        tasks handed to a worker
+#    ('R', type, [result, ...])    results added
+#    ('D', type, [id, ...])        results collected by a client
+#    ('C', kind, type)             queue(s) cleared: kind is 'tasks',
+#                                  'results' or 'both', and type is the
+#                                  queue type or _ALL
+#
+# Records are written to the operating system as they arrive, and a
+# background thread flushes and fsyncs the file every sync_interval
+# seconds, so that many records share the cost of a single fsync.  A
+# crash can lose at most the records of the last interval.  The fsync
+# is done without holding the lock used by the writers, so requests are
+# not blocked while the disk catches up.
+#
+
+__all__ = ['Journal', 'replay_journal']
+
+import os
+import struct
+import threading
+import zlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+_header = struct.Struct('<II')
+_id_key = '_journal_id'
+_ALL = ('*', 'all queues')
+
+
+def _records(filename):
+    # Generate the records in a journal file, stopping at the first
+    # incomplete or corrupt record (e.g., one cut short by a crash)
+    with open(filename, 'rb') as INPUT:
+        data = INPUT.read()
+    offset = 0
+    while offset + _header.size <= len(data):
+        size, crc = _header.unpack_from(data, offset)
+        start = offset + _header.size
+        payload = data[start:start + size]
+        if len(payload) < size or \
+           (zlib.crc32(payload) & 0xffffffff) != crc:
+            break
+        yield pickle.loads(payload)
+        offset = start + size
+
+
+def replay_journal(filename):
+    """
+    Replay a journal, returning the tuple (tasks, results, next_id,
+    handed_out): the lists of (type, task) and (type, result) pairs that
+    were still queued when the journal ended (in their original order),
+    the next unused journal id, and the number of the returned tasks
+    that had been handed to a worker without being acknowledged.
+    """
+    tasks = {}
+    results = {}
+    handed = set()
+    next_id = 0
+    for record in _records(filename):
+        kind = record[0]
+        if kind == 'T':
+            for task in record[2]:
+                jid = task[_id_key]
+                tasks[jid] = (record[1], task)
+                handed.discard(jid)
+                next_id = max(next_id, jid + 1)
+        elif kind == 'G':
+            handed.update(record[2])
+        elif kind == 'R':
+            for result in record[2]:
+                jid = result[_id_key]
+                tasks.pop(jid, None)
+                handed.discard(jid)
+                results[jid] = (record[1], result)
+                next_id = max(next_id, jid + 1)
+        elif kind == 'D':
+            for jid in record[2]:
+                results.pop(jid, None)
+        elif kind == 'C':
+            which, type = record[1], record[2]
+            for queue in ((tasks, results) if which == 'both' else
+                          ((tasks,) if which == 'tasks' else (results,))):
+                for jid in [jid for jid, item in queue.items()
+                            if type == _ALL or item[0] == type]:
+                    del queue[jid]
+                    handed.discard(jid)
+    task_list = [tasks[jid] for jid in sorted(tasks)]
+    result_list = [results[jid] for jid in sorted(results)]
+    return task_list, result_list, next_id, len(handed)
+
+
+class Journal(object):
+    """
+    The journal of a Dispatcher.  The methods are called by the
+    dispatcher as it changes its queues.
+    """
+
+    def __init__(self, filename, sync_interval=0.05, next_id=0):
+        self.filename = filename
+        self.sync_interval = sync_interval
+        self._next_id = next_id
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # The number of records written, and the number known to be on
+        # disk
+        self._written = 0
+        self._synced = 0
+        self._file = open(filename, 'ab')
+        self._closed = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop)
+        self._syncer.daemon = True
+        self._syncer.start()
+
+    def _write(self, record):
+        payload = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._file.write(_header.pack(len(payload),
+                                          zlib.crc32(payload) & 0xffffffff))
+            self._file.write(payload)
+            self._written += 1
+
+    def _assign_ids(self, items):
+        with self._lock:
+            for item in items:
+                if item.get(_id_key) is None:
+                    item[_id_key] = self._next_id
+                    self._next_id += 1
+
+    def sync(self):
+        with self._sync_lock:
+            with self._lock:
+                if self._written == self._synced:
+                    return
+                # Hand the buffered records to the operating system;
+                # the records written after this are left for the next
+                # sync
+                self._file.flush()
+                written = self._written
+            os.fsync(self._file.fileno())
+            self._synced = written
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.sync_interval):
+            self.sync()
+
+    def close(self):
+        self._closed.set()
+        self._syncer.join()
+        self.sync()
+        self._file.close()
+
+    def tasks_added(self, type, tasks):
+        self._assign_ids(tasks)
+        self._write(('T', type, tasks))
+
+    def tasks_taken(self, type, tasks):
+        self._write(('G', type, [task.get(_id_key) for task in tasks]))
+
+    def results_added(self, type, results):
+        self._assign_ids(results)
+        self._write(('R', type, results))
+
+    def results_taken(self, type, results):
+        # The journal id is only needed by the dispatcher
+        self._write(('D', type, [result.pop(_id_key, None)
+                                 for result in results]))
+
+    def cleared(self, which, type=_ALL):
+        self._write(('C', which, type))
+
+    @staticmethod
+    def compact(filename, tasks, results):
+        """
+        Rewrite a journal so that it only holds the given tasks and
+        results (as returned by replay_journal).
+        """
+        tmpname = filename + '.tmp'
+        with open(tmpname, 'wb') as OUTPUT:
+            for records in ((('T', type, [task]) for type, task in tasks),
+                            (('R', type, [result])
+                             for type, result in results)):
+                for record in records:
+                    payload = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+                    OUTPUT.write(_header.pack(len(payload),
+                                              zlib.crc32(payload) & 0xffffffff))
+                    OUTPUT.write(payload)
+            OUTPUT.flush()
+            os.fsync(OUTPUT.fileno())
+        getattr(os, 'replace', os.rename)(tmpname, filename)
@@ -0,0 +1,148 @@
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# Leases on the tasks that a Dispatcher has handed to workers.
+#
+# Each task handed out is given a lease id (under the '_lease_id' key)
+# and a lease that expires 'timeout' seconds later unless the worker
+# renews it.  A worker acknowledges a task by returning it as a result
+# (a worker returns the task dictionary, so the result carries the lease
+# id), by returning it to a task queue, or by releasing the lease.  When
+# a lease expires, the task is queued again after a delay that doubles
+# with each attempt, or moved to the dead-letter queue once it has used
+# up its attempts.
+#
+
+__all__ = ['LeaseTable']
+
+import time
+import heapq
+import itertools
+import threading
+
+_id_key = '_lease_id'
+
+
+class LeaseTable(object):
+    """
+    The leases held on tasks, and the expired tasks that are waiting to
+    be retried.
+    """
+
+    def __init__(self, timeout, max_attempts=None, backoff=0):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        # lease id -> [expiry, type, task]
+        self._leases = {}
+        # heap of (retry time, counter, type, task)
+        self._retries = []
+
+    def __len__(self):
+        return len(self._leases)
+
+    def grant(self, type, tasks):
+        expiry = time.time() + self.timeout
+        with self._lock:
+            for task in tasks:
+                lease_id = next(self._ids)
+                task[_id_key] = lease_id
+                self._leases[lease_id] = [expiry, type, task]
+
+    def renew(self, lease_ids):
+        expiry = time.time() + self.timeout
+        with self._lock:
+            for lease_id in lease_ids:
+                lease = self._leases.get(lease_id)
+                if lease is not None:
+                    lease[0] = expiry
+
+    def release(self, lease_ids):
+        with self._lock:
+            for lease_id in lease_ids:
+                self._leases.pop(lease_id, None)
+
+    def acknowledge(self, items):
+        # Release the leases of tasks that have come back to the
+        # dispatcher (as results or as tasks), and remove the lease ids
+        with self._lock:
+            for item in items:
+                lease_id = item.pop(_id_key, None)
+                if lease_id is not None:
+                    self._leases.pop(lease_id, None)
+
+    def forget(self, type=None, all_types=False):
+        # Drop the leases and retries of the tasks of a queue type that
+        # is being cleared
+        with self._lock:
+            for lease_id in [lease_id
+                             for lease_id, lease in self._leases.items()
+                             if all_types or lease[1] == type]:
+                del self._leases[lease_id]
+            self._retries = [item for item in self._retries
+                             if not (all_types or item[2] == type)]
+            heapq.heapify(self._retries)
+
+    def expire(self, now=None):
+        """
+        Remove the leases that have expired, returning two lists of
+        (type, task) pairs: the tasks to queue again now, and the tasks
+        that have used up their attempts.  Tasks with a retry delay are
+        returned by a later call, once the delay has passed.
+        """
+        if now is None:
+            now = time.time()
+        retry = []
+        failed = []
+        with self._lock:
+            for lease_id in [lease_id
+                             for lease_id, lease in self._leases.items()
+                             if lease[0] <= now]:
+                expiry, type, task = self._leases.pop(lease_id)
+                task.pop(_id_key, None)
+                attempts = task.get('attempts', 0) + 1
+                task['attempts'] = attempts
+                if (self.max_attempts is not None) and \
+                   (attempts >= self.max_attempts):
+                    failed.append((type, task))
+                elif self.backoff:
+                    heapq.heappush(
+                        self._retries,
+                        (now + self.backoff * 2**(attempts - 1),
+                         next(self._ids), type, task))
+                else:
+                    retry.append((type, task))
+            while self._retries and (self._retries[0][0] <= now):
+                item = heapq.heappop(self._retries)
+                retry.append((item[2], item[3]))
+        return retry, failed
+
+
+class _LeaseReaper(threading.Thread):
+    """
+    A thread that calls the _requeue_expired() method of a dispatcher
+    every 'interval' seconds.
+    """
+
+    def __init__(self, dispatcher, interval):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.dispatcher = dispatcher
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.dispatcher._requeue_expired()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
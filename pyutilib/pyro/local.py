@@ -0,0 +1,221 @@
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# Run a dispatcher and its workers on a single node without Pyro.
+#
+# A LocalDispatcher is used directly by a Client (and by workers) in the
+# same process, so tasks and results are handed over without being
+# serialized.  A LocalCluster runs a set of workers for a
+# LocalDispatcher, either as threads of the current process or as
+# separate processes, which reach the dispatcher through a
+# multiprocessing manager served by a thread of the current process
+# (so no name server is needed, and task data is pickled rather than
+# passed through the Pyro serializer).
+#
+
+__all__ = ['LocalDispatcher', 'LocalCluster', 'DispatcherClosed']
+
+import sys
+import time
+import threading
+import multiprocessing
+from multiprocessing.managers import BaseManager
+
+from pyutilib.pyro.dispatcher import Dispatcher
+from pyutilib.pyro.client import Client
+
+from six.moves import xrange
+
+if sys.version_info >= (3, 0):
+    import queue as Queue
+else:
+    import Queue
+
+# The longest time that a request blocked on an empty queue goes without
+# checking whether the dispatcher has shut down
+_poll_interval = 0.1
+
+
+class DispatcherClosed(Exception):
+    """
+    Raised when a worker requests tasks from a LocalDispatcher that has
+    shut down.
+    """
+
+
+class LocalDispatcher(Dispatcher):
+    """
+    A Dispatcher that is called directly rather than through Pyro.  It
+    accepts the same options as Dispatcher.
+    """
+
+    _requires_pyro = False
+
+    def __init__(self, **kwds):
+        self._closed = False
+        Dispatcher.__init__(self, **kwds)
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._close()
+
+    def _check_closed(self):
+        if self._closed:
+            raise DispatcherClosed("The dispatcher has shut down")
+
+    def _get_task(self, type, block, timeout):
+        self._check_closed()
+        if not block:
+            return Dispatcher._get_task(self, type, block, timeout)
+        if timeout is not None:
+            endtime = time.time() + timeout
+        while True:
+            if timeout is None:
+                wait = _poll_interval
+            else:
+                wait = max(0, min(_poll_interval, endtime - time.time()))
+            try:
+                return Dispatcher._get_task(self, type, True, wait)
+            except Queue.Empty:
+                self._check_closed()
+                if (timeout is not None) and (time.time() >= endtime):
+                    raise
+
+    def wait_any(self, queue_types, timeout=5, results=True):
+        self._check_closed()
+        if timeout is not None:
+            endtime = time.time() + timeout
+        while True:
+            if timeout is None:
+                wait = _poll_interval
+            else:
+                wait = max(0, min(_poll_interval, endtime - time.time()))
+            ready = Dispatcher.wait_any(self, queue_types, timeout=wait,
+                                        results=results)
+            if ready:
+                return ready
+            self._check_closed()
+            if (timeout is not None) and (time.time() >= endtime):
+                return ready
+
+
+def _run_worker(worker_class, dispatcher, kwds):
+    worker = worker_class(dispatcher=dispatcher, **kwds)
+    try:
+        worker.run()
+    except (DispatcherClosed, EOFError, IOError):
+        # the cluster has shut down
+        pass
+
+
+def _serve_forever(server):
+    # A manager server calls sys.exit() from serve_forever() when it is
+    # stopped
+    try:
+        server.serve_forever()
+    except SystemExit:
+        pass
+
+
+class LocalCluster(object):
+    """
+    A LocalDispatcher and num_workers instances of a worker class that
+    serve it, run as threads (the default) or as processes.  The
+    worker_kwds are passed to each worker, and the remaining keywords
+    to the LocalDispatcher.
+
+    Threads share task data with the client, so they suit workers that
+    spend their time outside of the Python interpreter lock (e.g., in
+    a solver); processes suit workers that run Python code.  When
+    processes are used, worker_class must be importable by the worker
+    processes.
+    """
+
+    def __init__(self, worker_class, num_workers=1, processes=False,
+                 worker_kwds=None, **kwds):
+        self.dispatcher = LocalDispatcher(**kwds)
+        self.worker_class = worker_class
+        self.num_workers = num_workers
+        self.processes = processes
+        self.worker_kwds = dict(worker_kwds or {})
+        self._workers = []
+        self._server = None
+        self._proxy = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def client(self, **kwds):
+        """
+        Return a Client for the dispatcher of this cluster.
+        """
+        return Client(dispatcher=self.dispatcher, **kwds)
+
+    def _serve(self):
+        # Serve the dispatcher to worker processes from a thread of this
+        # process, returning a proxy for it (which is kept until the
+        # cluster is closed, so that the served object is not released
+        # before the workers connect)
+        dispatcher = self.dispatcher
+        manager_class = type('_DispatcherManager', (BaseManager,), {})
+        manager_class.register('dispatcher', callable=lambda: dispatcher)
+        authkey = multiprocessing.current_process().authkey
+        self._server = manager_class(authkey=authkey).get_server()
+        server_thread = threading.Thread(target=_serve_forever,
+                                         args=(self._server,))
+        server_thread.daemon = True
+        server_thread.start()
+        manager = manager_class(address=self._server.address,
+                                authkey=authkey)
+        manager.connect()
+        self._proxy = manager.dispatcher()
+        return self._proxy
+
+    def start(self):
+        if self.processes:
+            dispatcher = self._serve()
+        else:
+            dispatcher = self.dispatcher
+        for i in xrange(self.num_workers):
+            kwds = dict(self.worker_kwds)
+            kwds.setdefault('name', 'LocalWorker_%d' % (i))
+            args = (self.worker_class, dispatcher, kwds)
+            if self.processes:
+                worker = multiprocessing.Process(target=_run_worker,
+                                                 args=args)
+            else:
+                worker = threading.Thread(target=_run_worker, args=args)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def close(self, timeout=5):
+        """
+        Shut down the dispatcher, and wait up to timeout seconds for
+        each worker to finish its current task (worker processes that
+        are still running are then terminated).
+        """
+        self.dispatcher.shutdown()
+        for worker in self._workers:
+            worker.join(timeout)
+            if self.processes and worker.is_alive():
+                worker.terminate()
+                worker.join()
+        self._workers = []
+        self._proxy = None
+        if self._server is not None:
+            if hasattr(self._server, 'stop_event'):
+                self._server.stop_event.set()
+            self._server = None
@@ -0,0 +1,246 @@
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# Counters and latency histograms collected by a Dispatcher.
+#
+# Each task that passes through an instrumented dispatcher carries the
+# times it was received and handed to a worker (under the
+# '_dispatcher_times' key).  The key is removed when the result is
+# returned to the dispatcher, so clients never see it.
+#
+
+__all__ = ['Histogram', 'DispatcherMetrics']
+
+import json
+import threading
+import time
+from collections import defaultdict
+
+_times_key = '_dispatcher_times'
+
+
+class Histogram(object):
+    """
+    A histogram of durations (in seconds) with logarithmically spaced
+    buckets: bucket i holds the values in [base*2**(i-1), base*2**i),
+    and bucket 0 holds everything below base.
+    """
+
+    def __init__(self, base=1e-4, nbuckets=24):
+        self.base = base
+        self.buckets = [0] * nbuckets
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        i = 0
+        bound = self.base
+        last = len(self.buckets) - 1
+        while value >= bound and i < last:
+            i += 1
+            bound *= 2
+        self.buckets[i] += 1
+
+    def quantile(self, q):
+        """
+        Return an estimate of the q-th quantile (the upper bound of the
+        bucket that contains it, clipped to the largest value seen).
+        """
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        bound = self.base
+        # the last bucket has no upper bound other than the largest value
+        for n in self.buckets[:-1]:
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+            bound *= 2
+        return self.max
+
+    def summary(self):
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else None,
+                'min': self.min,
+                'max': self.max,
+                'p50': self.quantile(0.5),
+                'p90': self.quantile(0.9),
+                'p99': self.quantile(0.99),
+                'base': self.base,
+                'buckets': list(self.buckets)}
+
+
+class _QueueMetrics(object):
+
+    def __init__(self):
+        self.tasks_added = 0
+        self.tasks_taken = 0
+        self.tasks_expired = 0
+        self.results_added = 0
+        self.results_taken = 0
+        self.max_task_depth = 0
+        self.max_result_depth = 0
+        # received -> handed to a worker
+        self.wait_time = Histogram()
+        # handed to a worker -> result received
+        self.service_time = Histogram()
+        # received -> result received
+        self.total_time = Histogram()
+
+
+class DispatcherMetrics(object):
+    """
+    Counters for the traffic through each queue type of a dispatcher,
+    histograms of the task latencies, per-worker throughput, and the
+    number of get_task(s) requests that had to wait for a task.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.start_time = time.time()
+            self._queues = defaultdict(_QueueMetrics)
+            self._workers = defaultdict(int)
+            self.blocked_requests = 0
+            self.blocked_now = 0
+            self.max_blocked = 0
+
+    def tasks_added(self, type, tasks, depth):
+        now = time.time()
+        with self._lock:
+            q = self._queues[type]
+            for task in tasks:
+                task[_times_key] = [now, None]
+            q.tasks_added += len(tasks)
+            q.max_task_depth = max(q.max_task_depth, depth)
+
+    def task_taken(self, type, task):
+        now = time.time()
+        with self._lock:
+            q = self._queues[type]
+            q.tasks_taken += 1
+            times = task.get(_times_key)
+            if times is not None:
+                times[1] = now
+                q.wait_time.add(now - times[0])
+
+    def task_expired(self, type, task):
+        task.pop(_times_key, None)
+        with self._lock:
+            self._queues[type].tasks_expired += 1
+
+    def request_blocked(self):
+        with self._lock:
+            self.blocked_requests += 1
+            self.blocked_now += 1
+            self.max_blocked = max(self.max_blocked, self.blocked_now)
+
+    def request_unblocked(self):
+        with self._lock:
+            self.blocked_now -= 1
+
+    def results_added(self, type, results, depth):
+        now = time.time()
+        with self._lock:
+            q = self._queues[type]
+            q.results_added += len(results)
+            q.max_result_depth = max(q.max_result_depth, depth)
+            for result in results:
+                times = result.pop(_times_key, None)
+                if times is not None:
+                    if times[1] is not None:
+                        q.service_time.add(now - times[1])
+                    q.total_time.add(now - times[0])
+                self._workers[result.get('processedBy')] += 1
+
+    def results_taken(self, type, count):
+        with self._lock:
+            self._queues[type].results_taken += count
+
+    def snapshot(self, task_depths=None, result_depths=None):
+        """
+        Return the current metrics as a dictionary of basic types (the
+        queue types are converted to strings).  The optional
+        task_depths and result_depths map queue types to their current
+        sizes.
+        """
+        now = time.time()
+        with self._lock:
+            elapsed = now - self.start_time
+            queues = {}
+            for type, q in list(self._queues.items()):
+                queues[str(type)] = {
+                    'tasks_added': q.tasks_added,
+                    'tasks_taken': q.tasks_taken,
+                    'tasks_expired': q.tasks_expired,
+                    'results_added': q.results_added,
+                    'results_taken': q.results_taken,
+                    'enqueue_rate': q.tasks_added / elapsed if elapsed else None,
+                    'dequeue_rate': q.tasks_taken / elapsed if elapsed else None,
+                    'task_depth': (task_depths or {}).get(type, 0),
+                    'result_depth': (result_depths or {}).get(type, 0),
+                    'max_task_depth': q.max_task_depth,
+                    'max_result_depth': q.max_result_depth,
+                    'wait_time': q.wait_time.summary(),
+                    'service_time': q.service_time.summary(),
+                    'total_time': q.total_time.summary()}
+            workers = {}
+            for name, count in list(self._workers.items()):
+                workers[str(name)] = {
+                    'results': count,
+                    'throughput': count / elapsed if elapsed else None}
+            return {'time': now,
+                    'elapsed': elapsed,
+                    'blocked_requests': self.blocked_requests,
+                    'blocked_now': self.blocked_now,
+                    'max_blocked': self.max_blocked,
+                    'queues': queues,
+                    'workers': workers}
+
+
+class _MetricsWriter(threading.Thread):
+    """
+    A thread that appends a JSON-encoded snapshot of the dispatcher
+    metrics to a file every 'interval' seconds.
+    """
+
+    def __init__(self, dispatcher, filename, interval):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.dispatcher = dispatcher
+        self.filename = filename
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.write()
+        self.write()
+
+    def write(self):
+        with open(self.filename, 'a') as OUTPUT:
+            OUTPUT.write(json.dumps(self.dispatcher.get_metrics(),
+                                    sort_keys=True))
+            OUTPUT.write('\n')
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
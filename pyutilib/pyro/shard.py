@@ -0,0 +1,344 @@
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# Spread the task queues of a group over several dispatchers.
+#
+# Tasks are routed to dispatchers (shards) with a consistent hash of
+# either the queue type or a block of task ids.  The ring is built from
+# the names the dispatchers registered with the name server, so every
+# client and worker that sees the same set of dispatchers routes the
+# same way, and adding or removing a dispatcher only moves the keys
+# that hashed to it.
+#
+# When routing by type, a worker should pass shard_key=<type> so that it
+# connects to the dispatcher that owns its queue; when routing by task
+# id, every dispatcher holds tasks of every type and workers may attach
+# to any of them.
+#
+
+__all__ = ['HashRing', 'ShardedClient', 'find_shards']
+
+import time
+import bisect
+import hashlib
+
+from pyutilib.pyro.util import get_nameserver, get_dispatchers, using_pyro3
+from pyutilib.pyro.util import Pyro as _pyro
+from pyutilib.pyro.client import Client
+
+from six import iteritems
+from six.moves import xrange
+
+
+def _hash(key):
+    return int(hashlib.md5(str(key).encode('utf-8')).hexdigest()[:16], 16)
+
+
+class HashRing(object):
+    """
+    A consistent hash ring: each node is placed on the ring at
+    'replicas' pseudo-random points, and a key belongs to the node at
+    the first point that follows the hash of the key.
+    """
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self._points = []
+        self._owners = {}
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        return len(set(self._owners.values()))
+
+    def nodes(self):
+        return sorted(set(self._owners.values()))
+
+    def add(self, node):
+        for i in xrange(self.replicas):
+            point = _hash("%s#%d" % (node, i))
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+            self._owners[point] = node
+
+    def remove(self, node):
+        for i in xrange(self.replicas):
+            point = _hash("%s#%d" % (node, i))
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                self._points.remove(point)
+
+    def get_node(self, key):
+        if not self._points:
+            raise KeyError("HashRing is empty")
+        i = bisect.bisect(self._points, _hash(key))
+        if i == len(self._points):
+            i = 0
+        return self._owners[self._points[i]]
+
+
+def find_shards(group=":PyUtilibServer",
+                host=None,
+                port=None,
+                num_shards=None,
+                num_dispatcher_tries=30,
+                caller_name="Client"):
+    """
+    Return the sorted list of (name, uri) pairs for the dispatchers in
+    a group, waiting until at least num_shards have registered.
+    """
+    ns = get_nameserver(host=host, port=port, caller_name=caller_name)
+    if ns is None:
+        raise RuntimeError("%s failed to locate Pyro name "
+                           "server on the network!" % (caller_name,))
+    min_dispatchers = num_shards if num_shards else 1
+    dispatchers = []
+    for i in xrange(0, num_dispatcher_tries):
+        dispatchers = get_dispatchers(group=group,
+                                      ns=ns,
+                                      num_dispatcher_tries=1,
+                                      min_dispatchers=min_dispatchers)
+        if len(dispatchers) >= min_dispatchers:
+            break
+        sleep_interval = 1.0
+        print("%s found %d of %d dispatchers after %d attempts - trying "
+              "again in %5.2f seconds." % (caller_name, len(dispatchers),
+                                           min_dispatchers, i + 1,
+                                           sleep_interval))
+        time.sleep(sleep_interval)
+    if using_pyro3:
+        ns._release()
+    else:
+        ns._pyroRelease()
+    if len(dispatchers) < min_dispatchers:
+        raise RuntimeError("%s could only find %d of %d dispatchers" %
+                           (caller_name, len(dispatchers), min_dispatchers))
+    return sorted(dispatchers)
+
+
+class ShardedClient(object):
+    """
+    A client that spreads its tasks over all of the dispatchers in a
+    group.
+
+    With shard_by='type' (the default), all tasks of a queue type go to
+    the dispatcher that owns the type; with shard_by='id', tasks are
+    routed in blocks of id_block_size consecutive task ids, and results
+    are collected from every dispatcher.  The remaining keywords are
+    passed to the Client created for each dispatcher (e.g., to buffer
+    tasks or to encode their data).
+
+    Dispatchers may also be given directly as a list of (name, proxy)
+    pairs.
+    """
+
+    def __init__(self,
+                 group=":PyUtilibServer",
+                 type=None,
+                 host=None,
+                 port=None,
+                 num_shards=None,
+                 shard_by='type',
+                 id_block_size=1,
+                 num_dispatcher_tries=30,
+                 caller_name="Client",
+                 dispatchers=None,
+                 replicas=100,
+                 **kwds):
+        # Dispatchers given directly (e.g., LocalDispatchers) do not
+        # need Pyro
+        if (_pyro is None) and (dispatchers is None):
+            raise ImportError("Pyro or Pyro4 is not available")
+        if shard_by not in ('type', 'id'):
+            raise ValueError("ShardedClient: shard_by must be 'type' or "
+                             "'id', not '%s'" % (shard_by,))
+        self.type = type
+        self.shard_by = shard_by
+        self.id_block_size = id_block_size
+        if dispatchers is None:
+            dispatchers = []
+            for name, uri in find_shards(
+                    group=group,
+                    host=host,
+                    port=port,
+                    num_shards=num_shards,
+                    num_dispatcher_tries=num_dispatcher_tries,
+                    caller_name=caller_name):
+                if using_pyro3:
+                    dispatchers.append((name,
+                                        _pyro.core.getProxyForURI(uri)))
+                else:
+                    dispatchers.append((name, _pyro.Proxy(uri)))
+        self.shards = {}
+        for name, dispatcher in dispatchers:
+            self.shards[name] = Client(type=type,
+                                       dispatcher=dispatcher,
+                                       caller_name=caller_name,
+                                       **kwds)
+        self.ring = HashRing(self.shards, replicas=replicas)
+        # The shard to poll first for results, rotated so that no
+        # shard is starved
+        self._next_shard = 0
+
+    def _task_type(self, override_type):
+        return override_type if (override_type is not None) else self.type
+
+    def shard_for(self, task_type, task_id=None):
+        """
+        Return the name of the dispatcher that a task is routed to.
+        """
+        if self.shard_by == 'type':
+            return self.ring.get_node(task_type)
+        if task_id is None:
+            raise ValueError("ShardedClient: tasks must have an id when "
+                             "sharding by id")
+        return self.ring.get_node((task_type, task_id // self.id_block_size))
+
+    def _result_shards(self, task_type):
+        # The clients for the shards that may hold results of a type,
+        # starting with a different shard on each call
+        if self.shard_by == 'type':
+            return [self.shards[self.ring.get_node(task_type)]]
+        names = sorted(self.shards)
+        start = self._next_shard % len(names)
+        self._next_shard += 1
+        return [self.shards[name] for name in names[start:] + names[:start]]
+
+    def close(self):
+        for client in self.shards.values():
+            client.close()
+
+    def flush_tasks(self):
+        for client in self.shards.values():
+            client.flush_tasks()
+
+    def clear_queue(self, override_type=None, verbose=False):
+        task_type = self._task_type(override_type)
+        for client in self._result_shards(task_type):
+            client.clear_queue(override_type=task_type, verbose=verbose)
+
+    def add_task(self, task, override_type=None, verbose=False):
+        task_type = self._task_type(override_type)
+        self.shards[self.shard_for(task_type, task['id'])].add_task(
+            task, override_type=task_type, verbose=verbose)
+
+    def add_tasks(self, tasks, verbose=False):
+        routed = {}
+        for task_type, type_tasks in iteritems(tasks):
+            for task in type_tasks:
+                name = self.shard_for(task_type, task['id'])
+                routed.setdefault(name, {}).setdefault(task_type,
+                                                       []).append(task)
+        for name, shard_tasks in iteritems(routed):
+            self.shards[name].add_tasks(shard_tasks, verbose=verbose)
+
+    def get_result(self, override_type=None, block=True, timeout=5):
+        results = self._get_results(override_type, block, timeout, 1)
+        return results[0] if results else None
+
+    def get_results(self, override_type=None, block=True, timeout=5):
+        return self._get_results(override_type, block, timeout, None)
+
+    def _get_results(self, override_type, block, timeout, max_results):
+        task_type = self._task_type(override_type)
+        shards = self._result_shards(task_type)
+        if len(shards) == 1:
+            client = shards[0]
+            if max_results == 1:
+                result = client.get_result(override_type=task_type,
+                                           block=block,
+                                           timeout=timeout)
+                return [] if result is None else [result]
+            return client.get_results(override_type=task_type,
+                                      block=block,
+                                      timeout=timeout)
+        #
+        # Sweep the shards without blocking; if none has a result, wait
+        # briefly on each shard in turn until the timeout expires
+        #
+        if block and (timeout is not None):
+            endtime = time.time() + timeout
+        while True:
+            for client in shards:
+                if max_results == 1:
+                    result = client.get_result(override_type=task_type,
+                                               block=False)
+                    if result is not None:
+                        return [result]
+                else:
+                    results = client.get_results(override_type=task_type,
+                                                 block=False)
+                    if results:
+                        return results
+            if not block:
+                return []
+            if timeout is not None:
+                remaining = endtime - time.time()
+                if remaining <= 0:
+                    return []
+            else:
+                remaining = 0.05
+            shards = shards[1:] + shards[:1]
+            results = shards[0].get_results(
+                override_type=task_type,
+                block=True,
+                timeout=min(remaining, 0.05 / len(shards)))
+            if results:
+                return results[:1] if max_results == 1 else results
+
+    def iter_results(self, num_results=None, override_type=None,
+                     timeout=None):
+        """
+        Generate results from all shards as they become available (see
+        Client.iter_results).
+        """
+        if num_results is None and timeout is None:
+            timeout = 5
+        count = 0
+        while num_results is None or count < num_results:
+            batch = self.get_results(override_type=override_type,
+                                     block=True,
+                                     timeout=timeout)
+            if not batch:
+                if timeout is not None:
+                    return
+                continue
+            count += len(batch)
+            for result in batch:
+                yield result
+
+    def get_results_all_queues(self):
+        results = []
+        for client in self.shards.values():
+            results.extend(client.get_results_all_queues())
+        return results
+
+    def num_tasks(self, override_type=None):
+        task_type = self._task_type(override_type)
+        return sum(client.num_tasks(override_type=task_type)
+                   for client in self._result_shards(task_type))
+
+    def num_results(self, override_type=None):
+        task_type = self._task_type(override_type)
+        return sum(client.num_results(override_type=task_type)
+                   for client in self._result_shards(task_type))
+
+    def queues_with_results(self):
+        queues = set()
+        for client in self.shards.values():
+            queues.update(client.queues_with_results())
+        return list(queues)
+
+    def get_metrics(self):
+        return dict((name, client.get_metrics())
+                    for name, client in iteritems(self.shards))
+
+    def get_cache_stats(self):
+        return dict((name, client.get_cache_stats())
+                    for name, client in iteritems(self.shards))
@@ -21,14 +21,33 @@ from pyutilib.pyro.util import using_pyro4
 #
 
 
-def Task(id=None, data=None, generateResponse=True):
+# A dispatcher created with priority_queues=True hands out tasks with
+# a larger 'priority' first.  A task whose 'deadline' (in seconds since
+# the epoch) passes before it is handed to a worker is moved to the
+# dispatcher's dead-letter result queue; 'ttl' specifies the deadline in
+# seconds from when the dispatcher receives the task.  A dispatcher with
+# a result cache answers tasks from the cache unless 'cache' is False.
+#
+
+
+def Task(id=None,
+         data=None,
+         generateResponse=True,
+         priority=None,
+         deadline=None,
+         ttl=None,
+         cache=True):
     return {'id': id,
             'data': data,
             'result': None,
             'generateResponse': generateResponse,
             'processedBy': None,
             'client': None,
-            'type': None}
+            'type': None,
+            'priority': priority,
+            'deadline': deadline,
+            'ttl': ttl,
+            'cache': cache}
 
 
 #
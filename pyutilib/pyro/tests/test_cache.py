@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, TaskProcessingError, TaskWorker, LocalCluster
+from pyutilib.pyro.cache import ResultCache
+
+
+class SquareWorker(TaskWorker):
+
+    calls = 0
+
+    def process(self, data):
+        SquareWorker.calls += 1
+        return data * data
+
+
+def result_of(cache, type, data, value):
+    # Look up a task, and store the result that a worker would return
+    task = Task(data=data)
+    if cache.lookup(type, task) is None:
+        task['result'] = value
+        task['processedBy'] = 'worker'
+        cache.store(type, task)
+        return False
+    return True
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_key_types(self):
+        key = ResultCache.key
+        pairs = [({1: 'a'}, {'1': 'a'}),
+                 ((1, 2), [1, 2]),
+                 ({(1, 2): 'a'}, {'[1,2]': 'a'}),
+                 ({True: 1}, {1: 1}),
+                 (1, 1.0),
+                 (1, True),
+                 (None, 'null'),
+                 (['t', 1], ('t', 1)),
+                 ([[1], 2], [1, [2]])]
+        for a, b in pairs:
+            self.assertNotEqual(key(None, a), key(None, b))
+        self.assertNotEqual(key('a', 1), key('b', 1))
+        self.assertNotEqual(key(None, 1), key('None', 1))
+        # The order in which a dict was built does not matter
+        self.assertEqual(key(None, {'a': 1, 'b': (2, {3: 4})}),
+                         key(None, {'b': (2, {3: 4}), 'a': 1}))
+        # Data that JSON cannot encode is pickled
+        self.assertEqual(key(None, set([1])), key(None, set([1])))
+        self.assertNotEqual(key(None, set([1])), key(None, [1]))
+
+    def test_lookup(self):
+        cache = ResultCache()
+        self.assertFalse(result_of(cache, None, {1: 'a'}, 1))
+        self.assertFalse(result_of(cache, None, {'1': 'a'}, 2))
+        self.assertFalse(result_of(cache, 'other', {1: 'a'}, 3))
+        self.assertEqual(len(cache), 3)
+        task = Task(data={1: 'a'})
+        self.assertEqual(cache.lookup(None, task), (None, 1, 'worker'))
+        self.assertNotIn('_cache_key', task)
+        task = Task(data={'1': 'a'})
+        self.assertEqual(cache.lookup(None, task)[1], 2)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['hit_rate'], 0.4)
+
+    def test_store(self):
+        cache = ResultCache()
+        # Only results of tasks that missed the cache are stored
+        cache.store(None, Task(data=1))
+        self.assertEqual(len(cache), 0)
+        task = Task(data=1)
+        cache.lookup(None, task)
+        task['result'] = TaskProcessingError("failed")
+        cache.store(None, task)
+        self.assertEqual(len(cache), 0)
+        self.assertNotIn('_cache_key', task)
+
+    def test_max_entries(self):
+        cache = ResultCache(max_entries=2)
+        result_of(cache, None, 1, 1)
+        result_of(cache, None, 2, 4)
+        # a hit makes 1 the most recently used entry
+        self.assertTrue(result_of(cache, None, 1, 1))
+        result_of(cache, None, 3, 9)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertTrue(result_of(cache, None, 1, 1))
+        self.assertFalse(result_of(cache, None, 2, 4))
+
+    def test_max_bytes(self):
+        cache = ResultCache()
+        result_of(cache, None, 1, 'x' * 100)
+        size = cache.nbytes
+        cache = ResultCache(max_bytes=2 * size)
+        result_of(cache, None, 1, 'x' * 100)
+        result_of(cache, None, 2, 'y' * 100)
+        self.assertEqual(cache.nbytes, 2 * size)
+        result_of(cache, None, 3, 'z' * 100)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.nbytes, 2 * size)
+        self.assertFalse(result_of(cache, None, 1, 'x' * 100))
+        # results larger than the cache are not stored
+        result_of(cache, None, 4, 'w' * (2 * size))
+        self.assertEqual(len(cache), 2)
+
+    def test_save_load(self):
+        filename = os.path.join(self.tmpdir, 'cache.pickle')
+        cache = ResultCache(filename=filename)
+        result_of(cache, None, (1, 2), 'a')
+        result_of(cache, 'other', [1, 2], 'b')
+        cache.save()
+        cache = ResultCache(filename=filename)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.lookup(None, Task(data=(1, 2)))[1], 'a')
+        self.assertEqual(cache.lookup('other', Task(data=[1, 2]))[1], 'b')
+        self.assertIsNone(cache.lookup(None, Task(data=[1, 2])))
+        # entries beyond the limits are evicted on load
+        cache = ResultCache(max_entries=1)
+        cache.load(filename)
+        self.assertEqual(len(cache), 1)
+
+    def test_dispatcher(self):
+        SquareWorker.calls = 0
+        with LocalCluster(SquareWorker, result_cache=True) as cluster:
+            client = cluster.client()
+            results = []
+            for data in (3, 3, 4):
+                client.add_task(Task(data=data))
+                results.append(client.get_result(timeout=10)['result'])
+            client.add_task(Task(data=3, cache=False))
+            results.append(client.get_result(timeout=10)['result'])
+            self.assertEqual(results, [9, 9, 16, 9])
+            self.assertEqual(SquareWorker.calls, 3)
+            stats = client.get_cache_stats()
+            self.assertEqual(stats['hits'], 1)
+            self.assertEqual(stats['entries'], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import time
+
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, Client, LocalDispatcher
+
+
+def answer(dispatcher, type=None):
+    # Act as a worker: return every queued task as a result
+    for task in dispatcher.get_tasks(((type, False, None),)).get(type, []):
+        task['result'] = task['data'] * 2
+        dispatcher.add_result(task, type=type)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = LocalDispatcher()
+
+    def tearDown(self):
+        self.dispatcher.shutdown()
+
+    def test_unbuffered(self):
+        client = Client(dispatcher=self.dispatcher)
+        client.add_task(Task(id=1, data=1))
+        self.assertEqual(self.dispatcher.num_tasks(), 1)
+
+    def test_buffer_size(self):
+        client = Client(dispatcher=self.dispatcher, task_buffer_size=3)
+        client.add_task(Task(id=1, data=1))
+        client.add_task(Task(id=2, data=2), override_type='other')
+        self.assertEqual(self.dispatcher.num_tasks(), 0)
+        self.assertEqual(self.dispatcher.num_tasks('other'), 0)
+        client.add_task(Task(id=3, data=3))
+        self.assertEqual(self.dispatcher.num_tasks(), 2)
+        self.assertEqual(self.dispatcher.num_tasks('other'), 1)
+        # tasks are sent in the order they were added
+        self.assertEqual(
+            [t['id'] for t in self.dispatcher.get_tasks(
+                ((None, False, None),))[None]], [1, 3])
+
+    def test_buffer_timeout(self):
+        client = Client(dispatcher=self.dispatcher, task_buffer_size=100,
+                        task_buffer_timeout=0.05)
+        client.add_task(Task(id=1, data=1))
+        self.assertEqual(self.dispatcher.num_tasks(), 0)
+        time.sleep(0.1)
+        client.add_task(Task(id=2, data=2))
+        self.assertEqual(self.dispatcher.num_tasks(), 2)
+
+    def test_flush(self):
+        client = Client(dispatcher=self.dispatcher, task_buffer_size=100)
+        client.add_task(Task(id=1, data=1))
+        client.add_task(Task(id=2, data=2))
+        self.assertEqual(self.dispatcher.num_tasks(), 0)
+        # any other request of the dispatcher flushes the buffer
+        self.assertEqual(client.num_tasks(), 2)
+        client.add_task(Task(id=3, data=3))
+        client.close()
+        self.assertEqual(self.dispatcher.num_tasks(), 3)
+
+    def test_iter_results(self):
+        client = Client(dispatcher=self.dispatcher, task_buffer_size=10)
+        for i in range(5):
+            client.add_task(Task(id=i, data=i))
+        client.flush_tasks()
+        answer(self.dispatcher)
+        results = list(client.iter_results(num_results=5, timeout=1))
+        self.assertEqual(sorted(r['result'] for r in results),
+                         [0, 2, 4, 6, 8])
+        # iteration stops when no result arrives within the timeout
+        start = time.time()
+        self.assertEqual(list(client.iter_results(timeout=0.1)), [])
+        self.assertLess(time.time() - start, 1)
+
+    def test_iter_results_streaming(self):
+        client = Client(dispatcher=self.dispatcher)
+        results = client.iter_results(num_results=2, timeout=1,
+                                      max_batch_delay=0)
+        client.add_task(Task(id=1, data=1))
+        answer(self.dispatcher)
+        self.assertEqual(next(results)['result'], 2)
+        client.add_task(Task(id=2, data=2))
+        answer(self.dispatcher)
+        self.assertEqual(next(results)['result'], 4)
+        self.assertRaises(StopIteration, next, results)
+
+
+if __name__ == "__main__":
+    unittest.main()
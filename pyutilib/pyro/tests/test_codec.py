@@ -0,0 +1,146 @@
+import sys
+import base64
+
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, TaskWorker, LocalDispatcher, LocalCluster
+from pyutilib.pyro import codec
+from pyutilib.pyro.codec import encode_payload, decode_payload
+
+try:
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+data = {'name': u'task', 'values': list(range(1000)), 'nested': [1.5, None]}
+large = b'abcdefgh' * 10000
+
+
+class EncodingWorker(TaskWorker):
+
+    def process(self, data):
+        # the worker sees the decoded data
+        assert not codec.is_encoded_payload(data)
+        return len(data)
+
+
+class Test(unittest.TestCase):
+
+    def test_codecs(self):
+        self.assertIn('pickle', codec.available_codecs())
+        for name in codec.available_codecs():
+            value = encode_payload(data, name)
+            self.assertTrue(codec.is_encoded_payload(value))
+            self.assertIsNone(value['compression'])
+            self.assertEqual(decode_payload(value), (data, (name, None)))
+
+    def _check_compressor(self, name):
+        value = encode_payload(large, 'pickle', name)
+        self.assertEqual(value['compression'], name)
+        self.assertLess(len(value['data']), len(large) // 10)
+        self.assertEqual(decode_payload(value), (large, ('pickle', name)))
+        # small payloads are not compressed
+        value = encode_payload(b'abc', 'pickle', name)
+        self.assertIsNone(value['compression'])
+        self.assertEqual(decode_payload(value)[0], b'abc')
+        # neither are payloads that do not shrink
+        value = encode_payload(b'abc', 'pickle', name, threshold=0)
+        self.assertIsNone(value['compression'])
+        value = encode_payload(b'abcabcabc' * 10, 'pickle', name,
+                               threshold=10)
+        self.assertEqual(value['compression'], name)
+        self.assertEqual(decode_payload(value)[0], b'abcabcabc' * 10)
+
+    def test_zlib(self):
+        self._check_compressor('zlib')
+
+    @unittest.skipIf(not codec.lz4_available, "lz4 is not available")
+    def test_lz4(self):
+        self._check_compressor('lz4')
+
+    @unittest.skipIf(not codec.msgpack_available,
+                     "msgpack is not available")
+    def test_msgpack(self):
+        value = encode_payload(data, 'msgpack', 'zlib', threshold=0)
+        self.assertEqual(decode_payload(value)[0], data)
+
+    @unittest.skipIf(sys.version_info < (3, 8), "pickle5 requires Python 3.8")
+    def test_pickle5(self):
+        value = encode_payload([large, bytearray(large)], 'pickle5', 'zlib')
+        self.assertEqual(decode_payload(value)[0],
+                         [large, bytearray(large)])
+
+    @unittest.skipIf(sys.version_info < (3, 8) or not numpy_available,
+                     "pickle5 buffers require Python 3.8 and numpy")
+    def test_pickle5_buffers(self):
+        array = numpy.arange(100000, dtype=float)
+        value = encode_payload(array, 'pickle5')
+        decoded = decode_payload(value)[0]
+        self.assertTrue((decoded == array).all())
+        # the decoded array does not share the read-only payload
+        decoded[0] = 1
+        self.assertEqual(decoded[0], 1)
+
+    def test_serpent_bytes(self):
+        value = encode_payload(large, 'pickle', 'zlib')
+        value['data'] = {'encoding': 'base64',
+                         'data': base64.b64encode(value['data'])}
+        self.assertEqual(decode_payload(value)[0], large)
+
+    def test_not_encoded(self):
+        self.assertEqual(decode_payload(data), (data, None))
+        self.assertEqual(decode_payload(None), (None, None))
+
+    def test_unknown(self):
+        value = encode_payload(data, 'pickle')
+        value['__payload__'] = 'unknown'
+        self.assertRaises(ValueError, decode_payload, value)
+        value = encode_payload(large, 'pickle', 'zlib')
+        value['compression'] = 'unknown'
+        self.assertRaises(ValueError, decode_payload, value)
+
+    def test_negotiate(self):
+        self.assertIsNone(codec.negotiate_codec(None))
+        self.assertEqual(codec.negotiate_codec('pickle'), 'pickle')
+        self.assertIsNone(codec.negotiate_codec('unknown'))
+        self.assertEqual(codec.negotiate_codec(['unknown', 'pickle']),
+                         'pickle')
+        self.assertIsNone(codec.negotiate_codec(['pickle'], ['msgpack']))
+        self.assertIsNone(codec.negotiate_codec([None, 'pickle']))
+        self.assertEqual(codec.negotiate_compressor(['lz4', 'zlib'],
+                                                    ['zlib']), 'zlib')
+
+    def test_dispatcher(self):
+        dispatcher = LocalDispatcher()
+        try:
+            self.assertIsNone(dispatcher.worker_codecs())
+            dispatcher.register_worker('a')
+            dispatcher.register_worker_codecs('a', ['pickle', 'msgpack'],
+                                              ['zlib'])
+            dispatcher.register_worker('b')
+            dispatcher.register_worker_codecs('b', ['pickle'],
+                                              ['lz4', 'zlib'])
+            self.assertEqual(dispatcher.worker_codecs(),
+                             (['pickle'], ['zlib']))
+            dispatcher.unregister_worker('a')
+            self.assertEqual(dispatcher.worker_codecs(),
+                             (['pickle'], ['lz4', 'zlib']))
+        finally:
+            dispatcher.shutdown()
+
+    def test_cluster(self):
+        with LocalCluster(EncodingWorker) as cluster:
+            client = cluster.client(codec=['unknown', 'pickle'],
+                                    compression='zlib')
+            client.add_task(Task(id=1, data=large))
+            client.add_task(Task(id=2, data='abc'))
+            results = list(client.iter_results(num_results=2, timeout=10))
+        self.assertEqual(client._codec, 'pickle')
+        self.assertEqual(client._compression, 'zlib')
+        results.sort(key=lambda r: r['id'])
+        self.assertEqual([r['data'] for r in results], [large, 'abc'])
+        self.assertEqual([r['result'] for r in results], [len(large), 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, LocalDispatcher
+from pyutilib.pyro.journal import Journal, replay_journal
+
+
+def ids(items):
+    return sorted(item['id'] for item in items)
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.journal = os.path.join(self.tmpdir, 'dispatcher.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def crash(self, dispatcher):
+        # Return a copy of the journal as it would be found after the
+        # dispatcher crashed (once the last records were synced)
+        dispatcher._journal.sync()
+        filename = os.path.join(self.tmpdir, 'crashed.journal')
+        shutil.copyfile(self.journal, filename)
+        dispatcher.shutdown()
+        return filename
+
+    def test_replay(self):
+        journal = Journal(self.journal)
+        tasks = [Task(id=i) for i in range(5)]
+        journal.tasks_added('a', tasks[:3])
+        journal.tasks_added('b', tasks[3:])
+        journal.tasks_taken('a', tasks[:2])
+        # task 0 is answered, and its result is collected
+        journal.results_added('a', [tasks[0]])
+        journal.results_taken('a', [tasks[0]])
+        # task 3 is answered, but its result is not collected
+        journal.results_added('b', [tasks[3]])
+        journal.close()
+        tasks, results, next_id, handed_out = replay_journal(self.journal)
+        self.assertEqual([(t, task['id']) for t, task in tasks],
+                         [('a', 1), ('a', 2), ('b', 4)])
+        self.assertEqual([(t, r['id']) for t, r in results], [('b', 3)])
+        self.assertEqual(next_id, 5)
+        # task 1 was handed to a worker that never answered
+        self.assertEqual(handed_out, 1)
+
+    def test_cleared(self):
+        journal = Journal(self.journal)
+        journal.tasks_added('a', [Task(id=1), Task(id=2)])
+        journal.tasks_added('b', [Task(id=3)])
+        journal.results_added('b', [Task(id=4)])
+        journal.cleared('tasks', 'a')
+        journal.close()
+        tasks, results = replay_journal(self.journal)[:2]
+        self.assertEqual([task['id'] for t, task in tasks], [3])
+        self.assertEqual([r['id'] for t, r in results], [4])
+        journal = Journal(self.journal, next_id=5)
+        journal.cleared('both')
+        journal.close()
+        self.assertEqual(replay_journal(self.journal)[:2], ([], []))
+
+    def test_truncated(self):
+        journal = Journal(self.journal)
+        journal.tasks_added(None, [Task(id=1)])
+        journal.tasks_added(None, [Task(id=2)])
+        journal.close()
+        size = os.path.getsize(self.journal)
+        # a record cut short by a crash is ignored
+        with open(self.journal, 'r+b') as OUTPUT:
+            OUTPUT.truncate(size - 3)
+        self.assertEqual([task['id'] for t, task in
+                          replay_journal(self.journal)[0]], [1])
+        # as is everything after a corrupt record
+        with open(self.journal, 'r+b') as OUTPUT:
+            OUTPUT.seek(10)
+            OUTPUT.write(b'\xff')
+        self.assertEqual(replay_journal(self.journal)[0], [])
+
+    def test_recovery(self):
+        dispatcher = LocalDispatcher(journal=self.journal)
+        dispatcher.add_tasks({None: [Task(id=i) for i in range(4)],
+                              'b': [Task(id=4)]})
+        dispatcher.add_task(Task(id=5), type='b')
+        taken = dispatcher.get_tasks(((None, False, None, 3),))[None]
+        self.assertEqual(ids(taken), [0, 1, 2])
+        for task in taken[:2]:
+            task['result'] = task['id']
+        dispatcher.add_results({None: taken[:2]})
+        self.assertEqual(dispatcher.get_result(block=False)['id'], 0)
+        # task 2 was lost with the worker that took it
+        filename = self.crash(dispatcher)
+
+        dispatcher = LocalDispatcher(journal=filename)
+        try:
+            tasks = dispatcher.get_tasks(((None, False, None),
+                                          ('b', False, None)))
+            self.assertEqual(ids(tasks[None]), [2, 3])
+            self.assertEqual(ids(tasks['b']), [4, 5])
+            result = dispatcher.get_result(block=False)
+            self.assertEqual(result['id'], 1)
+            self.assertEqual(result['result'], 1)
+            self.assertNotIn('_journal_id', result)
+            self.assertIsNone(dispatcher.get_result(block=False))
+            # new tasks do not reuse the journal ids of recovered ones
+            task = Task(id=6)
+            dispatcher.add_task(task)
+            self.assertNotIn(task['_journal_id'],
+                             [t['_journal_id'] for t in tasks[None]])
+        finally:
+            dispatcher.shutdown()
+
+    def test_compact(self):
+        dispatcher = LocalDispatcher(journal=self.journal)
+        for i in range(100):
+            dispatcher.add_task(Task(id=i, data='x' * 100))
+        for i in range(99):
+            task = dispatcher.get_task(block=False)
+            dispatcher.add_result(task)
+            dispatcher.get_result(block=False)
+        dispatcher.add_task(Task(id=100))
+        filename = self.crash(dispatcher)
+        size = os.path.getsize(filename)
+
+        # recovery compacts the journal to the queued tasks
+        dispatcher = LocalDispatcher(journal=filename)
+        dispatcher.shutdown()
+        self.assertLess(os.path.getsize(filename), size / 20)
+        tasks, results, next_id, handed_out = replay_journal(filename)
+        self.assertEqual([task['id'] for t, task in tasks], [99, 100])
+        self.assertEqual(results, [])
+        self.assertEqual(handed_out, 0)
+        # and the compacted journal can be recovered again
+        dispatcher = LocalDispatcher(journal=filename)
+        try:
+            self.assertEqual(dispatcher.num_tasks(), 2)
+        finally:
+            dispatcher.shutdown()
+
+    def test_shutdown(self):
+        dispatcher = LocalDispatcher(journal=self.journal)
+        dispatcher.add_task(Task(id=1))
+        dispatcher.shutdown()
+        dispatcher = LocalDispatcher(journal=self.journal)
+        try:
+            self.assertEqual(dispatcher.get_task(block=False)['id'], 1)
+        finally:
+            dispatcher.shutdown()
+
+    def test_sync_does_not_block_writers(self):
+        fsync_started = threading.Event()
+        real_fsync = os.fsync
+
+        def slow_fsync(fd):
+            fsync_started.set()
+            time.sleep(0.5)
+            real_fsync(fd)
+
+        journal = Journal(self.journal, sync_interval=60)
+        journal.tasks_added('a', [Task(id=1)])
+        os.fsync = slow_fsync
+        try:
+            syncer = threading.Thread(target=journal.sync)
+            syncer.start()
+            fsync_started.wait()
+            stime = time.time()
+            journal.tasks_added('a', [Task(id=2)])
+            self.assertLess(time.time() - stime, 0.25)
+            syncer.join()
+        finally:
+            os.fsync = real_fsync
+        # Only the record written before the flush is known to be synced
+        self.assertEqual((journal._synced, journal._written), (1, 2))
+        journal.close()
+        self.assertEqual(journal._synced, 2)
+        tasks = replay_journal(self.journal)[0]
+        self.assertEqual([task['id'] for t, task in tasks], [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
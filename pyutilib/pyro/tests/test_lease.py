@@ -0,0 +1,178 @@
+import time
+
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, TaskWorker, LocalDispatcher, LocalCluster
+from pyutilib.pyro.lease import LeaseTable
+
+
+class SlowWorker(TaskWorker):
+
+    calls = 0
+
+    def process(self, data):
+        SlowWorker.calls += 1
+        time.sleep(data)
+        return data
+
+
+def task_ids(pairs):
+    return [task['id'] for type, task in pairs]
+
+
+class TestLeaseTable(unittest.TestCase):
+
+    def test_expire(self):
+        leases = LeaseTable(10)
+        tasks = [Task(id=i) for i in range(3)]
+        leases.grant('a', tasks)
+        now = time.time()
+        self.assertEqual(len(leases), 3)
+        self.assertEqual(leases.expire(now + 5), ([], []))
+        leases.release([tasks[1]['_lease_id']])
+        retry, failed = leases.expire(now + 10.5)
+        self.assertEqual(sorted(task_ids(retry)), [0, 2])
+        self.assertEqual(failed, [])
+        self.assertEqual(tasks[2]['attempts'], 1)
+        self.assertNotIn('_lease_id', tasks[2])
+        self.assertEqual(len(leases), 0)
+
+    def test_renew(self):
+        leases = LeaseTable(0.2)
+        task = Task(id=1)
+        leases.grant(None, [task])
+        time.sleep(0.1)
+        leases.renew([task['_lease_id']])
+        now = time.time()
+        self.assertEqual(leases.expire(now + 0.05), ([], []))
+        self.assertEqual(task_ids(leases.expire(now + 0.25)[0]), [1])
+
+    def test_acknowledge(self):
+        leases = LeaseTable(10)
+        task = Task(id=1)
+        leases.grant(None, [task])
+        leases.acknowledge([task, Task(id=2)])
+        self.assertEqual(len(leases), 0)
+        self.assertNotIn('_lease_id', task)
+        self.assertEqual(leases.expire(time.time() + 20), ([], []))
+
+    def test_max_attempts(self):
+        leases = LeaseTable(10, max_attempts=2)
+        task = Task(id=1)
+        leases.grant(None, [task])
+        self.assertEqual(task_ids(leases.expire(time.time() + 10.5)[0]), [1])
+        leases.grant(None, [task])
+        retry, failed = leases.expire(time.time() + 10.5)
+        self.assertEqual(retry, [])
+        self.assertEqual(failed, [(None, task)])
+        self.assertEqual(task['attempts'], 2)
+
+    def test_backoff(self):
+        leases = LeaseTable(10, backoff=1)
+        task = Task(id=1)
+        leases.grant(None, [task])
+        now = time.time() + 10.5
+        # retried 1 second after the first expiry
+        self.assertEqual(leases.expire(now), ([], []))
+        self.assertEqual(leases.expire(now + 0.5), ([], []))
+        self.assertEqual(task_ids(leases.expire(now + 1)[0]), [1])
+        # and 2 seconds after the second
+        leases.grant(None, [task])
+        now = time.time() + 10.5
+        self.assertEqual(leases.expire(now), ([], []))
+        self.assertEqual(leases.expire(now + 1.5), ([], []))
+        self.assertEqual(task_ids(leases.expire(now + 2)[0]), [1])
+
+    def test_forget(self):
+        leases = LeaseTable(10, backoff=1)
+        leases.grant('a', [Task(id=1)])
+        leases.grant('b', [Task(id=2)])
+        leases.grant('a', [Task(id=3)])
+        now = time.time()
+        leases.expire(now + 10.5)
+        leases.grant('a', [Task(id=4)])
+        leases.grant('b', [Task(id=5)])
+        leases.forget('a')
+        self.assertEqual(len(leases), 1)
+        self.assertEqual(task_ids(leases.expire(now + 100)[0]), [2])
+        self.assertEqual(task_ids(leases.expire(now + 200)[0]), [5])
+        leases.grant('b', [Task(id=6)])
+        leases.forget(all_types=True)
+        self.assertEqual(leases.expire(now + 1000), ([], []))
+
+
+class TestDispatcher(unittest.TestCase):
+
+    def test_no_leases(self):
+        dispatcher = LocalDispatcher()
+        dispatcher.add_task(Task(id=1))
+        self.assertIsNone(dispatcher.get_lease_timeout())
+        self.assertNotIn('_lease_id', dispatcher.get_task(block=False))
+        dispatcher.shutdown()
+
+    def test_requeue(self):
+        dispatcher = LocalDispatcher(lease_timeout=0.1, max_attempts=2)
+        try:
+            self.assertEqual(dispatcher.get_lease_timeout(), 0.1)
+            dispatcher.add_task(Task(id=1))
+            task = dispatcher.get_task(block=False)
+            self.assertIn('_lease_id', task)
+            # the worker disappears: the task is queued again
+            task = dispatcher.get_task(timeout=5)
+            self.assertEqual(task['id'], 1)
+            self.assertEqual(task['attempts'], 1)
+            # and, once it has used up its attempts, dead-lettered
+            self.assertIsNone(dispatcher.get_task(timeout=0.5))
+            task = dispatcher.get_result(type='dead_letter', timeout=5)
+            self.assertEqual(task['id'], 1)
+            self.assertEqual(task['attempts'], 2)
+        finally:
+            dispatcher.shutdown()
+
+    def test_acknowledged(self):
+        dispatcher = LocalDispatcher(lease_timeout=0.1)
+        try:
+            dispatcher.add_tasks({None: [Task(id=1), Task(id=2),
+                                         Task(id=3, generateResponse=False)]})
+            tasks = dispatcher.get_tasks(((None, False, None),))[None]
+            # a result, a task returned to its queue, and a released
+            # lease each acknowledge a task
+            dispatcher.add_result(tasks[0])
+            dispatcher.add_task(tasks[1])
+            dispatcher.release_leases([tasks[2]['_lease_id']])
+            task = dispatcher.get_task(block=False)
+            self.assertEqual(task['id'], 2)
+            dispatcher.add_result(task)
+            time.sleep(0.5)
+            self.assertEqual(dispatcher.num_tasks(), 0)
+            self.assertEqual(dispatcher.num_results(), 2)
+            self.assertEqual(dispatcher.num_results('dead_letter'), 0)
+        finally:
+            dispatcher.shutdown()
+
+    def test_renew(self):
+        dispatcher = LocalDispatcher(lease_timeout=0.2)
+        try:
+            dispatcher.add_task(Task(id=1))
+            task = dispatcher.get_task(block=False)
+            for i in range(5):
+                time.sleep(0.1)
+                dispatcher.renew_leases([task['_lease_id']])
+            self.assertEqual(dispatcher.num_tasks(), 0)
+            self.assertIsNotNone(dispatcher.get_task(timeout=5))
+        finally:
+            dispatcher.shutdown()
+
+    def test_heartbeat(self):
+        # the workers renew the leases on the tasks they are processing
+        SlowWorker.calls = 0
+        with LocalCluster(SlowWorker, num_workers=2, lease_timeout=0.2,
+                          max_attempts=1) as cluster:
+            client = cluster.client()
+            client.add_task(Task(id=1, data=0.8))
+            self.assertEqual(client.get_result(timeout=10)['result'], 0.8)
+            self.assertEqual(client.num_results('dead_letter'), 0)
+        self.assertEqual(SlowWorker.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import time
+import threading
+
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, TaskWorker, LocalDispatcher, LocalCluster
+from pyutilib.pyro.local import DispatcherClosed
+
+
+class PidWorker(TaskWorker):
+
+    def process(self, data):
+        time.sleep(0.01)
+        return (os.getpid(), data * data)
+
+
+class Test(unittest.TestCase):
+
+    def test_shutdown(self):
+        dispatcher = LocalDispatcher()
+        self.assertFalse(dispatcher._requires_pyro)
+        dispatcher.add_task(Task(id=1))
+        dispatcher.shutdown()
+        dispatcher.shutdown()
+        self.assertRaises(DispatcherClosed, dispatcher.get_task)
+        self.assertRaises(DispatcherClosed, dispatcher.get_tasks,
+                          ((None, False, None),))
+        self.assertRaises(DispatcherClosed, dispatcher.wait_any, [None])
+
+    def test_shutdown_wakes_workers(self):
+        dispatcher = LocalDispatcher()
+        errors = []
+
+        def get_task():
+            try:
+                dispatcher.get_task(timeout=None)
+            except DispatcherClosed:
+                errors.append(True)
+
+        thread = threading.Thread(target=get_task)
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.1)
+        dispatcher.shutdown()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(errors, [True])
+
+    def test_blocking(self):
+        dispatcher = LocalDispatcher()
+        try:
+            start = time.time()
+            self.assertIsNone(dispatcher.get_task(timeout=0.3))
+            self.assertGreaterEqual(time.time() - start, 0.3)
+            timer = threading.Timer(0.2, dispatcher.add_task, (Task(id=1),))
+            timer.start()
+            self.assertEqual(dispatcher.get_task(timeout=None)['id'], 1)
+        finally:
+            dispatcher.shutdown()
+
+    def test_threads(self):
+        cluster = LocalCluster(PidWorker, num_workers=3,
+                               worker_kwds={'type': 'q'})
+        with cluster:
+            client = cluster.client(type='q')
+            tasks = [Task(id=i, data=i) for i in range(30)]
+            client.add_tasks({'q': tasks})
+            results = list(client.iter_results(num_results=30, timeout=10))
+            # task data is handed over without being copied
+            self.assertTrue(all(any(r is t for t in tasks)
+                                for r in results))
+        self.assertEqual(sorted(r['result'][1] for r in results),
+                         [i * i for i in range(30)])
+        self.assertEqual(set(r['result'][0] for r in results),
+                         set([os.getpid()]))
+        self.assertTrue(set(r['processedBy'] for r in results).issubset(
+            set(['LocalWorker_0', 'LocalWorker_1', 'LocalWorker_2'])))
+        self.assertEqual(cluster._workers, [])
+        self.assertRaises(DispatcherClosed, cluster.dispatcher.get_task)
+
+    def test_processes(self):
+        with LocalCluster(PidWorker, num_workers=2,
+                          processes=True) as cluster:
+            client = cluster.client()
+            client.add_tasks({None: [Task(id=i, data=i)
+                                     for i in range(20)]})
+            results = list(client.iter_results(num_results=20, timeout=30))
+            workers = list(cluster._workers)
+        self.assertEqual(sorted(r['result'][1] for r in results),
+                         [i * i for i in range(20)])
+        self.assertNotIn(os.getpid(), set(r['result'][0] for r in results))
+        for worker in workers:
+            self.assertFalse(worker.is_alive())
+
+    def test_dispatcher_options(self):
+        with LocalCluster(PidWorker, priority_queues=True,
+                          metrics=True) as cluster:
+            client = cluster.client()
+            client.add_task(Task(id=1, data=2, priority=1))
+            self.assertEqual(client.get_result(timeout=10)['result'][1], 4)
+            self.assertEqual(
+                client.get_metrics()['queues']['None']['tasks_added'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, TaskWorker, LocalDispatcher, LocalCluster
+from pyutilib.pyro.metrics import Histogram
+
+
+class EchoWorker(TaskWorker):
+
+    def process(self, data):
+        return data
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_histogram(self):
+        h = Histogram(base=1.0, nbuckets=4)
+        self.assertIsNone(h.quantile(0.5))
+        for value in (0.5, 1.0, 1.5, 3.0, 100.0):
+            h.add(value)
+        # [0, 1), [1, 2), [2, 4), and everything from 4
+        self.assertEqual(h.buckets, [1, 2, 1, 1])
+        self.assertEqual(h.quantile(0.2), 1.0)
+        self.assertEqual(h.quantile(0.6), 2.0)
+        self.assertEqual(h.quantile(1.0), 100.0)
+        summary = h.summary()
+        self.assertEqual(summary['count'], 5)
+        self.assertEqual(summary['min'], 0.5)
+        self.assertEqual(summary['max'], 100.0)
+        self.assertAlmostEqual(summary['mean'], 106.0 / 5)
+
+    def test_disabled(self):
+        dispatcher = LocalDispatcher()
+        dispatcher.add_task(Task(id=1))
+        self.assertIsNone(dispatcher.get_metrics())
+        self.assertNotIn('_dispatcher_times', dispatcher.get_task())
+        dispatcher.shutdown()
+
+    def test_counters(self):
+        dispatcher = LocalDispatcher(metrics=True)
+        dispatcher.add_task(Task(id=1), type='a')
+        dispatcher.add_tasks({'a': [Task(id=2), Task(id=3)],
+                              'b': [Task(id=4, deadline=time.time() - 1)]})
+        self.assertIsNone(dispatcher.get_task(type='b', block=False))
+        tasks = dispatcher.get_tasks((('a', False, None, 2),))['a']
+        for task in tasks:
+            task['processedBy'] = 'w'
+        dispatcher.add_results({'a': tasks})
+        self.assertEqual(len(dispatcher.get_results((('a', False, None),))
+                             ['a']), 2)
+        metrics = dispatcher.get_metrics()
+        a = metrics['queues']['a']
+        self.assertEqual(a['tasks_added'], 3)
+        self.assertEqual(a['tasks_taken'], 2)
+        self.assertEqual(a['results_added'], 2)
+        self.assertEqual(a['results_taken'], 2)
+        self.assertEqual(a['max_task_depth'], 3)
+        self.assertEqual(a['task_depth'], 1)
+        self.assertEqual(a['wait_time']['count'], 2)
+        self.assertEqual(a['service_time']['count'], 2)
+        self.assertEqual(a['total_time']['count'], 2)
+        b = metrics['queues']['b']
+        self.assertEqual(b['tasks_expired'], 1)
+        self.assertEqual(b['tasks_taken'], 0)
+        self.assertEqual(dispatcher.num_results('dead_letter'), 1)
+        self.assertEqual(metrics['workers']['w']['results'], 2)
+        # the times stored with the tasks do not reach the client
+        for result in tasks:
+            self.assertNotIn('_dispatcher_times', result)
+        json.dumps(metrics)
+        dispatcher.reset_metrics()
+        self.assertEqual(dispatcher.get_metrics()['queues'], {})
+        dispatcher.shutdown()
+
+    def test_blocked_requests(self):
+        dispatcher = LocalDispatcher(metrics=True)
+        self.assertIsNone(dispatcher.get_task(timeout=0.05))
+        metrics = dispatcher.get_metrics()
+        self.assertEqual(metrics['blocked_requests'], 1)
+        self.assertEqual(metrics['blocked_now'], 0)
+        dispatcher.shutdown()
+
+    def test_cluster(self):
+        with LocalCluster(EchoWorker, num_workers=2, metrics=True) as cluster:
+            client = cluster.client()
+            client.add_tasks({None: [Task(id=i, data=i)
+                                     for i in range(10)]})
+            results = list(client.iter_results(num_results=10, timeout=10))
+            self.assertEqual(len(results), 10)
+            metrics = client.get_metrics()
+        self.assertEqual(metrics['queues']['None']['tasks_added'], 10)
+        self.assertEqual(metrics['queues']['None']['results_taken'], 10)
+        self.assertEqual(
+            sum(w['results'] for w in metrics['workers'].values()), 10)
+        self.assertTrue(set(metrics['workers']).issubset(
+            set(['LocalWorker_0', 'LocalWorker_1'])))
+
+    def test_metrics_file(self):
+        filename = os.path.join(self.tmpdir, 'metrics.jsonl')
+        dispatcher = LocalDispatcher(metrics_file=filename,
+                                     metrics_interval=0.05)
+        dispatcher.add_task(Task(id=1))
+        time.sleep(0.2)
+        dispatcher.shutdown()
+        with open(filename) as INPUT:
+            lines = [json.loads(line) for line in INPUT]
+        # one snapshot per interval, and one when the dispatcher stops
+        self.assertGreater(len(lines), 1)
+        self.assertEqual(lines[-1]['queues']['None']['tasks_added'], 1)
+        self.assertEqual(lines[-1]['queues']['None']['task_depth'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
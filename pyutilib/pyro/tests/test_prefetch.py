@@ -0,0 +1,139 @@
+import time
+import threading
+
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, PrefetchTaskWorker, LocalDispatcher, \
+    LocalCluster
+
+
+class SlowWorker(PrefetchTaskWorker):
+
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def process(self, data):
+        with SlowWorker.lock:
+            SlowWorker.running += 1
+            SlowWorker.max_running = max(SlowWorker.max_running,
+                                         SlowWorker.running)
+        time.sleep(0.02)
+        with SlowWorker.lock:
+            SlowWorker.running -= 1
+        if data == 'redirect':
+            self._worker_task_return_queue = 'other'
+        return data
+
+
+class CommandWorker(PrefetchTaskWorker):
+
+    def process(self, data):
+        if data == 'stop':
+            self._worker_shutdown = True
+        elif data == 'error':
+            self._worker_error = True
+        return data
+
+
+class SquareWorker(PrefetchTaskWorker):
+
+    def process(self, data):
+        return data * data
+
+
+class Test(unittest.TestCase):
+
+    def test_options(self):
+        dispatcher = LocalDispatcher()
+        try:
+            self.assertRaises(ValueError, PrefetchTaskWorker,
+                              dispatcher=dispatcher, pool_type='fork')
+            self.assertRaises(ValueError, PrefetchTaskWorker,
+                              dispatcher=dispatcher, pool_size=0)
+            self.assertRaises(ValueError, PrefetchTaskWorker,
+                              dispatcher=dispatcher, prefetch=0)
+            worker = PrefetchTaskWorker(dispatcher=dispatcher, pool_size=3)
+            self.assertEqual(worker._prefetch, 6)
+        finally:
+            dispatcher.shutdown()
+
+    def test_thread_pool(self):
+        SlowWorker.max_running = 0
+        with LocalCluster(SlowWorker,
+                          worker_kwds={'pool_size': 4}) as cluster:
+            client = cluster.client()
+            client.add_tasks({None: [Task(id=i, data=i)
+                                     for i in range(20)]})
+            results = list(client.iter_results(num_results=20, timeout=10))
+            self.assertEqual(sorted(r['result'] for r in results),
+                             list(range(20)))
+            self.assertEqual(set(r['processedBy'] for r in results),
+                             set(['LocalWorker_0']))
+        self.assertGreater(SlowWorker.max_running, 1)
+        self.assertLessEqual(SlowWorker.max_running, 4)
+
+    def test_return_queue(self):
+        # the return queue set by process() applies to its own task
+        with LocalCluster(SlowWorker,
+                          worker_kwds={'pool_size': 2}) as cluster:
+            client = cluster.client()
+            client.add_tasks({None: [Task(id=1, data='redirect'),
+                                     Task(id=2, data='a'),
+                                     Task(id=3, data='b')]})
+            results = list(client.iter_results(num_results=2, timeout=10))
+            self.assertEqual(sorted(r['id'] for r in results), [2, 3])
+            result = client.get_result(override_type='other', timeout=10)
+            self.assertEqual(result['id'], 1)
+
+    def test_process_pool(self):
+        with LocalCluster(SquareWorker,
+                          worker_kwds={'pool_size': 2,
+                                       'pool_type': 'process'}) as cluster:
+            client = cluster.client()
+            client.add_tasks({None: [Task(id=i, data=i)
+                                     for i in range(10)]})
+            results = list(client.iter_results(num_results=10, timeout=30))
+            self.assertEqual(sorted(r['result'] for r in results),
+                             [i * i for i in range(10)])
+
+    def _run(self, data):
+        dispatcher = LocalDispatcher()
+        dispatcher.add_tasks({None: [Task(id=i, data=d)
+                                     for i, d in enumerate(data)]})
+        worker = CommandWorker(dispatcher=dispatcher, prefetch=len(data))
+        thread = threading.Thread(target=worker.run)
+        thread.daemon = True
+        thread.start()
+        return dispatcher, thread
+
+    def test_shutdown(self):
+        # prefetched tasks are returned to the dispatcher
+        dispatcher, thread = self._run(['stop', 'a', 'b', 'c'])
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(dispatcher.num_results(), 0)
+        tasks = dispatcher.get_tasks(((None, False, None),))[None]
+        self.assertEqual(sorted(t['data'] for t in tasks), ['a', 'b', 'c'])
+        dispatcher.shutdown()
+
+    def test_error(self):
+        dispatcher, thread = self._run(['error', 'a', 'b'])
+        try:
+            result = dispatcher.get_result(timeout=10)
+            self.assertEqual(result['data'], 'error')
+            # the remaining tasks are returned to the dispatcher (and may
+            # then be processed again)
+            results = dispatcher.get_results(((None, True, 10),))[None]
+            while len(results) < 2:
+                results.extend(dispatcher.get_results(
+                    ((None, True, 10),))[None])
+            self.assertEqual(sorted(r['data'] for r in results), ['a', 'b'])
+            dispatcher.add_task(Task(id=3, data='stop'))
+            thread.join(10)
+            self.assertFalse(thread.is_alive())
+        finally:
+            dispatcher.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
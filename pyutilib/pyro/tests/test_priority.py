@@ -0,0 +1,101 @@
+import time
+
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, LocalDispatcher
+
+
+def task_ids(dispatcher, type=None):
+    ids = []
+    while True:
+        task = dispatcher.get_task(type=type, block=False)
+        if task is None:
+            return ids
+        ids.append(task['id'])
+
+
+class Test(unittest.TestCase):
+
+    def tearDown(self):
+        self.dispatcher.shutdown()
+
+    def test_fifo(self):
+        self.dispatcher = LocalDispatcher()
+        for i, priority in enumerate([1, 5, None, 3]):
+            self.dispatcher.add_task(Task(id=i, priority=priority))
+        self.assertEqual(task_ids(self.dispatcher), [0, 1, 2, 3])
+
+    def test_priority(self):
+        self.dispatcher = LocalDispatcher(priority_queues=True)
+        now = time.time()
+        self.dispatcher.add_task(Task(id=0, priority=1))
+        self.dispatcher.add_task(Task(id=1, priority=5))
+        self.dispatcher.add_task(Task(id=2))
+        self.dispatcher.add_task(Task(id=3, priority=5,
+                                      deadline=now + 100))
+        self.dispatcher.add_tasks({None: [Task(id=4, priority=5,
+                                               deadline=now + 50),
+                                          Task(id=5, priority=-1)],
+                                   'other': [Task(id=6, priority=9)]})
+        # ties are broken by the earliest deadline, and then by the
+        # order in which the tasks were added
+        self.assertEqual(task_ids(self.dispatcher), [4, 3, 1, 0, 2, 5])
+        self.assertEqual(task_ids(self.dispatcher, 'other'), [6])
+
+    def test_priority_bulk(self):
+        self.dispatcher = LocalDispatcher(priority_queues=True)
+        for i in range(5):
+            self.dispatcher.add_task(Task(id=i, priority=i))
+        tasks = self.dispatcher.get_tasks(((None, False, None, 3),))[None]
+        self.assertEqual([t['id'] for t in tasks], [4, 3, 2])
+
+    def test_deadline(self):
+        self.dispatcher = LocalDispatcher()
+        self.dispatcher.add_task(Task(id=1, data='a',
+                                      deadline=time.time() - 1))
+        self.dispatcher.add_task(Task(id=2, deadline=time.time() + 100))
+        self.assertEqual(task_ids(self.dispatcher), [2])
+        expired = self.dispatcher.get_result(type='dead_letter', block=False)
+        self.assertEqual(expired['id'], 1)
+        self.assertEqual(expired['data'], 'a')
+        self.assertIsNone(expired['type'])
+        self.assertIsNone(expired['result'])
+
+    def test_ttl(self):
+        self.dispatcher = LocalDispatcher(dead_letter_type='expired')
+        self.dispatcher.add_task(Task(id=1, ttl=0.05), type='a')
+        self.dispatcher.add_task(Task(id=2, ttl=100), type='a')
+        self.dispatcher.add_tasks({'a': [Task(id=3, ttl=0.05)]})
+        time.sleep(0.1)
+        self.assertEqual(task_ids(self.dispatcher, 'a'), [2])
+        expired = self.dispatcher.get_results((('expired', False, None),))
+        self.assertEqual(sorted(t['id'] for t in expired['expired']),
+                         [1, 3])
+        self.assertEqual(set(t['type'] for t in expired['expired']),
+                         set(['a']))
+        self.assertEqual(self.dispatcher.num_results('dead_letter'), 0)
+
+    def test_ttl_deadline(self):
+        # the earlier of the deadline and the time-to-live applies
+        self.dispatcher = LocalDispatcher()
+        deadline = time.time() + 100
+        task = Task(id=1, ttl=10, deadline=deadline)
+        self.dispatcher.add_task(task)
+        task = self.dispatcher.get_task(block=False)
+        self.assertLess(task['deadline'], deadline - 80)
+        self.assertIsNone(task['ttl'])
+        task = Task(id=2, ttl=1000, deadline=deadline)
+        self.dispatcher.add_task(task)
+        self.assertEqual(
+            self.dispatcher.get_task(block=False)['deadline'], deadline)
+
+    def test_blocking_get_skips_expired(self):
+        self.dispatcher = LocalDispatcher()
+        self.dispatcher.add_task(Task(id=1, deadline=time.time() - 1))
+        start = time.time()
+        self.assertIsNone(self.dispatcher.get_task(timeout=0.2))
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(self.dispatcher.num_results('dead_letter'), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, HashRing, ShardedClient, LocalDispatcher
+
+
+def answer(dispatcher, type=None):
+    # Act as a worker: return every queued task as a result
+    for task in dispatcher.get_tasks(((type, False, None),)).get(type, []):
+        task['result'] = task['id']
+        dispatcher.add_result(task, type=type)
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_empty(self):
+        ring = HashRing()
+        self.assertEqual(len(ring), 0)
+        self.assertRaises(KeyError, ring.get_node, 'a')
+
+    def test_nodes(self):
+        ring = HashRing(['a', 'b', 'c'])
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(ring.nodes(), ['a', 'b', 'c'])
+        owners = [ring.get_node(key) for key in range(3000)]
+        # the keys are spread over every node
+        for node in 'abc':
+            self.assertGreater(owners.count(node), 500)
+        # and the routing does not depend on the order of the nodes
+        ring = HashRing(['c', 'a', 'b'])
+        self.assertEqual(owners, [ring.get_node(key) for key in range(3000)])
+
+    def test_consistency(self):
+        ring = HashRing(['a', 'b', 'c'])
+        before = [ring.get_node(key) for key in range(3000)]
+        ring.add('d')
+        after = [ring.get_node(key) for key in range(3000)]
+        # only keys that move to the new node change owner
+        moved = [i for i in range(3000) if before[i] != after[i]]
+        self.assertGreater(len(moved), 0)
+        self.assertEqual(set(after[i] for i in moved), set(['d']))
+        ring.remove('d')
+        self.assertEqual(ring.nodes(), ['a', 'b', 'c'])
+        self.assertEqual([ring.get_node(key) for key in range(3000)], before)
+
+
+class TestShardedClient(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatchers = dict((name, LocalDispatcher())
+                                for name in ('d0', 'd1', 'd2'))
+
+    def tearDown(self):
+        for dispatcher in self.dispatchers.values():
+            dispatcher.shutdown()
+
+    def client(self, **kwds):
+        return ShardedClient(dispatchers=sorted(self.dispatchers.items()),
+                             **kwds)
+
+    def test_options(self):
+        self.assertRaises(ValueError, self.client, shard_by='name')
+        client = self.client(shard_by='id')
+        self.assertRaises(ValueError, client.add_task, Task())
+
+    def test_shard_by_type(self):
+        client = self.client()
+        types = ['type %d' % i for i in range(20)]
+        for i, type in enumerate(types):
+            client.add_task(Task(id=i), override_type=type)
+            client.add_tasks({type: [Task(id=100 + i)]})
+        for type in types:
+            # workers find the owner of their queue with the same ring
+            owner = HashRing(sorted(self.dispatchers)).get_node(type)
+            self.assertEqual(client.shard_for(type), owner)
+            for name, dispatcher in self.dispatchers.items():
+                self.assertEqual(dispatcher.num_tasks(type),
+                                 2 if name == owner else 0)
+            self.assertEqual(client.num_tasks(type), 2)
+            answer(self.dispatchers[owner], type)
+            results = client.get_results(override_type=type, timeout=1)
+            self.assertEqual(sorted(r['result'] for r in results),
+                             [types.index(type), 100 + types.index(type)])
+        self.assertGreater(len(set(client.shard_for(type)
+                                   for type in types)), 1)
+
+    def test_shard_by_id(self):
+        client = self.client(shard_by='id', id_block_size=10)
+        client.add_tasks({None: [Task(id=i) for i in range(200)]})
+        counts = [d.num_tasks() for d in self.dispatchers.values()]
+        self.assertEqual(sum(counts), 200)
+        self.assertGreater(min(counts), 0)
+        # blocks of consecutive ids go to the same dispatcher
+        for i in range(200):
+            self.assertEqual(client.shard_for(None, i),
+                             client.shard_for(None, i - i % 10))
+        self.assertEqual(client.num_tasks(), 200)
+        for dispatcher in self.dispatchers.values():
+            answer(dispatcher)
+        results = list(client.iter_results(num_results=200, timeout=1))
+        self.assertEqual(sorted(r['result'] for r in results),
+                         list(range(200)))
+        self.assertIsNone(client.get_result(block=False))
+
+    def test_get_result(self):
+        client = self.client(shard_by='id')
+        client.add_task(Task(id=7))
+        self.assertIsNone(client.get_result(timeout=0.1))
+        answer(self.dispatchers[client.shard_for(None, 7)])
+        self.assertEqual(client.get_result(timeout=1)['result'], 7)
+        self.assertEqual(client.queues_with_results(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import time
+import threading
+
+import pyutilib.th as unittest
+from pyutilib.pyro import Task, Client, MultiTaskWorker, LocalDispatcher, \
+    LocalCluster
+from pyutilib.pyro.local import DispatcherClosed
+
+
+class TwoQueueWorker(MultiTaskWorker):
+
+    def __init__(self, *args, **kwds):
+        MultiTaskWorker.__init__(self, 'a', True, 5, *args, **kwds)
+        self.push_request_type('b', True, 5)
+
+    def process(self, data):
+        return data
+
+
+def later(delay, function, *args, **kwds):
+    timer = threading.Timer(delay, function, args, kwds)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = LocalDispatcher()
+
+    def tearDown(self):
+        self.dispatcher.shutdown()
+
+    def test_ready(self):
+        self.dispatcher.add_result(Task(id=1), type='a')
+        self.dispatcher.add_result(Task(id=2), type='c')
+        self.assertEqual(self.dispatcher.wait_any(['a', 'b', 'c']),
+                         ['a', 'c'])
+        self.assertEqual(self.dispatcher.wait_any(['a'], timeout=0,
+                                                  results=False), [])
+
+    def test_timeout(self):
+        start = time.time()
+        self.assertEqual(self.dispatcher.wait_any(['a', 'b'], timeout=0.2),
+                         [])
+        self.assertGreaterEqual(time.time() - start, 0.2)
+        # waiting does not create the queues
+        self.assertEqual(self.dispatcher.queues_with_results(), [])
+        self.assertNotIn('a', self.dispatcher._result_queue)
+
+    def test_wake(self):
+        later(0.1, self.dispatcher.add_result, Task(id=1), type='b')
+        start = time.time()
+        self.assertEqual(self.dispatcher.wait_any(['a', 'b'], timeout=10),
+                         ['b'])
+        self.assertLess(time.time() - start, 5)
+        later(0.1, self.dispatcher.add_tasks, {'a': [Task(id=2)]})
+        self.assertEqual(self.dispatcher.wait_any(['a', 'b'], timeout=None,
+                                                  results=False), ['a'])
+
+    def test_closed(self):
+        later(0.1, self.dispatcher.shutdown)
+        self.assertRaises(DispatcherClosed, self.dispatcher.wait_any, ['a'],
+                          None)
+
+    def test_client(self):
+        client = Client(dispatcher=self.dispatcher, type='a',
+                        task_buffer_size=10)
+        self.assertEqual(client.wait_any(timeout=0.1), [])
+        client.add_task(Task(id=1))
+        # the buffered task is sent before waiting
+        self.assertEqual(client.wait_any(timeout=0.05), [])
+        task = self.dispatcher.get_task(type='a', block=False)
+        self.assertEqual(task['id'], 1)
+        later(0.1, self.dispatcher.add_result, task, type='a')
+        self.assertEqual(client.wait_any(timeout=10), ['a'])
+        self.assertEqual(client.wait_any(['b', 'a'], timeout=10), ['a'])
+
+    def test_multitask_worker(self):
+        # a worker that serves several queues picks up a task as soon as
+        # it is added to any of them, rather than blocking on each queue
+        # in turn
+        with LocalCluster(TwoQueueWorker) as cluster:
+            client = cluster.client()
+            time.sleep(0.2)
+            for type in ('b', 'a', 'b'):
+                start = time.time()
+                client.add_task(Task(id=1, data=type), override_type=type)
+                result = client.get_result(override_type=type, timeout=10)
+                self.assertEqual(result['result'], type)
+                self.assertLess(time.time() - start, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
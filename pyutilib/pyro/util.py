@@ -55,6 +55,34 @@ elif using_pyro4:
     _connection_problem = _pyro.errors.TimeoutError
 
 
+#
+# A dispatcher may also be used directly (e.g., a LocalDispatcher) or
+# through another kind of proxy, which does not need to be released
+#
+def _is_pyro_proxy(obj):
+    if using_pyro3:
+        return isinstance(obj, _pyro.core.DynamicProxy)
+    elif using_pyro4:
+        return isinstance(obj, _pyro.Proxy)
+    return False
+
+
+def _proxy_uri(obj):
+    if not _is_pyro_proxy(obj):
+        return None
+    if using_pyro3:
+        return obj.URI
+    return obj._pyroUri
+
+
+def _release_proxy(obj):
+    if _is_pyro_proxy(obj):
+        if using_pyro3:
+            obj._release()
+        else:
+            obj._pyroRelease()
+
+
 def get_nameserver(host=None, port=None, num_retries=30, caller_name="Unknown"):
 
     if _pyro is None:
@@ -131,17 +159,18 @@ def get_dispatchers(group=":PyUtilibServer",
         raise RuntimeError("Failed to locate Pyro name "
                            "server on the network!")
 
+    prefix = group + ".dispatcher."
     cumulative_sleep_time = 0.0
     dispatchers = []
     for i in xrange(0, num_dispatcher_tries):
         ns_entries = None
         if using_pyro3:
             for (name, uri) in ns.flatlist():
-                if name.startswith(":PyUtilibServer.dispatcher."):
+                if name.startswith(prefix):
                     if (name, uri) not in dispatchers:
                         dispatchers.append((name, uri))
         elif using_pyro4:
-            for name in ns.list(prefix=":PyUtilibServer.dispatcher."):
+            for name in ns.list(prefix=prefix):
                 uri = ns.lookup(name)
                 if (name, uri) not in dispatchers:
                     dispatchers.append((name, uri))
@@ -7,7 +7,8 @@
 #  the U.S. Government retains certain rights in this software.
 #  _________________________________________________________________________
 
-__all__ = ['TaskWorker', 'MultiTaskWorker', 'TaskWorkerServer']
+__all__ = ['TaskWorker', 'PrefetchTaskWorker', 'MultiTaskWorker',
+           'TaskWorkerServer']
 
 import sys
 import os
@@ -15,20 +16,33 @@ import socket
 import time
 import itertools
 import random
+import threading
+import multiprocessing
+import multiprocessing.pool
+from collections import deque
 
 from pyutilib.pyro.util import get_nameserver, using_pyro3, using_pyro4
 from pyutilib.pyro.util import Pyro as _pyro
 from pyutilib.pyro.util import get_dispatchers, _connection_problem
+from pyutilib.pyro.util import _is_pyro_proxy, _release_proxy
+from pyutilib.pyro.codec import (available_codecs, available_compressors,
+                                 encode_payload, decode_payload)
+from pyutilib.pyro.shard import HashRing
 
 from six import advance_iterator, iteritems, itervalues
 from six.moves import xrange
 
+if sys.version_info >= (3, 0):
+    import queue as Queue
+else:
+    import Queue
+
 #
 # With Pyro3 we check for a different set of errors
 # in the run loop so that we don't ignore shutdown
 # requests from the dispatcher
 #
-_worker_connection_problem = None
+_worker_connection_problem = ()
 if using_pyro3:
     _worker_connection_problem = (_pyro.errors.TimeoutError,
                                   _pyro.errors.ConnectionDeniedError)
@@ -38,6 +52,53 @@ elif using_pyro4:
 _worker_task_return_queue_unset = object()
 
 
+def _task_order(task):
+    priority = task.get('priority')
+    return (-priority if priority else 0, task['id'])
+
+
+def _process_task_data(worker, task):
+    # Tasks whose data was encoded by the client have their results
+    # encoded in the same way
+    data, encoding = decode_payload(task['data'])
+    result = worker.process(data)
+    if encoding is not None:
+        result = encode_payload(result, encoding[0], encoding[1])
+    return result
+
+
+class _Heartbeat(threading.Thread):
+    """
+    A thread that renews the leases on the tasks held by a worker every
+    'interval' seconds, using its own connection to the dispatcher.
+    """
+
+    def __init__(self, worker, interval):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.worker = worker
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        dispatcher = self.worker._dispatcher_proxy()
+        try:
+            while not self._stop_event.wait(self.interval):
+                with self.worker._held_leases_lock:
+                    lease_ids = list(self.worker._held_leases)
+                if lease_ids:
+                    try:
+                        dispatcher.renew_leases(lease_ids)
+                    except _worker_connection_problem:
+                        pass
+        finally:
+            _release_proxy(dispatcher)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
 class TaskWorkerBase(object):
 
     def __init__(self,
@@ -47,7 +108,11 @@ class TaskWorkerBase(object):
                  num_dispatcher_tries=30,
                  caller_name="Task Worker",
                  verbose=False,
-                 name=None):
+                 name=None,
+                 shard_key=None,
+                 num_shards=None,
+                 heartbeat_interval=None,
+                 dispatcher=None):
 
         self._verbose = verbose
         # A worker can set this flag
@@ -60,6 +125,41 @@ class TaskWorkerBase(object):
         # each request for work
         self._bulk_task_collection = False
 
+        if name is None:
+            self.WORKERNAME = "Worker_%d@%s" % (os.getpid(),
+                                                socket.gethostname())
+        else:
+            self.WORKERNAME = name
+
+        if dispatcher is None:
+            self._connect(group, host, port, num_dispatcher_tries,
+                          caller_name, shard_key, num_shards)
+        else:
+            # A dispatcher given directly (e.g., a LocalDispatcher, or a
+            # proxy for one) does not need Pyro
+            self.ns = None
+            self.dispatcher = dispatcher
+            if not self.dispatcher.register_worker(self.WORKERNAME):
+                raise RuntimeError("Worker %s could not register with the "
+                                   "dispatcher" % (self.WORKERNAME))
+            self.dispatcher.register_worker_codecs(
+                self.WORKERNAME, available_codecs(), available_compressors())
+
+        # If the dispatcher leases tasks, renew the leases on the tasks
+        # held by this worker (by default, three times per lease)
+        self._held_leases = set()
+        self._held_leases_lock = threading.Lock()
+        self._heartbeat = None
+        lease_timeout = self.dispatcher.get_lease_timeout()
+        if lease_timeout is not None:
+            if heartbeat_interval is None:
+                heartbeat_interval = lease_timeout / 3.0
+            self._heartbeat = _Heartbeat(self, heartbeat_interval)
+            self._heartbeat.start()
+
+    def _connect(self, group, host, port, num_dispatcher_tries,
+                 caller_name, shard_key, num_shards):
+
         if _pyro is None:
             raise ImportError("Pyro or Pyro4 is not available")
 
@@ -68,12 +168,6 @@ class TaskWorkerBase(object):
         if using_pyro3:
             _pyro.core.initClient()
 
-        if name is None:
-            self.WORKERNAME = "Worker_%d@%s" % (os.getpid(),
-                                                socket.gethostname())
-        else:
-            self.WORKERNAME = name
-
         self.ns = get_nameserver(host=host, port=port, caller_name=caller_name)
         if self.ns is None:
             raise RuntimeError("TaskWorkerBase failed to locate "
@@ -82,8 +176,22 @@ class TaskWorkerBase(object):
         cumulative_sleep_time = 0.0
         self.dispatcher = None
         for i in xrange(0, num_dispatcher_tries):
-            dispatchers = get_dispatchers(group=group, ns=self.ns)
+            dispatchers = get_dispatchers(
+                group=group,
+                ns=self.ns,
+                min_dispatchers=num_shards if num_shards else 1)
             random.shuffle(dispatchers)
+            if shard_key is not None:
+                # only connect to the dispatcher that owns this key
+                # (see pyutilib.pyro.shard)
+                if num_shards and len(dispatchers) < num_shards:
+                    dispatchers = []
+                elif dispatchers:
+                    owner = HashRing(
+                        [name for name, uri in dispatchers]).get_node(
+                            shard_key)
+                    dispatchers = [(name, uri) for name, uri in dispatchers
+                                   if name == owner]
             for name, uri in dispatchers:
                 try:
                     if using_pyro3:
@@ -98,6 +206,9 @@ class TaskWorkerBase(object):
                             self.dispatcher._release()
                         self.dispatcher = None
                     else:
+                        self.dispatcher.register_worker_codecs(
+                            self.WORKERNAME, available_codecs(),
+                            available_compressors())
                         break
                 except _connection_problem:
                     self.dispatcher = None
@@ -136,13 +247,47 @@ class TaskWorkerBase(object):
         # We use this functionality to distribute workers across
         # multiple dispatchers based off of denied connections
 
+    def _dispatcher_proxy(self):
+        # Create an additional connection to the dispatcher (for use by
+        # a thread other than the one that owns self.dispatcher)
+        if not _is_pyro_proxy(self.dispatcher):
+            return self.dispatcher
+        if using_pyro3:
+            return _pyro.core.getProxyForURI(self.dispatcher.URI)
+        return _pyro.Proxy(self.dispatcher._pyroUri)
+
+    def _hold_leases(self, tasks):
+        # Start renewing the leases on tasks collected from the dispatcher
+        if self._heartbeat is not None:
+            with self._held_leases_lock:
+                self._held_leases.update(task['_lease_id'] for task in tasks
+                                         if '_lease_id' in task)
+
+    def _drop_leases(self, tasks):
+        # Stop renewing the leases on tasks that have been returned to the
+        # dispatcher (or abandoned, so that the dispatcher requeues them)
+        if self._heartbeat is not None:
+            with self._held_leases_lock:
+                self._held_leases.difference_update(
+                    task.get('_lease_id') for task in tasks)
+
+    def _release_leases(self, tasks):
+        # Release the leases on tasks that are finished but that do not
+        # return a result to the dispatcher
+        if self._heartbeat is not None:
+            self._drop_leases(tasks)
+            lease_ids = [task['_lease_id'] for task in tasks
+                         if '_lease_id' in task]
+            if lease_ids:
+                self.dispatcher.release_leases(lease_ids)
+
     def close(self):
+        if self._heartbeat is not None:
+            self._heartbeat.stop()
+            self._heartbeat = None
         if self.dispatcher is not None:
             self.dispatcher.unregister_worker(self.WORKERNAME)
-            if using_pyro4:
-                self.dispatcher._pyroRelease()
-            else:
-                self.dispatcher._release()
+            _release_proxy(self.dispatcher)
         self.dispather = None
 
     def run(self):
@@ -197,9 +342,12 @@ class TaskWorker(TaskWorkerBase):
                     if self._verbose:
                         print("Collected %s task(s) from queue %s" %
                               (len(tasks), self.type))
+                    self._hold_leases(tasks)
                     results = {}
-                    # process tasks in order of increasing id
-                    for task in sorted(tasks, key=lambda x: x['id']):
+                    unanswered = []
+                    # process tasks in order of decreasing priority,
+                    # and then increasing id
+                    for task in sorted(tasks, key=_task_order):
                         if self._verbose:
                             print("Processing task with id=%s from queue %s" %
                                   (task['id'], self.type))
@@ -215,7 +363,7 @@ class TaskWorker(TaskWorkerBase):
                         self._worker_task_return_queue = \
                             _worker_task_return_queue_unset
                         self._current_task_client = task['client']
-                        task['result'] = self.process(task['data'])
+                        task['result'] = _process_task_data(self, task)
                         task['processedBy'] = self.WORKERNAME
                         return_type_name = self._worker_task_return_queue
                         if return_type_name is _worker_task_return_queue_unset:
@@ -232,19 +380,301 @@ class TaskWorker(TaskWorkerBase):
                                 (task['id']))
                             break
                         if self._worker_shutdown:
+                            self._release_leases((task,))
                             self.close()
                             return
                         if task['generateResponse']:
                             if return_type_name not in results:
                                 results[return_type_name] = []
                             results[return_type_name].append(task)
+                        else:
+                            unanswered.append(task)
 
                         if self._worker_error:
                             break
 
+                    self._release_leases(unanswered)
+                    self._drop_leases(tasks)
                     if len(results):
                         self.dispatcher.add_results(results)
 
+
+#
+# The per-task state that process() may set (e.g., to report an error
+# or to redirect the result) is kept per thread by PrefetchTaskWorker,
+# so that tasks can be processed concurrently by a thread pool.
+#
+class _TaskState(threading.local):
+
+    def __init__(self):
+        self.worker_error = False
+        self.worker_shutdown = False
+        self.worker_task_return_queue = _worker_task_return_queue_unset
+        self.current_task_client = None
+
+
+def _task_state_property(name):
+
+    def fget(self):
+        return getattr(self._task_state, name)
+
+    def fset(self, value):
+        setattr(self._task_state, name, value)
+
+    return property(fget, fset)
+
+
+def _run_task(worker, task):
+    worker._worker_error = False
+    worker._worker_shutdown = False
+    worker._worker_task_return_queue = _worker_task_return_queue_unset
+    worker._current_task_client = task['client']
+    try:
+        result = _process_task_data(worker, task)
+    except Exception:
+        return (task, None, sys.exc_info()[1])
+    return_type_name = worker._worker_task_return_queue
+    return_type_set = \
+        return_type_name is not _worker_task_return_queue_unset
+    return (task, (result, worker._worker_error, worker._worker_shutdown,
+                   return_type_set, return_type_name if return_type_set
+                   else None), None)
+
+#
+# Process pools receive a copy of the worker when they start
+#
+_pool_worker = None
+
+
+def _init_pool_worker(worker):
+    global _pool_worker
+    _pool_worker = worker
+
+
+def _run_pool_task(task):
+    return _run_task(_pool_worker, task)
+
+
+class PrefetchTaskWorker(TaskWorker):
+    """
+    A TaskWorker that overlaps communication with the dispatcher and
+    task processing.
+
+    A background thread keeps a local buffer of up to 'prefetch' tasks
+    filled, tasks are processed by a pool of 'pool_size' threads (or
+    processes, if pool_type='process'), and a second background thread
+    returns the results to the dispatcher with add_results() as they
+    complete.  Each background thread uses its own connection to the
+    dispatcher.
+
+    When a process pool is used, each process works on a copy of the
+    worker made when the pool starts (without the dispatcher and
+    nameserver connections), so process() should only rely on state
+    that was set up in the constructor.
+    """
+
+    _worker_error = _task_state_property('worker_error')
+    _worker_shutdown = _task_state_property('worker_shutdown')
+    _worker_task_return_queue = \
+        _task_state_property('worker_task_return_queue')
+    _current_task_client = _task_state_property('current_task_client')
+
+    def __init__(self, *args, **kwds):
+        self._task_state = _TaskState()
+        self._pool_size = kwds.pop('pool_size', 1)
+        self._pool_type = kwds.pop('pool_type', 'thread')
+        self._prefetch = kwds.pop('prefetch', None)
+        if self._prefetch is None:
+            self._prefetch = 2 * self._pool_size
+        if self._pool_type not in ('thread', 'process'):
+            raise ValueError("PrefetchTaskWorker: pool_type must be "
+                             "'thread' or 'process', not '%s'" %
+                             (self._pool_type,))
+        if self._pool_size < 1 or self._prefetch < 1:
+            raise ValueError("PrefetchTaskWorker: pool_size and prefetch "
+                             "must be positive")
+        TaskWorker.__init__(self, *args, **kwds)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['ns'] = None
+        state['dispatcher'] = None
+        state['_heartbeat'] = None
+        del state['_task_state']
+        del state['_held_leases_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._task_state = _TaskState()
+        self._held_leases_lock = threading.Lock()
+
+    def _fetch_tasks(self, events, slots, stop):
+        dispatcher = self._dispatcher_proxy()
+        timeout = self.timeout if self.block and \
+                  (self.timeout is not None) else 1
+        try:
+            while not stop.is_set():
+                # wait for room in the local buffer, then ask for as
+                # many tasks as there is room for
+                if not slots.acquire(False):
+                    time.sleep(0.001)
+                    continue
+                count = 1
+                while count < self._prefetch and slots.acquire(False):
+                    count += 1
+                try:
+                    tasks = dispatcher.get_tasks(
+                        ((self.type, self.block, timeout, count),)).get(
+                            self.type, ())
+                except _worker_connection_problem as e:
+                    x = sys.exc_info()[1]
+                    print("***WARNING: Connection to dispatcher server "
+                          "denied\n - exception type: " + str(type(e)) +
+                          "\n - message: " + str(x))
+                    tasks = ()
+                    time.sleep(random.uniform(0.05, 0.15))
+                for i in xrange(count - len(tasks)):
+                    slots.release()
+                self._hold_leases(tasks)
+                if self._verbose and len(tasks):
+                    print("Prefetched %s task(s) from queue %s" %
+                          (len(tasks), self.type))
+                for task in tasks:
+                    events.put(('task', task))
+                if not tasks and not self.block:
+                    time.sleep(0.01)
+        except:
+            events.put(('error', sys.exc_info()[1]))
+        finally:
+            _release_proxy(dispatcher)
+
+    def _flush_results(self, outbox):
+        dispatcher = self._dispatcher_proxy()
+        try:
+            done = False
+            while not done:
+                item = outbox.get()
+                results = {}
+                while True:
+                    if item is None:
+                        done = True
+                    else:
+                        results.setdefault(item[0], []).append(item[1])
+                    try:
+                        item = outbox.get(False)
+                    except Queue.Empty:
+                        break
+                if len(results):
+                    for type_results in itervalues(results):
+                        self._drop_leases(type_results)
+                    dispatcher.add_results(results)
+        finally:
+            _release_proxy(dispatcher)
+
+    def run(self):
+
+        print("Listening for work from dispatcher...")
+
+        events = Queue.Queue()
+        outbox = Queue.Queue()
+        slots = threading.Semaphore(self._prefetch)
+        stop = threading.Event()
+        if self._pool_type == 'process':
+            pool = multiprocessing.Pool(self._pool_size, _init_pool_worker,
+                                        (self,))
+            submit = lambda task: pool.apply_async(
+                _run_pool_task, (task,), callback=events.put)
+        else:
+            pool = multiprocessing.pool.ThreadPool(self._pool_size)
+            submit = lambda task: pool.apply_async(
+                _run_task, (self, task), callback=events.put)
+        fetcher = threading.Thread(target=self._fetch_tasks,
+                                   args=(events, slots, stop))
+        fetcher.daemon = True
+        flusher = threading.Thread(target=self._flush_results,
+                                   args=(outbox,))
+        flusher.daemon = True
+        fetcher.start()
+        flusher.start()
+
+        pending = deque()
+        running = 0
+        shutdown = False
+        try:
+            while True:
+                event = events.get()
+                if event[0] == 'error':
+                    raise event[1]
+                elif event[0] == 'task':
+                    pending.append(event[1])
+                else:
+                    running -= 1
+                    shutdown = self._complete_task(event, outbox, pending,
+                                                   slots)
+                    if shutdown:
+                        break
+                while pending and running < self._pool_size:
+                    task = pending.popleft()
+                    slots.release()
+                    if self._verbose:
+                        print("Processing task with id=%s from queue %s" %
+                              (task['id'], self.type))
+                    submit(task)
+                    running += 1
+        finally:
+            stop.set()
+            fetcher.join()
+            pool.close()
+            pool.join()
+            # Return anything that was prefetched but not started to the
+            # dispatcher, and send the results of the tasks that were
+            # still being processed
+            while True:
+                try:
+                    event = events.get(False)
+                except Queue.Empty:
+                    break
+                if event[0] == 'task':
+                    pending.append(event[1])
+                elif event[0] != 'error' and event[2] is None:
+                    self._complete_task(event, outbox, pending, slots)
+            self._requeue(pending, slots)
+            outbox.put(None)
+            flusher.join()
+            if shutdown:
+                self.close()
+
+    def _complete_task(self, event, outbox, pending, slots):
+        task, outcome, exc = event
+        if exc is not None:
+            raise exc
+        result, error, shutdown, return_type_set, return_type_name = outcome
+        task['result'] = result
+        task['processedBy'] = self.WORKERNAME
+        if not return_type_set:
+            return_type_name = self.type
+        if error:
+            outbox.put((return_type_name, task))
+            print("Task worker reported error during processing of task "
+                  "with id=%s. Any remaining tasks in local queue will be "
+                  "returned to the dispatcher." % (task['id']))
+            self._requeue(pending, slots)
+        elif not shutdown and task['generateResponse']:
+            outbox.put((return_type_name, task))
+        else:
+            self._release_leases((task,))
+        return shutdown
+
+    def _requeue(self, pending, slots):
+        if pending:
+            self._drop_leases(pending)
+            self.dispatcher.add_tasks({self.type: list(pending)})
+            for i in xrange(len(pending)):
+                slots.release()
+            pending.clear()
+
+
 class MultiTaskWorker(TaskWorkerBase):
 
     def __init__(self,
@@ -324,7 +754,23 @@ class MultiTaskWorker(TaskWorkerBase):
             self._worker_error = False
             self._worker_shutdown = False
             try:
-                tasks = self.dispatcher.get_tasks(self.current_type_order())
+                type_list = self.current_type_order()
+                if any(block for type_name, block, timeout in type_list):
+                    # Rather than blocking on each queue in turn, wait
+                    # until any of the queues has a task, and then
+                    # collect the tasks without blocking
+                    timeouts = [timeout for type_name, block, timeout
+                                in type_list if block]
+                    ready = self.dispatcher.wait_any(
+                        [type_name for type_name, block, timeout
+                         in type_list],
+                        timeout=None if None in timeouts else max(timeouts),
+                        results=False)
+                    type_list = [(type_name, False, 0)
+                                 for type_name, block, timeout in type_list
+                                 if type_name in ready]
+                tasks = self.dispatcher.get_tasks(type_list) \
+                        if type_list else {}
             except _worker_connection_problem as e:
                 x = sys.exc_info()[1]
                 # this can happen if the dispatcher is overloaded
@@ -346,7 +792,11 @@ class MultiTaskWorker(TaskWorkerBase):
                               (sum(len(_tl)
                                    for _tl in itervalues(tasks)), len(tasks)))
 
+                    all_tasks = [task for type_tasks in itervalues(tasks)
+                                 for task in type_tasks]
+                    self._hold_leases(all_tasks)
                     results = {}
+                    unanswered = []
                     # process tasks by type in order of increasing id
                     for type_name, type_tasks in iteritems(tasks):
                         type_results = results[type_name] = []
@@ -354,7 +804,7 @@ class MultiTaskWorker(TaskWorkerBase):
                             self._worker_task_return_queue = \
                                 _worker_task_return_queue_unset
                             self._current_task_client = task['client']
-                            task['result'] = self.process(task['data'])
+                            task['result'] = _process_task_data(self, task)
                             task['processedBy'] = self.WORKERNAME
                             return_type_name = self._worker_task_return_queue
                             if return_type_name is _worker_task_return_queue_unset:
@@ -370,16 +820,21 @@ class MultiTaskWorker(TaskWorkerBase):
                                     (task['id']))
                                 break
                             if self._worker_shutdown:
+                                self._release_leases((task,))
                                 self.close()
                                 return
                             if task['generateResponse']:
                                 if return_type_name not in results:
                                     results[return_type_name] = []
                                 results[return_type_name].append(task)
+                            else:
+                                unanswered.append(task)
 
                         if self._worker_error:
                             break
 
+                    self._release_leases(unanswered)
+                    self._drop_leases(all_tasks)
                     if len(results):
                         self.dispatcher.add_results(results)
 
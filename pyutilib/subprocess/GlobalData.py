@@ -12,3 +12,7 @@ current_process = None
 signal_handler_busy = None
 DEFINE_SIGNAL_HANDLERS_DEFAULT = True
 original_signal_handlers = {}
+# Block size used by the chunked output readers in run_command().  The
+# default of 0 selects the original byte-at-a-time readers.
+READER_CHUNKSIZE = 65536
+READER_CHUNKSIZE_DEFAULT = 0
@@ -8,9 +8,14 @@
 #  _________________________________________________________________________
 #
 
+import sys
+
 from pyutilib.component.core import PluginGlobals
 PluginGlobals.add_env("pyutilib")
 
-from pyutilib.subprocess.processmngr import subprocess, SubprocessMngr, run_command, timer, signal_handler, run, PIPE, STDOUT
+from pyutilib.subprocess.processmngr import subprocess, SubprocessMngr, run_command, timer, signal_handler, run, PIPE, STDOUT, ReaderStats, running_processes, signal_forwarding, ResourceUsage
+from pyutilib.subprocess.batch import run_commands, CommandResult, BatchStats
+if sys.version_info >= (3, 5):
+    from pyutilib.subprocess.asyncmngr import async_run_command, async_run
 
 PluginGlobals.pop_env()
@@ -0,0 +1,282 @@
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# An asyncio-native counterpart to run_command().  Subprocess output is
+# read through asyncio stream transports on the event loop, so (unlike
+# run_command) no reader threads are created and many commands can be
+# supervised concurrently from a single thread.
+#
+# NOTE: this module requires Python 3.5+ and is only imported by
+# pyutilib.subprocess on those versions.
+#
+
+__all__ = ['async_run_command', 'async_run']
+
+import asyncio
+import io
+import os
+import signal
+import subprocess
+import sys
+
+from pyutilib.subprocess import GlobalData
+from pyutilib.subprocess.processmngr import (
+    _build_command, _ChunkedStream, _reader_encoding, _report_lost_output,
+    _mswindows, bytes_cast, timer, STDOUT)
+from pyutilib.common import ApplicationError
+
+if _mswindows:
+    _forwarded_signals = ()
+else:
+    _forwarded_signals = (signal.SIGHUP, signal.SIGINT, signal.SIGTERM)
+
+#
+# The processes started by async_run_command() that are still running,
+# indexed by event loop.  While a loop has active processes, it forwards
+# SIGHUP/SIGINT/SIGTERM to them.
+#
+_active_processes = {}
+_original_signal_handlers = {}
+
+
+def _kill_process_group(process, sig=signal.SIGTERM):
+    if process.returncode is not None:
+        return
+    try:
+        if _mswindows:
+            process.kill()
+        else:
+            os.killpg(process.pid, sig)
+    except OSError:
+        # The process exited between the returncode check and the kill
+        pass
+
+
+def _forward_signal(loop, signum):
+    for process in list(_active_processes.get(loop, ())):
+        _kill_process_group(process, signum)
+
+
+def _register_process(loop, process, define_signal_handlers):
+    active = _active_processes.setdefault(loop, set())
+    if define_signal_handlers and loop not in _original_signal_handlers:
+        handlers = {}
+        for sig in _forwarded_signals:
+            try:
+                orig = signal.getsignal(sig)
+                loop.add_signal_handler(sig, _forward_signal, loop, sig)
+                handlers[sig] = orig
+            except (RuntimeError, ValueError, NotImplementedError):
+                # Signal handlers can only be installed from the main
+                # thread (and not at all on some platforms)
+                break
+        _original_signal_handlers[loop] = handlers
+    active.add(process)
+
+
+def _unregister_process(loop, process):
+    active = _active_processes.get(loop, ())
+    active.discard(process)
+    if active:
+        return
+    _active_processes.pop(loop, None)
+    for sig, orig in _original_signal_handlers.pop(loop, {}).items():
+        loop.remove_signal_handler(sig)
+        if orig is not None:
+            signal.signal(sig, orig)
+
+
+async def _pump_stream(reader, stream, chunksize):
+    while True:
+        data = await reader.read(chunksize)
+        if not data:
+            break
+        stream.feed(data)
+    return stream.close()
+
+
+#
+# Execute the command as an asyncio subprocess.  The arguments and the
+# return value ([returncode, output]) mirror run_command().
+#
+async def async_run_command(cmd,
+                            outfile=None,
+                            cwd=None,
+                            ostream=None,
+                            stdin=None,
+                            stdout=None,
+                            stderr=None,
+                            valgrind=False,
+                            valgrind_log=None,
+                            valgrind_options=None,
+                            memmon=False,
+                            env=None,
+                            define_signal_handlers=None,
+                            debug=False,
+                            verbose=True,
+                            timelimit=None,
+                            tee=None,
+                            ignore_output=False,
+                            shell=False,
+                            reader_chunksize=None,
+                            reader_stats=None):
+    if define_signal_handlers is None:
+        define_signal_handlers = GlobalData.DEFINE_SIGNAL_HANDLERS_DEFAULT
+    if not reader_chunksize:
+        reader_chunksize = GlobalData.READER_CHUNKSIZE
+    if timelimit is not None and timelimit <= 0:
+        raise ValueError("'timeout' must be a positive number")
+
+    _cmd = _build_command(cmd, memmon, valgrind, valgrind_log,
+                          valgrind_options)
+    #
+    # Relative outfile paths are interpreted relative to cwd (as
+    # run_command() does)
+    #
+    outfile_path = outfile
+    if cwd is not None and outfile is not None:
+        outfile_path = os.path.join(cwd, outfile)
+    #
+    # Redirect stdout and stderr
+    #
+    buffer = None
+    if ostream is not None:
+        stdout_arg = stderr_arg = ostream
+        if outfile is not None or stdout is not None or stderr is not None:
+            raise ValueError("subprocess.async_run_command(): ostream, "
+                             "outfile, and {stdout, stderr} options are "
+                             "mutually exclusive")
+        output = "Output printed to specified ostream"
+    elif outfile is not None:
+        if stdout is not None or stderr is not None:
+            raise ValueError("subprocess.async_run_command(): outfile and "
+                             "{stdout, stderr} options are mutually exclusive")
+        stdout_arg = stderr_arg = open(outfile_path, "w")
+        output = "Output printed to file '%s'" % outfile
+    elif not (stdout is None and stderr is None):
+        stdout_arg = stdout
+        stderr_arg = stderr
+        output = "Output printed to specified stdout and stderr streams"
+    else:
+        stdout_arg = stderr_arg = buffer = io.StringIO()
+        output = ""
+
+    if stdout_arg is stderr_arg:
+        try:
+            if not tee or (not tee[0] and not tee[1]):
+                stderr_arg = STDOUT
+        except:
+            pass
+    #
+    # Decide which streams are passed directly to the subprocess and
+    # which are read (and possibly tee'd) through a pipe
+    #
+    fds = []
+    pumps = []
+    for fid in (0, 1):
+        if fid == 0:
+            s, raw = stdout_arg, sys.stdout
+        else:
+            s, raw = stderr_arg, sys.stderr
+        try:
+            tee_fid = tee[fid]
+        except:
+            tee_fid = tee
+        if s is None or s is STDOUT:
+            fds.append(s)
+            continue
+        if not tee_fid:
+            try:
+                s.fileno()
+                fds.append(s)
+                continue
+            except:
+                raw = None
+        fds.append(subprocess.PIPE)
+        pumps.append((fid, (raw, s)))
+
+    if env is None:
+        env = os.environ.copy()
+    if shell:
+        # Mirror subprocess.Popen(list, shell=True)
+        if _mswindows:
+            _cmd = [os.environ.get("COMSPEC", "cmd.exe"), "/c",
+                    subprocess.list2cmdline(_cmd)]
+        else:
+            _cmd = ["/bin/sh", "-c"] + _cmd
+    if debug:
+        print("Executing command %s" % (_cmd,))
+
+    loop = asyncio.get_event_loop()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *_cmd,
+            stdin=None if stdin is None else subprocess.PIPE,
+            stdout=fds[0],
+            stderr=fds[1],
+            cwd=cwd,
+            env=env,
+            start_new_session=not _mswindows)
+    except OSError:
+        err = sys.exc_info()[1]
+        if outfile is not None:
+            stdout_arg.close()
+        raise ApplicationError(
+            "Could not execute the command: '%s'\n\tError message: %s" %
+            (' '.join(_cmd), err))
+
+    _register_process(loop, process, define_signal_handlers)
+    try:
+        raw_stderr, encoding = _reader_encoding()
+        reader_start = timer()
+        streams = []
+        tasks = []
+        for fid, outputs in pumps:
+            stream = _ChunkedStream(fid, outputs, encoding)
+            reader = process.stdout if fid == 0 else process.stderr
+            streams.append(stream)
+            tasks.append(asyncio.ensure_future(
+                _pump_stream(reader, stream, reader_chunksize)))
+        if stdin is not None:
+            process.stdin.write(bytes_cast(stdin))
+            try:
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            process.stdin.close()
+        #
+        # Wait for the process to finish, killing it if the timelimit
+        # is exceeded
+        #
+        try:
+            rc = await asyncio.wait_for(process.wait(), timelimit)
+        except asyncio.TimeoutError:
+            _kill_process_group(process)
+            await process.wait()
+            rc = -1
+        lost = ""
+        for lost_output in await asyncio.gather(*tasks):
+            lost += lost_output
+        _report_lost_output(raw_stderr, lost)
+        if reader_stats is not None and streams:
+            reader_stats.elapsed += timer() - reader_start
+            for stream in streams:
+                reader_stats.add(stream.nbytes, stream.nreads)
+    finally:
+        _kill_process_group(process)
+        _unregister_process(loop, process)
+
+    if outfile is not None:
+        stdout_arg.close()
+    elif buffer is not None and not ignore_output:
+        output = buffer.getvalue()
+    return [rc, output]
+
+# Create an alias for async_run_command
+async_run = async_run_command
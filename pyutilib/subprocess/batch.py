@@ -0,0 +1,312 @@
+#  _________________________________________________________________________
+#
+#  PyUtilib: A Python utility library.
+#  Copyright (c) 2008 Sandia Corporation.
+#  This software is distributed under the BSD License.
+#  Under the terms of Contract DE-AC04-94AL85000 with Sandia Corporation,
+#  the U.S. Government retains certain rights in this software.
+#  _________________________________________________________________________
+#
+# Run a batch of external commands with bounded concurrency.
+#
+# All of the child processes are launched and reaped from the calling
+# thread: the scheduler never changes the parent's working directory
+# (cwd is handed to Popen), and each job's output is redirected to a
+# temporary file so that no reader threads are needed.
+#
+
+__all__ = ['run_commands', 'CommandResult', 'BatchStats']
+
+import os
+import sys
+import signal
+import tempfile
+import time
+import multiprocessing
+
+from pyutilib.subprocess.processmngr import (
+    SubprocessMngr, ResourceUsage, _build_command, _wait4, _wait4_available,
+    _mswindows, timer, STDOUT)
+from pyutilib.common import ApplicationError
+
+_job_options = ('cmd', 'cwd', 'env', 'timelimit', 'outfile', 'shell',
+                'memmon', 'valgrind', 'valgrind_log', 'valgrind_options')
+
+
+class CommandResult(object):
+    """
+    The result of one command run by run_commands().
+
+    'id' is the position of the command in the batch; 'output' follows
+    the run_command() conventions.  'queue_wait' is the time between
+    the batch starting and the command being launched, and 'wall_time'
+    is the time the command ran.  'resources' is a ResourceUsage object
+    describing the CPU time, peak RSS, block I/O and context switches of
+    the command (populated where os.wait4 is available).
+    """
+
+    def __init__(self, id, cmd):
+        self.id = id
+        self.cmd = cmd
+        self.returncode = None
+        self.output = ""
+        self.timed_out = False
+        self.queue_wait = 0.0
+        self.wall_time = 0.0
+        self.resources = ResourceUsage()
+
+    @property
+    def cpu_time(self):
+        """The user + system CPU time (None if not available)"""
+        return self.resources.cpu_time
+
+    def __iter__(self):
+        # Allow "rc, output = result", mirroring run_command()
+        return iter((self.returncode, self.output))
+
+    def __repr__(self):
+        return "CommandResult(id=%r, returncode=%r)" % (self.id,
+                                                        self.returncode)
+
+
+class BatchStats(object):
+    """
+    Aggregate statistics for a run_commands() batch.  The counters are
+    updated as each result is produced.
+    """
+
+    def __init__(self):
+        self.jobs = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.wall_time = 0.0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.job_time = 0.0
+        self.cpu_time = 0.0
+        self.max_rss = 0
+
+    def add(self, result):
+        self.jobs += 1
+        if result.returncode != 0:
+            self.failed += 1
+        if result.timed_out:
+            self.timed_out += 1
+        self.queue_wait += result.queue_wait
+        self.max_queue_wait = max(self.max_queue_wait, result.queue_wait)
+        self.job_time += result.wall_time
+        if result.cpu_time is not None:
+            self.cpu_time += result.cpu_time
+        if result.resources.max_rss is not None:
+            self.max_rss = max(self.max_rss, result.resources.max_rss)
+
+    def __str__(self):
+        return ("%d jobs (%d failed, %d timed out) in %.3f seconds; "
+                "queue wait %.3f total / %.3f max; job time %.3f; "
+                "CPU time %.3f; peak RSS %.1f MB" %
+                (self.jobs, self.failed, self.timed_out, self.wall_time,
+                 self.queue_wait, self.max_queue_wait, self.job_time,
+                 self.cpu_time, self.max_rss / 1048576.0))
+
+
+class _Job(object):
+    __slots__ = ('result', 'process', 'pid', 'deadline', 'start',
+                 'outfile', 'stream', 'killed')
+
+
+def _reap(job):
+    """
+    Return True if the job's process has terminated, recording its
+    resource usage where available.
+    """
+    process = job.process
+    if not _wait4_available:
+        return process.poll() is not None
+    rusage = _wait4(process)
+    if rusage is not None:
+        job.result.resources.wall_time = timer() - job.start
+        job.result.resources.set_rusage(rusage)
+    return process.returncode is not None
+
+
+def _kill(job, force=False):
+    """
+    Terminate the job's process group (SIGTERM), or kill it (SIGKILL) if
+    'force' is True.  The time of the first termination request is
+    recorded in job.killed.
+    """
+    try:
+        if _mswindows:
+            if force:
+                job.process.kill()
+            else:
+                job.process.terminate()
+        else:
+            os.killpg(job.pid, signal.SIGKILL if force else signal.SIGTERM)
+    except OSError:
+        pass
+    if job.killed is None:
+        job.killed = timer()
+
+
+def _finish(job, ignore_output):
+    result = job.result
+    result.wall_time = timer() - job.start
+    if result.timed_out:
+        result.returncode = -1
+    else:
+        result.returncode = job.process.returncode
+    if job.outfile is not None:
+        job.stream.close()
+        result.output = "Output printed to file '%s'" % job.outfile
+    else:
+        if not ignore_output:
+            job.stream.seek(0)
+            result.output = job.stream.read()
+        job.stream.close()
+    return result
+
+
+#
+# Execute a batch of commands, running at most max_workers at a time.
+#
+def run_commands(batch,
+                 max_workers=None,
+                 cwd=None,
+                 env=None,
+                 timelimit=None,
+                 shell=False,
+                 ignore_output=False,
+                 stats=None,
+                 poll_interval=0.01,
+                 kill_grace=1.0):
+    """
+    Run a batch of commands, yielding a CommandResult for each command
+    as it completes (not necessarily in batch order).
+
+    Each entry in the batch is either a command (a string or a list of
+    arguments) or a dict holding the command ('cmd') and any of the
+    per-job options 'cwd', 'env', 'timelimit', 'outfile', 'shell',
+    'memmon', 'valgrind', 'valgrind_log' and 'valgrind_options'.  The
+    cwd, env, timelimit and shell arguments supply the defaults for
+    every job; the default environment is copied once for the batch.
+
+    If a BatchStats object is passed as 'stats', it is updated as the
+    results are produced.
+
+    A job that exceeds its time limit is sent SIGTERM, and then SIGKILL
+    if it is still running 'kill_grace' seconds later.
+    """
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+    if max_workers < 1:
+        raise ValueError("run_commands(): max_workers must be positive")
+    if env is None:
+        env = os.environ.copy()
+    defaults = {'cwd': cwd, 'env': env, 'timelimit': timelimit,
+                'shell': shell, 'outfile': None}
+
+    start = timer()
+    pending = enumerate(batch)
+    running = []
+    try:
+        while True:
+            while len(running) < max_workers:
+                try:
+                    idx, spec = next(pending)
+                except StopIteration:
+                    break
+                running.append(_launch(idx, spec, defaults, start))
+            if not running:
+                break
+            now = timer()
+            finished = []
+            for job in running:
+                if _reap(job):
+                    finished.append(job)
+                elif job.killed is not None:
+                    if now >= job.killed + kill_grace:
+                        # The job ignored SIGTERM
+                        _kill(job, force=True)
+                elif job.deadline is not None and now >= job.deadline:
+                    job.result.timed_out = True
+                    _kill(job)
+            if not finished:
+                time.sleep(poll_interval)
+                continue
+            for job in finished:
+                running.remove(job)
+                result = _finish(job, ignore_output)
+                if stats is not None:
+                    stats.wall_time = timer() - start
+                    stats.add(result)
+                yield result
+    finally:
+        # If the consumer abandons the iterator, do not leave orphans
+        for job in running:
+            _kill(job)
+        for job in running:
+            while job.process.poll() is None \
+                  and timer() < job.killed + kill_grace:
+                time.sleep(poll_interval)
+            if job.process.returncode is None:
+                _kill(job, force=True)
+                job.process.wait()
+            job.stream.close()
+
+
+def _launch(idx, spec, defaults, start):
+    if type(spec) is dict:
+        unknown = set(spec) - set(_job_options)
+        if unknown:
+            raise ValueError("run_commands(): unknown job option(s) %s" %
+                             (', '.join(sorted(unknown)),))
+        options = dict(defaults)
+        options.update(spec)
+    else:
+        options = dict(defaults)
+        options['cmd'] = spec
+    if options['timelimit'] is not None and options['timelimit'] <= 0:
+        raise ValueError("'timeout' must be a positive number")
+    _cmd = _build_command(options['cmd'],
+                          options.get('memmon', False),
+                          options.get('valgrind', False),
+                          options.get('valgrind_log', None),
+                          options.get('valgrind_options', None))
+
+    job = _Job()
+    job.result = CommandResult(idx, options['cmd'])
+    job.outfile = options['outfile']
+    if job.outfile is not None:
+        # Relative outfile paths are interpreted relative to the cwd of
+        # the job (as run_command() does)
+        outfile_path = job.outfile
+        if options['cwd'] is not None:
+            outfile_path = os.path.join(options['cwd'], job.outfile)
+        job.stream = open(outfile_path, "w")
+    else:
+        job.stream = tempfile.TemporaryFile(mode='w+')
+    job.start = timer()
+    job.result.queue_wait = job.start - start
+    try:
+        job.process = SubprocessMngr(
+            _cmd,
+            stdout=job.stream,
+            stderr=STDOUT,
+            env=options['env'],
+            cwd=options['cwd'],
+            shell=options['shell'],
+            resources=job.result.resources).process
+    except OSError:
+        job.stream.close()
+        err = sys.exc_info()[1]
+        raise ApplicationError(
+            "Could not execute the command: '%s'\n\tError message: %s" %
+            (' '.join(_cmd), err))
+    job.pid = job.process.pid
+    job.killed = None
+    if options['timelimit'] is None:
+        job.deadline = None
+    else:
+        job.deadline = job.start + options['timelimit']
+    return job
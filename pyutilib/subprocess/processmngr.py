@@ -8,17 +8,23 @@
 #  _________________________________________________________________________
 
 __all__ = ['subprocess', 'SubprocessMngr', 'run_command', 'timer',
-           'signal_handler', 'run', 'PIPE', 'STDOUT']
+           'signal_handler', 'run', 'PIPE', 'STDOUT', 'ReaderStats',
+           'running_processes', 'signal_forwarding', 'ResourceUsage']
 
 from pyutilib.subprocess import GlobalData
+import codecs
+import errno
 import time
 import signal
 import os
 import sys
 import tempfile
 import subprocess
+from contextlib import contextmanager
+from functools import partial
 from six import itervalues
-from threading import Thread
+import threading
+from threading import Thread, Lock
 
 _mswindows = sys.platform.startswith('win')
 
@@ -79,6 +85,9 @@ if sys.version_info[0:2] >= (3, 0):
 else:
     bytes_cast = lambda x: x  # Do nothing
 
+# subprocess.Popen() supports start_new_session in Python 3.2+
+_start_new_session = sys.version_info >= (3, 2)
+
 #
 # Setup the timer
 #
@@ -124,13 +133,46 @@ def kill_process(process, sig=signal.SIGTERM, verbose=False):
         # we can hard-ware Popen.__del__ to return immediately by telling it
         # that it did not create a child process!
         #
-        if not GlobalData.current_process is None:
-            GlobalData.current_process._child_created = False
+        process._child_created = False
 
 
 GlobalData.current_process = None
 GlobalData.pid = None
 GlobalData.signal_handler_busy = False
+GlobalData.signal_handler_depth = 0
+GlobalData.signal_handler_lock = Lock()
+
+#
+# The registry of running processes started by run_command().  This
+# allows run_command() to be called from multiple threads: the signal
+# handler terminates every registered process.  GlobalData.current_process
+# is retained (as the most recently started process) for backwards
+# compatibility.
+#
+_process_registry = set()
+_process_registry_lock = Lock()
+
+
+def _register_process(process):
+    with _process_registry_lock:
+        _process_registry.add(process)
+    GlobalData.current_process = process
+
+
+def _unregister_process(process):
+    with _process_registry_lock:
+        _process_registry.discard(process)
+    if GlobalData.current_process is process:
+        GlobalData.current_process = None
+
+
+def running_processes():
+    """
+    Return a list of the processes started by run_command() that are
+    currently registered (i.e., have not yet returned)
+    """
+    with _process_registry_lock:
+        return list(_process_registry)
 
 
 #
@@ -149,35 +191,38 @@ def signal_handler(signum, frame, verbose=False):
         print("")
         print("  Signal handler is busy.  Aborting.")
         sys.exit(-signum)
-    if GlobalData.current_process is None:
+    processes = running_processes()
+    if not processes:
         print("  Signal", signum, "recieved, but no process queued")
         print("  Exiting now")
         sys.exit(-signum)
-    if GlobalData.current_process is not None and\
-       GlobalData.current_process.pid is not None and\
-       GlobalData.current_process.poll() is None:
+    active = [p for p in processes if p.pid is not None and p.poll() is None]
+    if active:
         GlobalData.signal_handler_busy = True
-        kill_process(GlobalData.current_process, signum)
-        if verbose:
-            print("  Signaled process", GlobalData.current_process.pid,
-                  "with signal", signum)
+        for process in active:
+            try:
+                kill_process(process, signum)
+            except OSError:
+                # The process terminated before we could signal it
+                continue
+            if verbose:
+                print("  Signaled process", process.pid, "with signal",
+                      signum)
         endtime = timer() + 1.0
         while timer() < endtime:
-            status = GlobalData.current_process.poll()
-            if status is None:
+            active = [p for p in active if p.poll() is None]
+            if not active:
                 break
             time.sleep(0.1)
-        #GlobalData.current_process.wait()
-        status = GlobalData.current_process.poll()
-        if status is not None:
+        active = [p for p in active if p.poll() is None]
+        if not active:
             GlobalData.signal_handler_busy = False
             if verbose:
                 print("Done.")
             raise OSError("Interrupted by signal " + repr(signum))
         else:
             raise OSError("Problem terminating process" + repr(
-                GlobalData.current_process.pid))
-        GlobalData.current_process = None
+                [p.pid for p in active]))
 
     # Restore the original signal handlers (because the subprocess is
     # now defunct, and we shouldn't return here)
@@ -191,6 +236,66 @@ def signal_handler(signum, frame, verbose=False):
     raise OSError("Interrupted by signal " + repr(signum))
 
 
+#
+# Install / restore the signal handlers used by run_command().  The
+# handlers are reference counted so that nested users (e.g., a
+# signal_forwarding() block around calls to run_command()) do not
+# restore the original handlers prematurely.  Python only allows signal
+# handlers to be set from the main thread: calls from other threads
+# return False and leave both the handlers and the count alone, so the
+# main thread is always the one that restores the original handlers.
+#
+def _in_main_thread():
+    if hasattr(threading, 'main_thread'):
+        return threading.current_thread() is threading.main_thread()
+    return isinstance(threading.current_thread(), threading._MainThread)
+
+
+def _install_signal_handlers(verbose=False):
+    if not _in_main_thread():
+        return False
+    with GlobalData.signal_handler_lock:
+        if not GlobalData.signal_handler_depth:
+            handler = verbose_signal_handler if verbose else signal_handler
+            signals = [signal.SIGINT, signal.SIGTERM]
+            if sys.platform[0:3] != "win" and sys.platform[0:4] != 'java':
+                signals.insert(0, signal.SIGHUP)
+            for _sig in signals:
+                GlobalData.original_signal_handlers[_sig] \
+                    = signal.signal(_sig, handler)
+        GlobalData.signal_handler_depth += 1
+    return True
+
+
+def _restore_signal_handlers():
+    with GlobalData.signal_handler_lock:
+        GlobalData.signal_handler_depth = max(
+            0, GlobalData.signal_handler_depth - 1)
+        if GlobalData.signal_handler_depth:
+            return
+        for _sig in list(GlobalData.original_signal_handlers):
+            signal.signal(_sig,
+                          GlobalData.original_signal_handlers.pop(_sig))
+
+
+@contextmanager
+def signal_forwarding(verbose=False):
+    """
+    Forward SIGHUP/SIGINT/SIGTERM to all processes started by
+    run_command() while the block is active.  This must be entered from
+    the main thread, and is intended for drivers that call run_command()
+    from worker threads (which cannot install signal handlers).
+    """
+    installed = _install_signal_handlers(verbose)
+    if not installed:
+        raise RuntimeError("signal_forwarding() must be used from the "
+                           "main thread")
+    try:
+        yield
+    finally:
+        _restore_signal_handlers()
+
+
 #
 # A function used to read in data from a shell command, and push it into a pipe.
 #
@@ -425,43 +530,244 @@ def _pseudo_merged_reader(*args):
         th.join()
 
 
+class ReaderStats(object):
+    """
+    Counters collected by the chunked stream readers.
+
+    The reader threads accumulate the number of bytes and read calls
+    issued against the subprocess pipes, and run_command() records the
+    wall-clock time that the readers were active.  Passing the same
+    object to several run_command() calls accumulates the totals.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.bytes = 0
+        self.reads = 0
+        self.elapsed = 0.0
+
+    def add(self, nbytes, nreads):
+        with self._lock:
+            self.bytes += nbytes
+            self.reads += nreads
+
+    @property
+    def throughput(self):
+        """Bytes read per second of reader wall-clock time"""
+        if not self.elapsed:
+            return 0.0
+        return self.bytes / self.elapsed
+
+    def __str__(self):
+        return "%d bytes in %d reads over %.3f seconds (%.2f MB/s)" % (
+            self.bytes, self.reads, self.elapsed, self.throughput / 1e6)
+
+
+def _reader_encoding():
+    raw_stderr = sys.__stderr__
+    if raw_stderr is None:
+        raw_stderr = sys.stderr
+    encoding = getattr(raw_stderr, 'encoding', None)
+    if encoding is None:
+        encoding = 'utf-8'
+    return raw_stderr, encoding
+
+
 #
-# Execute the command as a subprocess that we can send signals to.
-# After this is finished, we can get the output from this command from
-# the process.stdout file descriptor.
+# Read directly into a preallocated buffer where the platform supports
+# it (os.readv), otherwise fall back on os.read().  Either way, the
+# return value is a bytes-like object holding the data that was read.
 #
-def run_command(cmd,
-                outfile=None,
-                cwd=None,
-                ostream=None,
-                stdin=None,
-                stdout=None,
-                stderr=None,
-                valgrind=False,
-                valgrind_log=None,
-                valgrind_options=None,
-                memmon=False,
-                env=None,
-                define_signal_handlers=None,
-                debug=False,
-                verbose=True,
-                timelimit=None,
-                tee=None,
-                ignore_output=False,
-                shell=False,
-                thread_reader=None):
-    #
-    # Set the define_signal_handlers based on the global default flag.
-    #
-    if define_signal_handlers is None:
-        define_signal_handlers = GlobalData.DEFINE_SIGNAL_HANDLERS_DEFAULT
-    #
-    # Move to the specified working directory
-    #
-    if cwd is not None:
-        oldpwd = os.getcwd()
-        os.chdir(cwd)
+if hasattr(os, 'readv'):
+
+    def _read_chunk(fd, buf, view):
+        return view[:os.readv(fd, (buf,))]
+else:
+
+    def _read_chunk(fd, buf, view):
+        return os.read(fd, len(buf))
+
+
+class _ChunkedStream(object):
+    """
+    Decode blocks of subprocess output and forward them to 1+ output
+    streams.
+
+    The 'unbuffer' flag follows the conventions of _stream_reader: 0
+    writes only complete lines, 1 writes the data as soon as it is
+    decoded (flushing at each newline), and 2 writes complete lines and
+    flushes after each write.
+    """
+    __slots__ = ('unbuffer', 'output', 'decoder', 'buf', 'lost',
+                 'nbytes', 'nreads')
+
+    def __init__(self, unbuffer, output, encoding):
+        self.unbuffer = unbuffer
+        self.output = tuple(x for x in output if x is not None)
+        self.decoder = codecs.getincrementaldecoder(encoding)('replace')
+        self.buf = ""
+        self.lost = ""
+        self.nbytes = 0
+        self.nreads = 0
+
+    def write(self, x):
+        success = True
+        for s in self.output:
+            try:
+                s.write(x)
+            except ValueError:
+                success = False
+        return success
+
+    def flush(self):
+        for s in self.output:
+            try:
+                s.flush()
+            except ValueError:
+                pass
 
+    def feed(self, data):
+        self.nbytes += len(data)
+        self.nreads += 1
+        self._emit(self.decoder.decode(data))
+
+    def _emit(self, text):
+        if not text:
+            return
+        if self.unbuffer == 1:
+            if not self.write(text):
+                self.lost += text
+            if '\n' in text:
+                self.flush()
+            return
+        text = self.buf + text
+        eol = text.rfind('\n')
+        if eol < 0:
+            self.buf = text
+            return
+        if not self.write(text[:eol + 1]):
+            self.lost += text[:eol + 1]
+        if self.unbuffer:
+            self.flush()
+        self.buf = text[eol + 1:]
+
+    def close(self):
+        # Flush any partial multibyte sequence out of the decoder
+        self._emit(self.decoder.decode(b'', True))
+        if self.buf:
+            if not self.write(self.buf):
+                self.lost += self.buf
+            self.buf = ""
+        self.flush()
+        return self.lost
+
+
+def _report_lost_output(raw_stderr, lost):
+    if not lost or raw_stderr is None:
+        return
+    raw_stderr.write("""
+ERROR: pyutilib.subprocess: output stream closed before all subprocess output
+       was written to it.  The following was left in the subprocess buffer:
+            '%s'
+""" % (lost,))
+
+
+#
+# Chunked counterparts to _stream_reader / _merged_reader /
+# _pseudo_merged_reader.  Rather than issuing one os.read() (and one
+# decode) per byte, these read up to 'chunksize' bytes at a time into a
+# reusable buffer and use an incremental decoder so that multibyte
+# characters split across reads are handled correctly.
+#
+def _chunked_stream_reader(args, chunksize=None, stats=None):
+    raw_stderr, encoding = _reader_encoding()
+    stream = _ChunkedStream(args[0], args[2:], encoding)
+    fd = args[1]
+    buf = bytearray(chunksize or GlobalData.READER_CHUNKSIZE)
+    view = memoryview(buf)
+    while True:
+        data = _read_chunk(fd, buf, view)
+        if not data:
+            break
+        stream.feed(data)
+    _report_lost_output(raw_stderr, stream.close())
+    if stats is not None:
+        stats.add(stream.nbytes, stream.nreads)
+
+
+def _chunked_merged_reader(*args, **kwds):
+    chunksize = kwds.pop('chunksize', None) or GlobalData.READER_CHUNKSIZE
+    stats = kwds.pop('stats', None)
+    raw_stderr, encoding = _reader_encoding()
+
+    streams = {}
+    for arg in args:
+        if _mswindows:
+            handle = get_osfhandle(arg[1])
+        else:
+            handle = arg[1]
+        streams[handle] = _ChunkedStream(arg[0], arg[2:], encoding)
+
+    handles = sorted(streams.keys(), key=lambda x: -1 * streams[x].unbuffer)
+    noop = []
+    buf = bytearray(chunksize)
+    view = memoryview(buf)
+
+    while handles:
+        if _mswindows:
+            new_data = None
+            for h in list(handles):
+                try:
+                    numAvail = PeekNamedPipe(h, 0)[1]
+                    if numAvail == 0:
+                        continue
+                    result, new_data = ReadFile(h, min(numAvail, chunksize),
+                                                None)
+                    break
+                except:
+                    handles.remove(h)
+                    new_data = None
+            if new_data is None:
+                continue
+        else:
+            h = select(handles, noop, noop)[0]
+            if not h:
+                break
+            h = h[0]
+            new_data = _read_chunk(h, buf, view)
+            if not new_data:
+                handles.remove(h)
+                continue
+        streams[h].feed(new_data)
+
+    lost = ""
+    for s in itervalues(streams):
+        lost += s.close()
+        if stats is not None:
+            stats.add(s.nbytes, s.nreads)
+    _report_lost_output(raw_stderr, lost)
+
+
+def _chunked_pseudo_merged_reader(*args, **kwds):
+    _threads = []
+    for arg in args:
+        _threads.append(Thread(target=_chunked_stream_reader,
+                               args=((2,) + arg[1:],), kwargs=kwds))
+        _threads[-1].daemon = True
+        _threads[-1].start()
+    for th in _threads:
+        th.join()
+
+
+#
+# Convert the command to execve form, prepending the memmon / valgrind
+# wrappers if requested.
+#
+def _build_command(cmd,
+                   memmon=False,
+                   valgrind=False,
+                   valgrind_log=None,
+                   valgrind_options=None):
     cmd_type = type(cmd)
     if cmd_type is list:
         # make a private copy of the list
@@ -501,6 +807,61 @@ def run_command(cmd,
         if valgrind_log is not None:
             valgrind_cmd.append("--log-file-exactly=" + valgrind_log.strip())
         _cmd = valgrind_cmd + _cmd
+    return _cmd
+
+
+#
+# Execute the command as a subprocess that we can send signals to.
+# After this is finished, we can get the output from this command from
+# the process.stdout file descriptor.
+#
+def run_command(cmd,
+                outfile=None,
+                cwd=None,
+                ostream=None,
+                stdin=None,
+                stdout=None,
+                stderr=None,
+                valgrind=False,
+                valgrind_log=None,
+                valgrind_options=None,
+                memmon=False,
+                env=None,
+                define_signal_handlers=None,
+                debug=False,
+                verbose=True,
+                timelimit=None,
+                tee=None,
+                ignore_output=False,
+                shell=False,
+                thread_reader=None,
+                reader_chunksize=None,
+                reader_stats=None,
+                resource_usage=None,
+                sample_interval=None):
+    #
+    # Set the define_signal_handlers based on the global default flag.
+    #
+    if define_signal_handlers is None:
+        define_signal_handlers = GlobalData.DEFINE_SIGNAL_HANDLERS_DEFAULT
+    #
+    # Set the reader_chunksize based on the global default.  A value of
+    # 0 (or False) selects the original byte-at-a-time readers.
+    #
+    if reader_chunksize is None:
+        reader_chunksize = GlobalData.READER_CHUNKSIZE_DEFAULT
+    #
+    # Note: the working directory is passed to the subprocess rather
+    # than changing the working directory of this (possibly
+    # multithreaded) process.  Relative outfile paths are still
+    # interpreted relative to cwd.
+    #
+    outfile_path = outfile
+    if cwd is not None and outfile is not None:
+        outfile_path = os.path.join(cwd, outfile)
+
+    _cmd = _build_command(cmd, memmon, valgrind, valgrind_log,
+                          valgrind_options)
     #
     # Redirect stdout and stderr
     #
@@ -512,7 +873,7 @@ def run_command(cmd,
                              "{stdout, stderr} options are mutually exclusive")
         output = "Output printed to specified ostream"
     elif outfile is not None:
-        stdout_arg = stderr_arg = open(outfile, "w")
+        stdout_arg = stderr_arg = open(outfile_path, "w")
         if stdout is not None or stderr is not None:
             raise ValueError("subprocess.run_command(): outfile and "
                              "{stdout, stderr} options are mutually exclusive")
@@ -545,16 +906,14 @@ def run_command(cmd,
     #
     # Setup signal handler
     #
-    if define_signal_handlers:
-        handler = verbose_signal_handler if verbose else signal_handler
-        if sys.platform[0:3] != "win" and sys.platform[0:4] != 'java':
-            GlobalData.original_signal_handlers[signal.SIGHUP] \
-                = signal.signal(signal.SIGHUP, handler)
-        GlobalData.original_signal_handlers[signal.SIGINT] \
-            = signal.signal(signal.SIGINT, handler)
-        GlobalData.original_signal_handlers[signal.SIGTERM] \
-            = signal.signal(signal.SIGTERM, handler)
+    # (only possible from the main thread; processes started from other
+    # threads are still registered, and are signaled by the main
+    # thread's handler if one is installed)
+    #
+    handlers_installed = define_signal_handlers \
+        and _install_signal_handlers(verbose)
     rc = -1
+    child = None
     if debug:
         print("Executing command %s" % (_cmd,))
     try:
@@ -580,10 +939,12 @@ def run_command(cmd,
                 stdout=stdout_arg,
                 stderr=stderr_arg,
                 env=env,
-                shell=shell)
-            GlobalData.current_process = process.process
-            rc = process.wait(timelimit)
-            GlobalData.current_process = None
+                cwd=cwd,
+                shell=shell,
+                resources=resource_usage)
+            child = process.process
+            _register_process(child)
+            rc = process.wait(timelimit, sample_interval)
         else:
             #
             # Aggressively wait for output from the process, and
@@ -638,8 +999,11 @@ def run_command(cmd,
                 stdout=out_fd[0],
                 stderr=out_fd[1],
                 env=env,
-                shell=shell)
-            GlobalData.current_process = process.process
+                cwd=cwd,
+                shell=shell,
+                resources=resource_usage)
+            child = process.process
+            _register_process(child)
             GlobalData.signal_handler_busy = False
             #
             # Create a thread to read in stdout and stderr data
@@ -647,6 +1011,15 @@ def run_command(cmd,
             if out_th:
                 if thread_reader is not None:
                     reader = thread_reader
+                elif reader_chunksize:
+                    if len(out_th) == 1:
+                        reader = _chunked_stream_reader
+                    elif _peek_available:
+                        reader = _chunked_merged_reader
+                    else:
+                        reader = _chunked_pseudo_merged_reader
+                    reader = partial(reader, chunksize=reader_chunksize,
+                                     stats=reader_stats)
                 elif len(out_th) == 1:
                     reader = _stream_reader
                 elif _peek_available:
@@ -655,12 +1028,12 @@ def run_command(cmd,
                     reader = _pseudo_merged_reader
                 th = Thread(target=reader, args=[x[0] for x in out_th])
                 th.daemon = True
+                reader_start = timer()
                 th.start()
             #
             # Wait for process to finish
             #
-            rc = process.wait(timelimit)
-            GlobalData.current_process = None
+            rc = process.wait(timelimit, sample_interval)
             out_fd = None
 
     except _WindowsError:
@@ -674,9 +1047,11 @@ def run_command(cmd,
         #
         pass
     finally:
+        if child is not None:
+            _unregister_process(child)
         # restore the previous signal handlers, if necessary
-        for _sig in list(GlobalData.original_signal_handlers):
-            signal.signal(_sig, GlobalData.original_signal_handlers.pop(_sig))
+        if handlers_installed:
+            _restore_signal_handlers()
 
     #
     # Flush stdout/stderr. Some platforms (notably Matlab, which
@@ -704,6 +1079,8 @@ def run_command(cmd,
             # threads have a chance to be set up.  Testing for None
             # avoids joining a thread that doesn't exist.
             th.join()
+            if reader_stats is not None:
+                reader_stats.elapsed += timer() - reader_start
         for p in out_th:
             os.close(p[1])
         if th is not None:
@@ -715,11 +1092,6 @@ def run_command(cmd,
         output = "".join(tmpfile.readlines())
         tmpfile.close()
     #
-    # Move back from the specified working directory
-    #
-    if cwd is not None:
-        os.chdir(oldpwd)
-    #
     # Return the output
     #
     return [rc, output]
@@ -728,6 +1100,124 @@ def run_command(cmd,
 run = run_command
 
 
+#
+# Resource accounting.  On POSIX platforms, child processes are reaped
+# with os.wait4(), which returns the child's rusage (the same data that
+# getrusage(RUSAGE_CHILDREN) accumulates, but for just this child and
+# its waited-for descendants).
+#
+_wait4_available = hasattr(os, 'wait4') and not _mswindows
+
+# ru_maxrss is reported in kilobytes on Linux, but in bytes on OS X
+if sys.platform == 'darwin':
+    _maxrss_scale = 1
+else:
+    _maxrss_scale = 1024
+
+if sys.platform.startswith('linux'):
+    _clock_ticks = os.sysconf('SC_CLK_TCK')
+    _page_size = os.sysconf('SC_PAGE_SIZE')
+else:
+    _clock_ticks = _page_size = None
+
+
+class ResourceUsage(object):
+    """
+    The resources consumed by a child process, as reported by
+    os.wait4().  Times are in seconds and memory is in bytes.  Values
+    are None when the information is not available (e.g., on Windows).
+
+    If the process was sampled while it ran, 'samples' holds a list of
+    (elapsed time, RSS, CPU time) tuples.
+    """
+
+    def __init__(self):
+        self.wall_time = None
+        self.user_time = None
+        self.system_time = None
+        self.max_rss = None
+        self.block_input = None
+        self.block_output = None
+        self.voluntary_switches = None
+        self.involuntary_switches = None
+        self.samples = []
+
+    @property
+    def cpu_time(self):
+        """The total (user + system) CPU time"""
+        if self.user_time is None:
+            return None
+        return self.user_time + self.system_time
+
+    def set_rusage(self, rusage):
+        self.user_time = rusage.ru_utime
+        self.system_time = rusage.ru_stime
+        self.max_rss = rusage.ru_maxrss * _maxrss_scale
+        self.block_input = rusage.ru_inblock
+        self.block_output = rusage.ru_oublock
+        self.voluntary_switches = rusage.ru_nvcsw
+        self.involuntary_switches = rusage.ru_nivcsw
+
+    def __str__(self):
+        if self.user_time is None:
+            return "resource usage not available"
+        return ("wall %.3fs, user %.3fs, sys %.3fs, peak RSS %.1f MB, "
+                "block I/O %d in / %d out, context switches %d voluntary "
+                "/ %d involuntary" %
+                (self.wall_time or 0, self.user_time, self.system_time,
+                 self.max_rss / 1048576.0, self.block_input,
+                 self.block_output, self.voluntary_switches,
+                 self.involuntary_switches))
+
+
+def _exitcode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _wait4(process, block=False):
+    """
+    Reap a subprocess.Popen process with os.wait4().  This sets the
+    process returncode and returns the rusage, or returns None if the
+    process is still running (or was already reaped elsewhere).
+    """
+    if process.returncode is not None:
+        return None
+    try:
+        pid, status, rusage = os.wait4(process.pid,
+                                       0 if block else os.WNOHANG)
+    except OSError:
+        if sys.exc_info()[1].errno != errno.ECHILD:
+            raise
+        # Already reaped (e.g., by Popen.poll() in the signal handler)
+        process.poll()
+        return None
+    if not pid:
+        return None
+    # Tell the Popen object that the child has been reaped
+    process.returncode = _exitcode(status)
+    return rusage
+
+
+def _sample_process(pid):
+    """
+    Return the current (RSS, CPU time) of a running process, or None if
+    it cannot be determined.  Only supported on Linux.
+    """
+    if _clock_ticks is None:
+        return None
+    try:
+        with open('/proc/%d/stat' % (pid,)) as STAT:
+            data = STAT.read()
+    except (IOError, OSError):
+        return None
+    # The process name may contain spaces: skip to the closing paren
+    fields = data[data.rindex(')') + 2:].split()
+    cpu = (int(fields[11]) + int(fields[12])) / float(_clock_ticks)
+    return int(fields[21]) * _page_size, cpu
+
+
 class SubprocessMngr(object):
 
     def __init__(self,
@@ -737,11 +1227,18 @@ class SubprocessMngr(object):
                  stderr=None,
                  env=None,
                  bufsize=0,
-                 shell=False):
+                 shell=False,
+                 cwd=None,
+                 resources=None):
         """
-        Setup and launch a subprocess
+        Setup and launch a subprocess.  The child's resource usage is
+        recorded in 'resources' (a ResourceUsage object, created if not
+        specified) when the process is reaped by wait().
         """
         self.process = None
+        if resources is None:
+            resources = ResourceUsage()
+        self.resources = resources
         #
         # By default, stderr is mapped to stdout
         #
@@ -761,6 +1258,7 @@ class SubprocessMngr(object):
         #
         # Launch subprocess using a subprocess.Popen object
         #
+        self.start_time = timer()
         if _mswindows:
             #
             # Launch without console on MSWindows
@@ -774,6 +1272,7 @@ class SubprocessMngr(object):
                 stderr=stderr,
                 startupinfo=startupinfo,
                 env=env,
+                cwd=cwd,
                 bufsize=bufsize,
                 shell=shell)
         elif getattr(subprocess, 'jython', False):
@@ -786,21 +1285,32 @@ class SubprocessMngr(object):
                 stdout=stdout,
                 stderr=stderr,
                 env=env,
+                cwd=cwd,
                 bufsize=bufsize,
                 shell=shell)
         else:
             #
             # Launch on *nix
             #
+            # Start the subprocess in a new session (process group) so
+            # that kill_process() can signal it and all its children.
+            # start_new_session is preferred over preexec_fn, which is
+            # not safe to use in the presence of threads.
+            #
+            if _start_new_session:
+                session = {'start_new_session': True}
+            else:
+                session = {'preexec_fn': os.setsid}
             self.process = subprocess.Popen(
                 cmd,
                 stdin=stdin_arg,
                 stdout=stdout,
                 stderr=stderr,
-                preexec_fn=os.setsid,
                 env=env,
+                cwd=cwd,
                 bufsize=bufsize,
-                shell=shell)
+                shell=shell,
+                **session)
 
     def X__del__(self):
         """
@@ -826,60 +1336,103 @@ class SubprocessMngr(object):
                 pass
         self.process = None
 
-    def wait(self, timelimit=None):
+    def wait(self, timelimit=None, sample_interval=None):
         """
         Wait for the subprocess to terminate.  Terminate if a specified
         timelimit has passed.
+
+        Where os.wait4() is available, the resource usage of the child
+        is recorded in self.resources.  If sample_interval is specified,
+        the child's RSS and CPU time are also sampled (on Linux) every
+        sample_interval seconds while it runs.
         """
-        if timelimit is None:
+        if timelimit is None and (
+                not _wait4_available or self.process.stdout is not None
+                or self.process.stderr is not None):
+            # We must use communicate() to avoid deadlocking on the
+            # stdout / stderr pipes (and forego resource accounting).
             # *Py3k: bytes_cast does no conversion for python 2.*, casts to bytes for 3.*
             self.process.communicate(input=bytes_cast(self.stdin))
             return self.process.returncode
+        if timelimit is not None and timelimit <= 0:
+            raise ValueError("'timeout' must be a positive number")
+
+        # This might be dangerous: we *could* deadlock if the input
+        # is large...
+        if self.stdin is not None:
+            # *Py3k: bytes_cast does no conversion for python 2.*, casts to bytes for 3.*
+            self.process.stdin.write(bytes_cast(self.stdin))
+            if timelimit is None:
+                self.process.stdin.close()
+
+        if timelimit is None and not sample_interval:
+            return self._poll(block=True)
+        #
+        # Wait timelimit seconds and then force a termination
+        #
+        # Sleep every 1/10th of a second to avoid wasting CPU time
+        #
+        if timelimit is None:
+            endtime = None
         else:
-            #
-            # Wait timelimit seconds and then force a termination
-            #
-            # Sleep every 1/10th of a second to avoid wasting CPU time
-            #
-            if timelimit <= 0:
-                raise ValueError("'timeout' must be a positive number")
             endtime = timer() + timelimit
-
-            # This might be dangerous: we *could* deadlock if the input
-            # is large...
-            if self.stdin is not None:
-                # *Py3k: bytes_cast does no conversion for python 2.*, casts to bytes for 3.*
-                self.process.stdin.write(bytes_cast(self.stdin))
-
-            while timer() < endtime:
-                status = self.process.poll()
-                if status is not None:
-                    return status
-                time.sleep(0.1)
+        interval = 0.1
+        if sample_interval:
+            interval = min(interval, sample_interval)
+            next_sample = timer()
+        while endtime is None or timer() < endtime:
+            status = self._poll()
+            if status is not None:
+                return status
+            if sample_interval and timer() >= next_sample:
+                self._sample()
+                next_sample += sample_interval
+            time.sleep(interval)
+        #
+        # Check one last time before killing the process
+        #
+        status = self._poll()
+        if status is not None:
+            return status
+        #
+        # If we're here, then kill the process and return an error
+        # returncode.
+        #
+        try:
+            self.kill()
+            return -1
+        except OSError:
             #
-            # Check one last time before killing the process
+            # The process may have stopped before we called 'kill()'
+            # so check the status one last time.
             #
             status = self.process.poll()
             if status is not None:
                 return status
-            #
-            # If we're here, then kill the process and return an error
-            # returncode.
-            #
-            try:
-                self.kill()
-                return -1
-            except OSError:
-                #
-                # The process may have stopped before we called 'kill()'
-                # so check the status one last time.
-                #
-                status = self.process.poll()
-                if status is not None:
-                    return status
-                else:
-                    raise OSError("Could not kill process " + repr(
-                        self.process.pid))
+            else:
+                raise OSError("Could not kill process " + repr(
+                    self.process.pid))
+
+    def _poll(self, block=False):
+        """
+        Return the returncode of the process (or None if it is still
+        running), recording its resource usage if it was reaped
+        """
+        if not _wait4_available:
+            if block:
+                return self.process.wait()
+            return self.process.poll()
+        rusage = _wait4(self.process, block)
+        if rusage is not None:
+            self.resources.wall_time = timer() - self.start_time
+            self.resources.set_rusage(rusage)
+        return self.process.returncode
+
+    def _sample(self):
+        sample = _sample_process(self.process.pid)
+        if sample is not None:
+            self.resources.samples.append(
+                (timer() - self.start_time,) + sample)
 
     def stdout(self):
         return self.process.stdout
@@ -896,7 +1449,7 @@ class SubprocessMngr(object):
         """
         kill_process(self.process, sig)
         self.process.terminate()
-        self.process.wait()
+        self._poll(block=True)
         del self.process
         self.process = None
 
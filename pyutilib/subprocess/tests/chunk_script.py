@@ -0,0 +1,19 @@
+import sys
+# Emit a known volume of output on both stdout and stderr.
+#
+# Usage: chunk_script.py [nlines [unicode]]
+#
+# Multibyte characters are only emitted when the 'unicode' argument is
+# given, as the original byte-at-a-time reader cannot decode them.
+nlines = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+if len(sys.argv) > 2 and sys.argv[2] == 'unicode':
+    line = u"OUT %d caf\u00e9 \u2713\n"
+else:
+    line = u"OUT %d cafe\n"
+out = getattr(sys.stdout, 'buffer', sys.stdout)
+err = getattr(sys.stderr, 'buffer', sys.stderr)
+for i in range(nlines):
+    out.write((line % i).encode('utf-8'))
+err.write(u"ERR\n".encode('utf-8'))
+out.flush()
+err.flush()
@@ -0,0 +1,156 @@
+import sys
+import os
+import shutil
+import tempfile
+from os.path import abspath, dirname
+currdir = dirname(abspath(__file__)) + os.sep
+
+import pyutilib.th as unittest
+import pyutilib.misc
+import pyutilib.subprocess
+from pyutilib.subprocess import timer, ReaderStats
+
+import six
+
+try:
+    import asyncio
+    from pyutilib.subprocess import async_run_command
+    asyncio_available = True
+except ImportError:
+    asyncio_available = False
+
+_mswindows = (sys.platform == 'win32')
+
+
+@unittest.skipIf(not asyncio_available,
+                 "async_run_command requires Python 3.5+")
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_output(self):
+        rc, output = self.run_async(async_run_command(
+            [sys.executable, currdir + "tee_script.py"]))
+        self.assertEqual(rc, 0)
+        self.assertEqual(
+            sorted(output.splitlines()),
+            ["Tee Script: ERR", "Tee Script: OUT"])
+
+    def test_outputfile(self):
+        rc, output = self.run_async(async_run_command(
+            [sys.executable, currdir + "tee_script.py"],
+            outfile=currdir + 'async_tee.out'))
+        self.assertEqual(output,
+                         "Output printed to file '%s'" %
+                         (currdir + 'async_tee.out',))
+        with open(currdir + 'async_tee.out') as INPUT:
+            self.assertEqual(
+                sorted(INPUT.read().splitlines()),
+                ["Tee Script: ERR", "Tee Script: OUT"])
+        os.remove(currdir + 'async_tee.out')
+
+    def test_outputfile_cwd(self):
+        # A relative outfile is written in cwd, not in this process's
+        # working directory
+        tmpdir = tempfile.mkdtemp()
+        try:
+            rc, output = self.run_async(async_run_command(
+                [sys.executable, currdir + "tee_script.py"],
+                cwd=tmpdir, outfile='async_tee.out'))
+            self.assertEqual(rc, 0)
+            self.assertFalse(os.path.exists('async_tee.out'))
+            with open(os.path.join(tmpdir, 'async_tee.out')) as INPUT:
+                self.assertEqual(
+                    sorted(INPUT.read().splitlines()),
+                    ["Tee Script: ERR", "Tee Script: OUT"])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_ostream_stringio(self):
+        script_out = six.StringIO()
+        stats = ReaderStats()
+        self.run_async(async_run_command(
+            [sys.executable, currdir + "chunk_script.py", "100"],
+            ostream=script_out, reader_stats=stats))
+        lines = script_out.getvalue().splitlines()
+        self.assertEqual(len(lines), 101)
+        self.assertEqual(stats.bytes, len(script_out.getvalue()))
+
+    def test_tee(self):
+        stream_out = six.StringIO()
+        script_out = six.StringIO()
+        pyutilib.misc.setup_redirect(stream_out)
+        try:
+            self.run_async(async_run_command(
+                [sys.executable, currdir + "tee_script.py"],
+                ostream=script_out,
+                tee=(True, False)))
+        finally:
+            pyutilib.misc.reset_redirect()
+        self.assertEqual(stream_out.getvalue().splitlines(),
+                         ["Tee Script: OUT"])
+        self.assertEqual(
+            sorted(script_out.getvalue().splitlines()),
+            ["Tee Script: ERR", "Tee Script: OUT"])
+
+    def test_cwd_env_stdin(self):
+        env = dict(os.environ)
+        env['PYUTILIB_ASYNC_TEST'] = 'found'
+        oldpwd = os.getcwd()
+        rc, output = self.run_async(async_run_command(
+            [sys.executable, "-c",
+             "import os, sys; print(os.getcwd()); "
+             "print(os.environ['PYUTILIB_ASYNC_TEST']); "
+             "print(sys.stdin.read())"],
+            cwd=currdir, env=env, stdin="piped input"))
+        self.assertEqual(rc, 0)
+        self.assertEqual(
+            output.splitlines(),
+            [os.path.realpath(currdir[:-1]), "found", "piped input"])
+        self.assertEqual(os.getcwd(), oldpwd)
+
+    def test_returncode(self):
+        rc, output = self.run_async(async_run_command(
+            [sys.executable, "-c", "import sys; sys.exit(3)"]))
+        self.assertEqual(rc, 3)
+
+    def test_timeout(self):
+        stime = timer()
+        rc, output = self.run_async(async_run_command(
+            [sys.executable, "-q", "-c", "while True: pass"], timelimit=1))
+        self.assertEqual(rc, -1)
+        self.assertLess(timer() - stime, 2)
+
+    def test_concurrent(self):
+        results = self.run_async(asyncio.gather(*[
+            async_run_command([sys.executable, "-c", "print(%d)" % i])
+            for i in range(20)]))
+        self.assertEqual([rc for rc, _ in results], [0] * 20)
+        self.assertEqual([output.strip() for _, output in results],
+                         [str(i) for i in range(20)])
+
+    @unittest.skipIf(_mswindows, "Signal forwarding requires POSIX signals")
+    def test_signal_forwarding(self):
+        import signal
+        orig = signal.getsignal(signal.SIGTERM)
+        self.loop.call_later(0.5, os.kill, os.getpid(), signal.SIGTERM)
+        stime = timer()
+        rc, output = self.run_async(async_run_command(
+            [sys.executable, "-q", "-c", "import time; time.sleep(30)"],
+            define_signal_handlers=True))
+        self.assertEqual(rc, -signal.SIGTERM)
+        self.assertLess(timer() - stime, 10)
+        self.assertIs(signal.getsignal(signal.SIGTERM), orig)
+
+
+if __name__ == "__main__":
+    unittest.main()
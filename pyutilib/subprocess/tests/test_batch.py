@@ -0,0 +1,143 @@
+import sys
+import os
+import shutil
+import tempfile
+from os.path import abspath, dirname
+currdir = dirname(abspath(__file__)) + os.sep
+
+import pyutilib.th as unittest
+from pyutilib.subprocess import run_commands, BatchStats, timer
+
+_mswindows = (sys.platform == 'win32')
+
+
+class Test(unittest.TestCase):
+
+    def test_results(self):
+        batch = [[sys.executable, "-c", "print(%d)" % i] for i in range(10)]
+        results = list(run_commands(batch, max_workers=4))
+        self.assertEqual(sorted(r.id for r in results), list(range(10)))
+        for r in results:
+            rc, output = r
+            self.assertEqual(rc, 0)
+            self.assertEqual(output.strip(), str(r.id))
+            self.assertIs(r.cmd, batch[r.id])
+
+    def test_streaming(self):
+        # The quick job should be produced before the slow one finishes
+        batch = [[sys.executable, "-c", "import time; time.sleep(1)"],
+                 [sys.executable, "-c", "pass"]]
+        results = run_commands(batch, max_workers=2)
+        first = next(results)
+        self.assertEqual(first.id, 1)
+        self.assertEqual(next(results).id, 0)
+
+    def test_max_workers(self):
+        batch = [[sys.executable, "-c", "import time; time.sleep(0.3)"]] * 4
+        stats = BatchStats()
+        results = list(run_commands(batch, max_workers=2, stats=stats))
+        self.assertEqual(stats.jobs, 4)
+        self.assertEqual(stats.failed, 0)
+        # Two jobs had to wait for a free slot
+        waits = sorted(r.queue_wait for r in results)
+        self.assertLess(waits[1], 0.2)
+        self.assertGreater(waits[2], 0.2)
+        self.assertGreater(stats.wall_time, 0.5)
+        self.assertAlmostEqual(stats.queue_wait, sum(waits))
+
+    def test_job_options(self):
+        oldpwd = os.getcwd()
+        env = dict(os.environ)
+        env['PYUTILIB_BATCH_TEST'] = 'default'
+        batch = [
+            [sys.executable, "-c",
+             "import os; print(os.environ['PYUTILIB_BATCH_TEST'])"],
+            {'cmd': [sys.executable, "-c", "import os; print(os.getcwd())"],
+             'cwd': currdir},
+            {'cmd': [sys.executable, "-c", "print('file')"],
+             'outfile': currdir + 'batch.out'},
+        ]
+        results = sorted(run_commands(batch, env=env), key=lambda r: r.id)
+        self.assertEqual(os.getcwd(), oldpwd)
+        self.assertEqual(results[0].output.strip(), 'default')
+        self.assertEqual(results[1].output.strip(),
+                         os.path.realpath(currdir[:-1]))
+        self.assertEqual(results[2].output,
+                         "Output printed to file '%s'" % (currdir + 'batch.out'))
+        with open(currdir + 'batch.out') as INPUT:
+            self.assertEqual(INPUT.read().strip(), 'file')
+        os.remove(currdir + 'batch.out')
+
+    def test_outfile_cwd(self):
+        # A relative outfile is written in the cwd of the job
+        tmpdir = tempfile.mkdtemp()
+        try:
+            results = list(run_commands(
+                [{'cmd': [sys.executable, "-c", "print('file')"],
+                  'cwd': tmpdir, 'outfile': 'batch.out'}]))
+            self.assertEqual(results[0].returncode, 0)
+            self.assertFalse(os.path.exists('batch.out'))
+            with open(os.path.join(tmpdir, 'batch.out')) as INPUT:
+                self.assertEqual(INPUT.read().strip(), 'file')
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_bad_option(self):
+        with self.assertRaisesRegex(ValueError, "unknown job option"):
+            list(run_commands([{'cmd': 'ls', 'bogus': 1}]))
+
+    def test_timelimit(self):
+        stats = BatchStats()
+        stime = timer()
+        results = list(run_commands(
+            [[sys.executable, "-c", "while True: pass"],
+             {'cmd': [sys.executable, "-c", "pass"], 'timelimit': 10}],
+            timelimit=0.5, stats=stats))
+        self.assertLess(timer() - stime, 5)
+        results.sort(key=lambda r: r.id)
+        self.assertTrue(results[0].timed_out)
+        self.assertEqual(results[0].returncode, -1)
+        self.assertFalse(results[1].timed_out)
+        self.assertEqual(results[1].returncode, 0)
+        self.assertEqual(stats.timed_out, 1)
+
+    @unittest.skipIf(_mswindows, "Ignoring SIGTERM requires POSIX signals")
+    def test_timelimit_ignores_sigterm(self):
+        # The job is killed with SIGKILL after the grace period
+        stime = timer()
+        results = list(run_commands(
+            [[sys.executable, "-c",
+              "import signal, time\n"
+              "signal.signal(signal.SIGTERM, signal.SIG_IGN)\n"
+              "time.sleep(8)"]],
+            timelimit=0.5, kill_grace=0.5))
+        self.assertLess(timer() - stime, 4)
+        self.assertTrue(results[0].timed_out)
+        self.assertEqual(results[0].returncode, -1)
+
+    @unittest.skipIf(_mswindows, "Ignoring SIGTERM requires POSIX signals")
+    def test_abandoned_ignores_sigterm(self):
+        # Jobs left running when the iterator is closed are also killed
+        results = run_commands(
+            [[sys.executable, "-c",
+              "import signal, time\n"
+              "signal.signal(signal.SIGTERM, signal.SIG_IGN)\n"
+              "time.sleep(8)"],
+             [sys.executable, "-c", "pass"]],
+            max_workers=2, kill_grace=0.5)
+        self.assertEqual(next(results).id, 1)
+        stime = timer()
+        results.close()
+        self.assertLess(timer() - stime, 4)
+
+    @unittest.skipIf(_mswindows, "CPU time accounting requires os.wait4")
+    def test_cpu_time(self):
+        results = list(run_commands(
+            [[sys.executable, "-c",
+              "import time\nt = time.time()\nwhile time.time() - t < 0.3: pass"]]))
+        self.assertGreater(results[0].cpu_time, 0.2)
+        self.assertGreater(results[0].resources.max_rss, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
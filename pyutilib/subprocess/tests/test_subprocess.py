@@ -1,14 +1,19 @@
 import sys
 import os
+import time
 from os.path import abspath, dirname
 currdir = dirname(abspath(__file__)) + os.sep
 
 import pyutilib.th as unittest
 import pyutilib.services
-from pyutilib.subprocess import subprocess, SubprocessMngr, timer
+from pyutilib.subprocess import subprocess, SubprocessMngr, timer, ReaderStats
+from pyutilib.subprocess import running_processes, signal_forwarding
+from pyutilib.subprocess import ResourceUsage
+from pyutilib.subprocess.processmngr import _wait4_available
 from pyutilib.subprocess.processmngr import _peek_available
 
 import six
+from threading import Thread
 
 _mswindows = (sys.platform == 'win32')
 try:
@@ -221,6 +226,243 @@ class Test(unittest.TestCase):
                             (["Tee Script: ERR", "Tee Script: OUT"],
                              ["Tee Script: OUT", "Tee Script: ERR"]))
 
+    def test_cwd_does_not_chdir(self):
+        oldpwd = os.getcwd()
+        rc, output = pyutilib.subprocess.run(
+            [sys.executable, "-c", "import os; print(os.getcwd())"],
+            cwd=currdir)
+        self.assertEqual(rc, 0)
+        self.assertEqual(output.strip(), os.path.realpath(currdir[:-1]))
+        self.assertEqual(os.getcwd(), oldpwd)
+
+    def test_cwd_relative_outfile(self):
+        pyutilib.subprocess.run([sys.executable, "-c", "print('cwd')"],
+                                cwd=currdir, outfile='cwd.out')
+        with open(currdir + 'cwd.out') as INPUT:
+            self.assertEqual(INPUT.read().strip(), 'cwd')
+        os.remove(currdir + 'cwd.out')
+
+    def test_threaded(self):
+        results = {}
+
+        def worker(i):
+            results[i] = pyutilib.subprocess.run(
+                [sys.executable, "-c",
+                 "import os, time; time.sleep(0.2); print(os.getcwd())"],
+                cwd=currdir if i % 2 else None,
+                timelimit=10 if i % 3 else None)
+
+        threads = [Thread(target=worker, args=(i,)) for i in range(8)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        for i in range(8):
+            rc, output = results[i]
+            self.assertEqual(rc, 0)
+            if i % 2:
+                self.assertEqual(output.strip(),
+                                 os.path.realpath(currdir[:-1]))
+            else:
+                self.assertEqual(output.strip(), os.getcwd())
+        self.assertEqual(running_processes(), [])
+
+    @unittest.skipIf(is_pypy, "Cannot launch python in this test with pypy")
+    def test_threaded_timelimit(self):
+        results = {}
+
+        def worker(i):
+            results[i] = pyutilib.subprocess.run(
+                [sys.executable, "-q", "-c", "while True: pass"],
+                timelimit=0.5 + i * 0.5)
+
+        stime = timer()
+        threads = [Thread(target=worker, args=(i,)) for i in range(3)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        self.assertLess(timer() - stime, 3)
+        self.assertEqual([results[i][0] for i in range(3)], [-1, -1, -1])
+        self.assertEqual(running_processes(), [])
+
+    @unittest.skipIf(_mswindows, "Signal forwarding requires POSIX signals")
+    def test_signal_forwarding_threaded(self):
+        import signal
+        results = {}
+
+        def worker(i):
+            results[i] = pyutilib.subprocess.run(
+                [sys.executable, "-q", "-c", "import time; time.sleep(30)"])
+
+        orig = signal.getsignal(signal.SIGTERM)
+        stime = timer()
+        with signal_forwarding():
+            threads = [Thread(target=worker, args=(i,)) for i in range(3)]
+            for th in threads:
+                th.start()
+            while len(running_processes()) < 3:
+                time.sleep(0.05)
+            try:
+                os.kill(os.getpid(), signal.SIGTERM)
+                # Give the signal handler a chance to run
+                time.sleep(1)
+            except OSError:
+                pass
+            for th in threads:
+                th.join()
+        self.assertLess(timer() - stime, 10)
+        self.assertIs(signal.getsignal(signal.SIGTERM), orig)
+        self.assertEqual(running_processes(), [])
+        for i in range(3):
+            self.assertEqual(results[i][0], -signal.SIGTERM)
+
+    @unittest.skipIf(_mswindows, "Signal forwarding requires POSIX signals")
+    def test_signal_forwarding_exits_before_thread(self):
+        import signal
+        results = {}
+
+        def worker():
+            try:
+                results['rc'] = pyutilib.subprocess.run(
+                    [sys.executable, "-q", "-c",
+                     "import time; time.sleep(0.5)"])[0]
+            except Exception as e:
+                results['error'] = e
+
+        orig = signal.getsignal(signal.SIGTERM)
+        with signal_forwarding():
+            th = Thread(target=worker)
+            th.start()
+            while not running_processes():
+                time.sleep(0.05)
+        # The block has exited (and restored the handlers) while the
+        # thread is still running its command
+        self.assertIs(signal.getsignal(signal.SIGTERM), orig)
+        th.join()
+        self.assertNotIn('error', results)
+        self.assertEqual(results['rc'], 0)
+        self.assertIs(signal.getsignal(signal.SIGTERM), orig)
+        self.assertEqual(running_processes(), [])
+
+    @unittest.skipIf(not _wait4_available, "Resource accounting requires "
+                     "os.wait4")
+    def test_resource_usage(self):
+        usage = ResourceUsage()
+        rc, output = pyutilib.subprocess.run(
+            [sys.executable, "-c",
+             "import time\n"
+             "x = bytearray(64 * 1024 * 1024)\n"
+             "t = time.time()\n"
+             "while time.time() - t < 0.2: pass"],
+            resource_usage=usage)
+        self.assertEqual(rc, 0)
+        self.assertGreater(usage.max_rss, 64 * 1024 * 1024)
+        self.assertGreater(usage.cpu_time, 0.1)
+        self.assertGreaterEqual(usage.wall_time, usage.user_time)
+        self.assertGreaterEqual(usage.voluntary_switches, 0)
+        self.assertGreaterEqual(usage.involuntary_switches, 0)
+        self.assertGreaterEqual(usage.block_input, 0)
+        self.assertGreaterEqual(usage.block_output, 0)
+        self.assertEqual(usage.samples, [])
+
+    @unittest.skipIf(not _wait4_available, "Resource accounting requires "
+                     "os.wait4")
+    def test_resource_usage_timelimit(self):
+        foo = SubprocessMngr([sys.executable, "-c", "pass"])
+        self.assertEqual(foo.wait(10), 0)
+        self.assertIsNotNone(foo.resources.cpu_time)
+        self.assertIn("peak RSS", str(foo.resources))
+
+    @unittest.skipIf(not sys.platform.startswith('linux'),
+                     "Resource sampling is only supported on Linux")
+    def test_resource_sampling(self):
+        usage = ResourceUsage()
+        pyutilib.subprocess.run(
+            [sys.executable, "-c", "import time; time.sleep(0.5)"],
+            resource_usage=usage, sample_interval=0.05)
+        self.assertGreater(len(usage.samples), 3)
+        for elapsed, rss, cpu in usage.samples:
+            self.assertGreater(rss, 0)
+            self.assertGreaterEqual(cpu, 0)
+        self.assertEqual(sorted(usage.samples), usage.samples)
+
+    def _chunk_script_lines(self, nlines, line=u"OUT %d cafe"):
+        return [line % i for i in range(nlines)] + [u"ERR"]
+
+    def test_chunked_ostream(self):
+        encoding = getattr(sys.__stderr__, 'encoding', None) or 'utf-8'
+        if encoding.lower().replace('-', '') != 'utf8':
+            self.skipTest("This test requires a UTF-8 locale")
+        script_out = six.StringIO()
+        stats = ReaderStats()
+        # A tiny chunk size splits the multibyte characters across reads
+        pyutilib.subprocess.run(
+            [sys.executable, currdir + "chunk_script.py", "50", "unicode"],
+            ostream=script_out,
+            reader_chunksize=3,
+            reader_stats=stats)
+        self.assertEqual(
+            sorted(script_out.getvalue().splitlines()),
+            sorted(self._chunk_script_lines(50, u"OUT %d caf\u00e9 \u2713")))
+        self.assertEqual(
+            stats.bytes, len(script_out.getvalue().encode('utf-8')))
+        self.assertGreaterEqual(stats.reads, stats.bytes // 3)
+        self.assertGreater(stats.elapsed, 0)
+
+    def test_chunked_matches_bytewise(self):
+        results = []
+        for chunksize in (0, 7, 65536):
+            script_out = six.StringIO()
+            pyutilib.subprocess.run(
+                [sys.executable, currdir + "chunk_script.py", "200"],
+                ostream=script_out,
+                reader_chunksize=chunksize)
+            results.append(sorted(script_out.getvalue().splitlines()))
+        self.assertEqual(results[0], sorted(self._chunk_script_lines(200)))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+
+    @unittest.category("fragile")
+    def test_chunked_tee(self):
+        stream_out = six.StringIO()
+        script_out = six.StringIO()
+        pyutilib.misc.setup_redirect(stream_out)
+        pyutilib.subprocess.run(
+            [sys.executable, currdir + "tee_script.py"],
+            ostream=script_out,
+            tee=True,
+            reader_chunksize=4096)
+        pyutilib.misc.reset_redirect()
+        self.assertEqual(
+            sorted(stream_out.getvalue().splitlines()),
+            ["Tee Script: ERR", "Tee Script: OUT"])
+        self.assertEqual(
+            sorted(script_out.getvalue().splitlines()),
+            ["Tee Script: ERR", "Tee Script: OUT"])
+
+    @unittest.category("expensive")
+    def test_chunked_throughput(self):
+        # Compare the byte-at-a-time reader against the chunked reader
+        # on the same (large) volume of subprocess output
+        stats = {}
+        for chunksize in (0, 65536):
+            stats[chunksize] = ReaderStats()
+            script_out = six.StringIO()
+            pyutilib.subprocess.run(
+                [sys.executable, currdir + "chunk_script.py", "50000"],
+                ostream=script_out,
+                reader_chunksize=chunksize,
+                reader_stats=stats[chunksize])
+            self.assertEqual(len(script_out.getvalue().splitlines()), 50001)
+        # Only the chunked reader counts bytes and reads
+        self.assertEqual(stats[0].bytes, 0)
+        self.assertGreater(stats[0].elapsed, 0)
+        self.assertGreater(stats[65536].bytes, 50000 * 10)
+        self.assertGreater(stats[65536].throughput, 0)
+        self.assertLess(stats[65536].reads, stats[65536].bytes // 10)
+        self.assertLess(stats[65536].elapsed, stats[0].elapsed)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -77,6 +77,7 @@ setup(name="PyUtilib",
         pypi_downloads = pyutilib.dev.pypi_downloads:main
         replaceCopyright = pyutilib.dev.replaceCopyright:main
         checkCopyright = pyutilib.dev.checkCopyright:main
+        pyutilib_importtime = pyutilib.dev.importtime:main
         pyutilib_test_driver = pyutilib.autotest.driver:main
         dispatch_srvr=pyutilib.pyro.dispatch_srvr:main
       """